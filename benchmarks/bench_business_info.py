@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from business_info import BusinessInfo
+
+
+### BENCHMARK: LOADING A REPORT IN BusinessInfo ###
+### COMPARES THE PREVIOUS LOADING PATH (THE FILE READ TWICE, AND EVERY CHARACTER FILTERED IN PYTHON AGAINST A LIST OF PUNCTUATION) ###
+### WITH THE CURRENT ONE (ONE READ AND ONE COMPILED REGEX), AND CHECKS THAT BOTH GIVE EXACTLY THE SAME LINES ###
+
+### RUN FROM THE ROOT OF THE REPOSITORY: python benchmarks/bench_business_info.py ###
+
+
+REPORTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reports_txt")
+REPEATS = 5
+
+
+
+# The loading path of BusinessInfo before the single-read version, kept here as the reference
+def legacy_load(edgar_file: str) -> tuple[str, list[str]]:
+    with open(edgar_file) as file:
+        text = file.read()
+
+    with open(edgar_file, 'r') as file:
+        lines = file.readlines()
+
+    punctuation_chars = [",", ".", ":", ";", "-"]
+    cleaned_lines = []
+    for line in lines:
+        cleaned_line = ''.join(char for char in line if char.isalnum() or char.isspace() or char in punctuation_chars)
+        cleaned_lines.append(cleaned_line)
+
+    return text, [word.strip() for word in cleaned_lines]
+
+
+
+# BusinessInfo loads the text and the lines the first time they are used
+def full_load(edgar_file: str) -> list[str]:
+    return BusinessInfo(edgar_file).lines
+
+
+
+def best_time(function, *args) -> float:
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+
+def main():
+    print(f"{'report':<12}{'size (KB)':>12}{'legacy (ms)':>14}{'current (ms)':>14}{'speed-up':>10}")
+    for name in sorted(os.listdir(REPORTS_FOLDER)):
+        if not name.endswith(".txt"):
+            continue
+        path = os.path.join(REPORTS_FOLDER, name)
+
+        text, lines = legacy_load(path)
+        b = BusinessInfo(path)
+        assert b.text == text and b.lines == lines, f"{name}: the two loading paths disagree"
+
+        legacy = best_time(legacy_load, path)
+        current = best_time(full_load, path)
+        print(f"{name:<12}{os.path.getsize(path) / 1024:>12.0f}{legacy * 1000:>14.1f}{current * 1000:>14.1f}{legacy / current:>9.1f}x")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from business_info import BusinessInfo
+from filing_store import FramedFile, compress_file
+from section_index import SectionIndex
+
+
+### BENCHMARK: PLAIN AGAINST COMPRESSED TEXT FILES ###
+### SAVES EVERY REPORT OF reports_txt (REPEATED SCALE TIMES, TO SIMULATE LARGER FILINGS) AS PLAIN TEXT AND COMPRESSED IN FRAMES (SEE ###
+### filing_store.py), AND COMPARES THE SIZE ON DISK, THE TIME TO LOAD THE WHOLE REPORT IN BusinessInfo, TO BUILD THE SECTION INDEX, TO ###
+### READ ONE SECTION (ITEM 7) AND TO GET THE BUSINESS SECTION OF A NEW BusinessInfo (AS BusinessSummary DOES) WITH THE INDEX ALREADY ###
+### BUILT, WHICH ONLY DECOMPRESSES THE FRAMES HOLDING THEM. IT ALSO CHECKS THAT BOTH PATHS GIVE EXACTLY THE SAME TEXT, LINES AND SECTIONS ###
+
+### RUN FROM THE ROOT OF THE REPOSITORY: python benchmarks/bench_filing_store.py [scale] ###
+
+
+REPORTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reports_txt")
+REPEATS = 5
+
+
+
+def best_time(function, *args) -> float:
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+
+def full_load(path: str) -> list[str]:
+    return BusinessInfo(path).lines
+
+
+
+def business_section(path: str) -> str:
+    b = BusinessInfo(path)
+    return b.businessInfo(b.infoLines())
+
+
+
+def build_index(path: str) -> SectionIndex:
+    return SectionIndex.build(path)
+
+
+
+def read_section(path: str, index: SectionIndex) -> str:
+    return index.read(path, "7")
+
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    folder = tempfile.mkdtemp(prefix="edgar_store_")
+    try:
+        print(f"{'report':<10}{'plain (KB)':>12}{'gz (KB)':>10}{'ratio':>7}   "
+              f"{'load plain/gz (ms)':>20}{'index plain/gz (ms)':>22}{'item 7 plain/gz (ms)':>22}{'item 1 plain/gz (ms)':>22}{'load MB/s gz':>14}")
+        for name in sorted(os.listdir(REPORTS_FOLDER)):
+            if not name.endswith(".txt"):
+                continue
+            with open(os.path.join(REPORTS_FOLDER, name)) as file:
+                text = file.read()
+            plain = os.path.join(folder, name)
+            with open(plain, "w") as file:
+                file.write(text * scale)
+
+            start = time.perf_counter()
+            compressed = compress_file(plain)
+            write = time.perf_counter() - start
+
+            b_plain, b_compressed = BusinessInfo(plain), BusinessInfo(compressed)
+            assert b_plain.text == b_compressed.text and b_plain.lines == b_compressed.lines, f"{name}: the two files disagree"
+            index_plain, index_compressed = SectionIndex.build(plain), SectionIndex.build(compressed)
+            assert index_plain.sections == index_compressed.sections, f"{name}: the two section indexes disagree"
+            if "7" not in index_plain.sections:
+                continue
+            assert read_section(plain, index_plain) == read_section(compressed, index_compressed)
+            assert business_section(plain) == business_section(compressed)
+
+            load = best_time(full_load, plain), best_time(full_load, compressed)
+            business = best_time(business_section, plain), best_time(business_section, compressed)
+            index = best_time(build_index, plain), best_time(build_index, compressed)
+            section = best_time(read_section, plain, index_plain), best_time(read_section, compressed, index_compressed)
+            size, compressed_size = os.path.getsize(plain), os.path.getsize(compressed)
+            frames = len(FramedFile(compressed).frames)
+            print(f"{name:<10}{size / 1024:>12.0f}{compressed_size / 1024:>10.0f}{size / compressed_size:>6.1f}x   "
+                  f"{load[0] * 1000:>9.1f} /{load[1] * 1000:>8.1f}{index[0] * 1000:>11.1f} /{index[1] * 1000:>8.1f}"
+                  f"{section[0] * 1000:>11.2f} /{section[1] * 1000:>8.2f}{business[0] * 1000:>11.2f} /{business[1] * 1000:>8.2f}"
+                  f"{size / 1e6 / load[1]:>14.1f}"
+                  f"   ({frames} frames, compressed in {write * 1000:.0f} ms)")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+
+if __name__ == "__main__":
+    main()
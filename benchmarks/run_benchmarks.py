@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import html
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from business_info import BusinessInfo, BusinessSummary
+from edgar_fetcher import EdgarFetcher
+from filing_document import FilingDocument
+from nltk_resources import RESOURCES, prefetch
+from product_industry_entities import Entities
+from section_index import SectionIndex
+from table_classifier import TableClassifier
+from text_scrapper import TextDownload, TableDownload
+
+
+### BENCHMARK SUITE OF THE STAGES OF THE ANALYSIS ###
+### TIMES AND MEASURES THE PEAK MEMORY (tracemalloc) OF EVERY STAGE OVER THE REPORTS IN reports_txt, AT THEIR REAL SIZE AND AT ###
+### SYNTHETIC SCALES (THE REPORT REPEATED 10 AND 100 TIMES). THE HTML FIXTURES ARE BUILT FROM THE SAME REPORTS (EVERY LINE A PARAGRAPH, ###
+### PLUS A TABLE OF CONTENTS, THE THREE FINANCIAL STATEMENTS LAID OUT AS IN EDGAR AND SOME LAYOUT TABLES PER COPY) AND SERVED BY A ###
+### LOCAL HTTP SERVER, SO THE DOWNLOAD STAGES RUN WITHOUT THE SEC WEBSITE ###
+
+### THE NLP STAGES NEED THE nltk MODELS: WHEN THEY ARE NOT INSTALLED THEY ARE SKIPPED (AND LISTED AS SKIPPED IN THE RESULTS) INSTEAD OF ###
+### DOWNLOADING THEM. RUN python nltk_resources.py FIRST TO INCLUDE THEM ###
+
+### RUN FROM THE ROOT OF THE REPOSITORY: ###
+### python benchmarks/run_benchmarks.py                                   writes benchmarks/results.json ###
+### python benchmarks/run_benchmarks.py --output benchmarks/baseline.json  records a new baseline ###
+### python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json fails if a stage got slower than the tolerance ###
+
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPORTS_FOLDER = os.path.join(BENCHMARKS_FOLDER, "..", "reports_txt")
+REPORTS = ["apple", "ibm", "tesla"]
+
+STATEMENT_ROWS = {
+    "income": ["Net sales", "Cost of sales", "Gross margin", "Research and development", "Operating income",
+               "Provision for income taxes", "Net income", "Diluted earnings per share"],
+    "balance": ["Cash and cash equivalents", "Accounts receivable, net", "Total current assets", "Property, plant and equipment, net",
+                "Total assets", "Accounts payable", "Total current liabilities", "Total liabilities", "Retained earnings",
+                "Total shareholders' equity"],
+    "cash_flow": ["Cash, beginning of the year", "Net income", "Depreciation and amortization", "Cash generated by operating activities",
+                  "Payments for acquisition of property, plant and equipment", "Cash used in investing activities",
+                  "Cash used in financing activities", "Cash, end of the year"],
+}
+TOC_ROWS = [("Item 1.", "Business"), ("Item 1A.", "Risk Factors"), ("Item 3.", "Legal Proceedings"),
+            ("Item 7.", "Management's Discussion and Analysis"), ("Item 8.", "Financial Statements")]
+
+
+
+
+### FIXTURES ###
+
+def statement_table(rows: list[str], seed: int) -> str:
+    # Every amount over three cells, | $ | (1,234 | ) |, with spacer cells, as in the EDGAR filings
+    out = ["<table>", "<tr><td></td><td colspan=\"3\">2022</td><td></td><td colspan=\"3\">2021</td></tr>"]
+    for i, label in enumerate(rows):
+        cells = [f"<td>{html.escape(label)}</td>"]
+        for year in range(2):
+            amount = (seed * 7919 + i * 104729 + year * 1299709) % 900000 + 1000
+            if (i + year) % 5 == 3:
+                cells += ["<td>$</td>", f"<td>({amount:,}</td>", "<td>)</td>"]
+            else:
+                cells += ["<td>$</td>", f"<td>{amount:,}</td>", "<td></td>"]
+            if year == 0:
+                cells.append("<td></td>")
+        out.append("<tr>" + "".join(cells) + "</tr>")
+    out.append("</table>")
+    return "".join(out)
+
+
+
+def html_fixture(text: str, scale: int) -> bytes:
+    paragraphs = "".join(f"<p>{html.escape(line)}</p>\n" for line in text.split("\n") if line.strip())
+    toc = "<table>" + "".join(f"<tr><td>{item}</td><td>{section}</td><td>{i + 1}</td></tr>" for i, (item, section) in enumerate(TOC_ROWS)) + "</table>"
+    layout = "<table><tr><td>&#160;</td><td>Page</td></tr></table>"
+
+    parts = ["<html><head><meta charset=\"utf-8\"><style>p {margin: 0}</style></head><body>"]
+    for copy in range(scale):
+        parts.append(toc)
+        parts.append(paragraphs)
+        for seed, rows in enumerate(STATEMENT_ROWS.values()):
+            parts.append(statement_table(rows, copy * 3 + seed))
+            parts.append(layout)
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+
+
+### LOCAL SERVER ###
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+
+@contextlib.contextmanager
+def local_server(folder: str):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=folder))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+
+
+### STAGES ###
+### EVERY STAGE IS (NAME, THE nltk RESOURCES IT NEEDS, THE LARGEST SCALE IT RUNS AT, SETUP). SETUP IS CALLED WITH THE FIXTURE OF A ###
+### REPORT AT A SCALE AND RETURNS THE FUNCTION TO TIME, SO THE PREPARATION (PARSING THE INPUT OF THE STAGE, ...) IS NOT TIMED ###
+
+
+class Fixture:
+
+    def __init__(self, report: str, scale: int, folder: str, base_url: str):
+        with open(os.path.join(REPORTS_FOLDER, f"{report}.txt")) as file:
+            text = file.read()
+        self.report = report
+        self.scale = scale
+        self.folder = folder
+        self.text_path = os.path.join(folder, f"{report}_x{scale}.txt")
+        with open(self.text_path, "w") as file:
+            file.write(text * scale)
+        self.html = html_fixture(text, scale)
+        self.html_name = f"{report}_x{scale}.htm"
+        with open(os.path.join(folder, self.html_name), "wb") as file:
+            file.write(self.html)
+        self.url = f"{base_url}/{self.html_name}"
+        self.fetcher = EdgarFetcher(agent_email="benchmark@example.com", rate=1000)
+        self._runs = 0
+
+
+
+    def uniqueUrl(self) -> str:
+        # FilingDocument keeps the filings opened by url, so every run asks for a new one
+        self._runs += 1
+        return f"{self.url}?run={self._runs}"
+
+
+
+def setup_extract_text(fixture: Fixture, stream: bool = False):
+    out = os.path.join(fixture.folder, "out.txt")
+    return lambda: TextDownload(fixture.uniqueUrl(), fetcher=fixture.fetcher).extractText(out, sep="\n", stream=stream)
+
+
+
+def setup_get_tables(fixture: Fixture):
+    t = TableDownload(fixture.url, fetcher=fixture.fetcher)
+    html_tables = FilingDocument(fixture.html).tables
+    return lambda: t.getTables(html_tables)
+
+
+
+def setup_classify_tables(fixture: Fixture):
+    t = TableDownload(fixture.url, fetcher=fixture.fetcher)
+    tables = t.getTablesByPosition(FilingDocument(fixture.html).tables)
+    classifier = TableClassifier()
+    return lambda: classifier.classify(tables)
+
+
+
+def setup_business_info(fixture: Fixture):
+    # The whole document: text and lines are loaded the first time they are used
+    return lambda: BusinessInfo(fixture.text_path).lines
+
+
+
+def setup_section_lines(fixture: Fixture):
+    def run():
+        # Without the sidecar, so the index is built
+        sidecar = SectionIndex.sidecarPath(fixture.text_path)
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+        b = BusinessInfo(fixture.text_path)
+        return b.businessInfo(b.infoLines()), b.finInfo(b.finLines())
+    return run
+
+
+
+def setup_business_summary(fixture: Fixture):
+    def run():
+        bs = BusinessSummary(fixture.text_path)
+        return bs.get_edgar_summary(threshold_prop=0.8)
+    return run
+
+
+
+def setup_industry_entities(fixture: Fixture):
+    text = BusinessSummary(fixture.text_path).text
+    return lambda: Entities.industryEntities(text)
+
+
+
+def setup_product_entities(fixture: Fixture):
+    text = BusinessSummary(fixture.text_path).text
+    return lambda: Entities.productEntities(text)
+
+
+
+STAGES = [
+    ("extract_text", (), 100, setup_extract_text),
+    ("extract_text_stream", (), 100, partial(setup_extract_text, stream=True)),
+    ("get_tables", (), 100, setup_get_tables),
+    ("classify_tables", (), 100, setup_classify_tables),
+    ("business_info_load", (), 100, setup_business_info),
+    ("section_lines", (), 100, setup_section_lines),
+    ("business_summary", ("punkt", "stopwords"), 10, setup_business_summary),
+    ("industry_entities", ("punkt", "stopwords"), 10, setup_industry_entities),
+    ("product_entities", ("punkt", "stopwords", "tagger", "ne_chunker", "words"), 1, setup_product_entities),
+]
+
+
+
+
+### MEASUREMENT ###
+
+def measure(function, repeats: int) -> tuple[float, int]:
+    # The printing of the scrapers is not part of the benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+
+        # The memory is measured on a separate run, as tracemalloc slows everything down
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(times), peak
+
+
+
+def installed_resources() -> list[str]:
+    # Only checks the disk: the benchmarks never download anything
+    return sorted(set(RESOURCES) - set(prefetch(check_only=True)))
+
+
+
+def missing_resources(names: tuple) -> list[str]:
+    installed = installed_resources()
+    return [name for name in names if name not in installed]
+
+
+
+def run(scales: list[int], reports: list[str], stages: list[str], repeats: int) -> dict:
+    results = []
+    skipped = []
+    folder = tempfile.mkdtemp(prefix="edgar_bench_")
+    try:
+        with local_server(folder) as base_url:
+            for name, resources, max_scale, setup in STAGES:
+                if stages and name not in stages:
+                    continue
+                missing = missing_resources(resources)
+                if missing:
+                    skipped.append({"stage": name, "reason": f"missing nltk resources: {', '.join(missing)}"})
+                    print(f"{name:<22}skipped (missing nltk resources: {', '.join(missing)})")
+                    continue
+
+                for scale in scales:
+                    if scale > max_scale:
+                        continue
+                    for report in reports:
+                        fixture = Fixture(report, scale, folder, base_url)
+                        seconds, peak = measure(setup(fixture), repeats if scale == 1 else 1)
+                        size = len(fixture.html) if "text" in name or "tables" in name else os.path.getsize(fixture.text_path)
+                        results.append({
+                            "stage": name, "report": report, "scale": scale, "input_bytes": size,
+                            "seconds": round(seconds, 6), "peak_bytes": peak, "mb_per_second": round(size / 1e6 / seconds, 3),
+                        })
+                        print(f"{name:<22}{report:<8}x{scale:<5}{seconds * 1000:>10.1f} ms{peak / 1024 ** 2:>10.1f} MiB peak")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "nltk_resources": installed_resources(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+
+# Compares the results with a baseline. Returns the list of (stage, report, scale, ratio) slower than the tolerance
+def compare(results: dict, baseline: dict, tolerance: float) -> list[tuple]:
+    previous = {(r["stage"], r["report"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    for skipped in baseline.get("skipped", []):
+        print(f"warning: the baseline has no timings for {skipped['stage']} ({skipped['reason']}), so it cannot catch its regressions")
+    print(f"\n{'stage':<22}{'report':<8}{'scale':<7}{'baseline (ms)':>14}{'now (ms)':>10}{'ratio':>8}")
+    for result in results["results"]:
+        key = (result["stage"], result["report"], result["scale"])
+        if key not in previous:
+            print(f"{key[0]:<22}{key[1]:<8}x{key[2]:<6}{'not in the baseline':>24}")
+            continue
+        ratio = result["seconds"] / previous[key]["seconds"]
+        flag = "  slower" if ratio > tolerance else ""
+        print(f"{key[0]:<22}{key[1]:<8}x{key[2]:<6}{previous[key]['seconds'] * 1000:>14.1f}{result['seconds'] * 1000:>10.1f}{ratio:>8.2f}{flag}")
+        if ratio > tolerance:
+            regressions.append((*key, ratio))
+    return regressions
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the EDGAR analysis")
+    parser.add_argument("--scales", default="1,10,100", help="comma separated sizes, as multiples of the real reports")
+    parser.add_argument("--reports", default=",".join(REPORTS))
+    parser.add_argument("--stages", default="", help="comma separated stages to run (all by default)")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per measure at scale 1 (the best one is kept)")
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_FOLDER, "results.json"))
+    parser.add_argument("--compare", default=None, help="a baseline file to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="the slow-down ratio counted as a regression")
+    args = parser.parse_args()
+
+    results = run([int(scale) for scale in args.scales.split(",")], args.reports.split(","),
+                  [stage for stage in args.stages.split(",") if stage], args.repeats)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=1)
+    print(f"\nResults saved to {args.output}")
+    if results["skipped"]:
+        print("warning: " + ", ".join(skipped["stage"] for skipped in results["skipped"]) + " skipped: run python nltk_resources.py "
+              "before recording a baseline, or it will not cover them")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} measures slower than {args.tolerance}x the baseline")
+            sys.exit(1)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+
+### BROWSER POOL ###
+### EDGAR FILINGS ARE STATIC HTML, SO THEIR SOURCE IS NORMALLY SAVED OVER PLAIN HTTP (SEE TextDownload.extractHTML). FOR THE ###
+### FEW PAGES WHICH REALLY NEED A BROWSER TO BE RENDERED, THE FOLLOWING CLASS KEEPS A SMALL POOL OF CHROME INSTANCES ALIVE AND ###
+### LENDS THEM OUT, SO THE DRIVER IS ONLY LOOKED UP ONCE AND CHROME ONLY STARTS ONCE PER POOL SLOT, NOT ONCE PER FILING ###
+
+
+
+
+# class BrowserPool
+
+# ATTRIBUTES:
+# 1. size: the maximum number of Chrome instances alive at the same time
+# 2. headless: whether Chrome runs without a window
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. acquire: a context manager which lends a driver from the pool, starting a new one only if none is idle and the pool is not full.
+#             If the code using the driver raises, the driver is quit and a new one is started in its place when needed
+# - only takes self
+
+
+# 2. pageSource: renders a page in one of the pooled browsers and returns its html
+# - url: the URL of the page
+
+
+# 3. close: quits every browser in the pool
+# - only takes self
+
+
+class BrowserPool:
+
+    # ChromeDriverManager().install() looks the driver version up online, so it is only done once per process
+    _driver_path = None
+    _driver_lock = threading.Lock()
+
+    def __init__(self, size: int = 2, headless: bool = True):
+        self.size = size
+        self.headless = headless
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+
+
+    @classmethod
+    def _driverPath(cls) -> str:
+        with cls._driver_lock:
+            if cls._driver_path is None:
+                cls._driver_path = ChromeDriverManager().install()
+            return cls._driver_path
+
+
+
+    def _newDriver(self) -> webdriver.Chrome:
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless=new")
+        return webdriver.Chrome(service=Service(self._driverPath()), options=options)
+
+
+
+    @contextmanager
+    def acquire(self):
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                start_new = len(self._drivers) < self.size
+                if start_new:
+                    # Reserve the slot before starting Chrome, which takes a while
+                    self._drivers.append(None)
+            driver = None if start_new else self._idle.get()
+
+        # None is a free slot, reserved in self._drivers, where a new browser is started: a new slot, or the slot of a browser which broke
+        if driver is None:
+            try:
+                driver = self._newDriver()
+            except Exception:
+                # The slot is left to the next caller, which may be waiting for an idle browser
+                self._idle.put(None)
+                raise
+            with self._lock:
+                self._drivers[self._drivers.index(None)] = driver
+
+        try:
+            yield driver
+        except BaseException:
+            # The browser may be dead (e.g. Chrome crashed or the session was lost): it is quit and its slot freed, rather than
+            # lent again to fail every later page
+            self._discard(driver)
+            raise
+        self._idle.put(driver)
+
+
+
+    def _discard(self, driver: webdriver.Chrome) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            if driver not in self._drivers:
+                # The pool was closed meanwhile
+                return None
+            self._drivers[self._drivers.index(driver)] = None
+        self._idle.put(None)
+
+
+
+    def pageSource(self, url: str) -> str:
+        with self.acquire() as driver:
+            driver.get(url)
+            return driver.page_source
+
+
+
+    def close(self) -> None:
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            if driver is not None:
+                driver.quit()
+        self._idle = queue.Queue()
+
+
+
+
+# The pool shared by every TextDownload, closed when the program exits
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+def shared_browser_pool() -> BrowserPool:
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = BrowserPool()
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -1,6 +1,17 @@
+import re
+from functools import cached_property
+
+import numpy as np
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize, sent_tokenize
+
+from filing_store import open_text, read_range
+from instrumentation import timed
+from nlp_cache import ArtifactCache
+from nlp_preprocessing import PreprocessedText
+from nltk_resources import ensure_resource
+from section_index import SectionIndex
+from sentence_scoring import SentenceScorer
 
 
 
@@ -16,8 +27,10 @@ from nltk.tokenize import word_tokenize, sent_tokenize
 
 # ATRIBUTTES:
 # 1. edgar_file: the already downloaded text file of the EDGAR report. This should be scraped first using text_scraper.py
-# 2. text: the raw text. This is obtained with the getText() method
-# 3. lines: a list of strings which are the text of each line in the document. This is obtained with the getLines() method
+#                It can also be compressed (e.g. apple.txt.gz, saved with save_text(..., compress=True), see filing_store.py)
+# 2. text: the raw text. This is obtained with the getText() method, the first time it is used
+# 3. lines: a list of strings which are the text of each line in the document. This is obtained with the getLines() method, the first time
+#           it is used. businessInfo and finInfo do not need either: they only read (or decompress) the bytes of their sections
 
 
 
@@ -26,18 +39,21 @@ from nltk.tokenize import word_tokenize, sent_tokenize
 # - only takes self
 
 
-# 2. getLines: gets a list of strings which are the text of each line in the document
+# 2. getLines: gets a list of strings which are the text of each line in the document, keeping only letters, digits, whitespace and the
+#              punctuation in PUNCTUATION_CHARS. The cleaning is done on the already loaded text with one compiled regex, so the file is only read once
 # - only takes self
 
 
 # 3. infoLines: for us to effectively create business and industry summaries, we only need to summarise the first section of the document, 
 #               which precisely contains this information. This functinos return the first and last line where relevant inormation is. With this, 
 #               we then substract the text between those lines in string format. 
+#               The lines are the headings of Item 1 and Item 1A, looked up in the SectionIndex of the file (see section_index.py)
 # - only takes self
 # - output is a list wiht exactly the first and last relevant line
 
 
-# 4. businessInfo: retrieves a string with precisely the relevant text mentioned before
+# 4. businessInfo: retrieves a string with precisely the relevant text mentioned before. When the indices are item headings (as those of
+#                  infoLines), only the bytes between the two headings are read from the file and cleaned, instead of the whole document
 # - indices: these are the first and last relevant line, which are obtained with the infoLines method
 
 
@@ -45,79 +61,119 @@ from nltk.tokenize import word_tokenize, sent_tokenize
 #           the same functionalities as the previous two, but for the financial summary.
 
 
+# 7. sectionIndex: returns the SectionIndex of the file, which maps every Item of the 10-K to its lines and bytes. It is built in a single
+#                  pass the first time and saved next to the text file, so later runs load it instead of scanning the file
+# - only takes self
+
+
+# 8. sectionText: returns the raw text of an Item (or of a run of Items), reading only its bytes from the file (or only decompressing
+#                 the frames holding it, for a compressed file)
+# - first: the first item, e.g. "7"
+# - last: the item where the run stops (excluded), e.g. "9". If None, only the first item
+
+
+# 9. sectionLines: the cleaned lines between two lines (both excluded), as in lines[indices[0] + 1:indices[1]], used by businessInfo and finInfo
+# - indices: the first and last line, e.g. the output of infoLines
+
+
+
+# Punctuation kept in the cleaned lines, and a regex matching every character which is not kept
+# (\w is letters, digits and "_", so "_" is removed separately)
+PUNCTUATION_CHARS = [",", ".", ":", ";", "-"]
+REMOVED_CHARS = re.compile(r"[^\w\s" + re.escape("".join(PUNCTUATION_CHARS)) + r"]|_")
+
+
 
 class BusinessInfo:
 
+    @timed("business_info.load")
     def __init__(self, edgar_file):
         self.edgar_file = edgar_file
-        self.text = self.getText()
-        self.lines = self.getLines()
-  
+        self._section_index = None
+        self._file_text = None
+
+
+
+    @cached_property
+    def text(self) -> str:
+        return self.getText()
+
+
+
+    @cached_property
+    def lines(self) -> list[str]:
+        return self.getLines()
     
 
+
     def getText(self) -> str:
-        with open(self.edgar_file) as file:
-            text = file.read()
-        return text
+        # Read once, and kept apart from text, which BusinessSummary replaces with the business section
+        if self._file_text is None:
+            with open_text(self.edgar_file) as file:
+                self._file_text = file.read()
+        return self._file_text
     
 
 
     def getLines(self) -> list[str]:
-        with open(self.edgar_file, 'r') as file:
-            lines = file.readlines() 
-        
-        punctuation_chars = [",", ".", ":", ";", "-"]
-        cleaned_lines = []
-        for line in lines:
-            cleaned_line = ''.join(char for char in line if char.isalnum() or char.isspace() or char in punctuation_chars)
-            cleaned_lines.append(cleaned_line)
-        
-        return [word.strip() for word in cleaned_lines]
+        return self._cleanLines(self.getText())
+
+
+
+    @staticmethod
+    def _cleanLines(text: str) -> list[str]:
+        lines = REMOVED_CHARS.sub("", text).split("\n")
+        # A final newline ends the last line rather than starting a new one, as with readlines
+        if lines and not lines[-1]:
+            lines.pop()
+        return [line.strip() for line in lines]
+    
+
+
+    @timed("business_info.sections")
+    def sectionIndex(self) -> SectionIndex:
+        if self._section_index is None:
+            self._section_index = SectionIndex.load(self.edgar_file)
+        return self._section_index
+    
+
+
+    def sectionText(self, first: str, last: str = None) -> str:
+        return self.sectionIndex().read(self.edgar_file, first, last)
+    
+
+
+    def _itemLines(self, items: list[str]) -> list[int]:
+        sections = self.sectionIndex().sections
+        return [sections[item]["start_line"] for item in items if item in sections]
     
+
+
+    def sectionLines(self, indices: list[int]) -> list[str]:
+        first, last = indices[0], indices[1]
+        starts = {span["start_line"]: span["start_byte"] for span in self.sectionIndex().sections.values()}
+        if "lines" in self.__dict__ or first not in starts or last not in starts:
+            return self.lines[first + 1:last]
+        if last <= first:
+            return []
+
+        # The range starts at the first heading and ends right before the second one. It is decoded with universal newlines, as getText
+        text = read_range(self.edgar_file, starts[first], starts[last]).decode("utf-8")
+        return self._cleanLines(text.replace("\r\n", "\n").replace("\r", "\n"))[1:]
+    
+
+
     def infoLines(self) -> list[int]:
-        first_count = 0
-        last_count = 0
-        indices = []
-        for i, line in enumerate(self.lines):
-            if "item 1." and "business" in line.lower():
-                first_count += 1
-                if first_count == 3:
-                    indices.append(i)
-            if "item 1a" in line.lower(): #and "Risk Factors" in line:
-                last_count += 1
-                if last_count == 3:
-                    indices.append(i)
-        return indices
+        return self._itemLines(["1", "1A"])
     
     def businessInfo(self, indices: list[str]) -> str:
-        btext = "" 
-        for j in range(indices[0] +1, indices[1]):
-            btext += " " + self.lines[j]
-        return btext
+        return "".join(" " + line for line in self.sectionLines(indices))
     
     def finLines(self) -> list[int]:
-        first_count = 0       
-        indices = []
-        last_indices = []
-        for i, line in enumerate(self.lines):
-            if "item 7" and "discussion and analysis" in line.lower():
-                first_count += 1
-                if first_count == 4:
-                    indices.append(i)
-                
-                
-            if "item 9" and "disagreements" in line.lower():
-                last_indices.append(i)
-        
-        last = last_indices[-1]
-        indices.append(last)
-        return indices
+        return self._itemLines(["7", "9"])
     
     def finInfo(self, indices: list[str]) -> str:
-        btext = "" 
-        for j in range(indices[0] +1, indices[1]):
-            btext += " " + self.lines[j]
-        return btext
+        return "".join(" " + line for line in self.sectionLines(indices))
     
 
 
@@ -131,6 +187,13 @@ class BusinessInfo:
 # 1. indices: the indices obtained with getLines in BusinessInfo
 # 2. text: we override the text attribute and set it to precisely the sections of the text we are interested on. Obtained with BusinessInfo.businessInfo()
 # 3. frequency_table: the frequency table for each word in the text. Of type dictionary, and obtained with _create_dictionary_table()
+# 4. scorer: the SentenceScorer built from the frequency table, which scores all the sentences at once (see sentence_scoring.py)
+# 5. preprocessed: the PreprocessedText of text, holding its sentences, tokens and stems. It can be handed on to Entities so the
+#                  text is never tokenized twice (see nlp_preprocessing.py)
+# 6. artifact_cache: an optional ArtifactCache. The tokens and stems of the section are then loaded from it when the section has not changed
+#                    since a previous run (call self.preprocessed.persist() to save them)
+# 7. stop_words: the set of English stop words left out of the frequency table. Loaded from nltk unless given, so a long-running process
+#                (see summary_service.py) can load them once and share them, together with the stemmer, across every filing
     
 
 
@@ -139,46 +202,53 @@ class BusinessInfo:
 # - only takes self
     
 
-# 2. _calculate_sentence_scores: this gives a score to each sentence by its words; that is, adding the frequency of each important word found in the sentence.
+# 2. _calculate_sentence_scores: this gives a score to each sentence by its words; that is, the average frequency of the distinct important words found in the sentence.
 # - sentences: a list of strings with each sentence in the text. This list must be tokenised. For that, in main.py() and in the method get_edgar_summary(), we will use the
 #              nltk.tokenize library built in functino sent_tokenise. Sentences is thus the tokenisation of the string text sent_tokenize(self.text). 
 #              This will further tweak the kind of sentences eligible for summarization
-# Note: Returns a dictionary of scores per sencence
+#              Already tokenized sentences (lists of words, e.g. self.preprocessed.tokens) are scored without tokenizing them again
+# Note: Returns a np.ndarray with the score of every sentence, in the same order as sentences
     
 
-# 3. _calculate_average_score: Calculates the average score of the sentences in the text
-# - sentence_weight: the dictionary of sentence scores created with _calculate_sentence_scores()
+# 3. _calculate_average_score: Calculates the average score of the sentences in the text which contain at least one important word
+# - sentence_weight: the array of sentence scores created with _calculate_sentence_scores()
     
 
 # 4. _get_edgar_summary: Generates the summary for the text.
 # - sentences: the aforementioned tokenised sentences obtained by input the string text into nltk.tokenize.sent_tokenize()
-# - sentence_weight: the dictionary of sentence scores created with _calculate_sentence_scores()
+# - sentence_weight: the array of sentence scores created with _calculate_sentence_scores()
 # - threshold: a float which lets us change the threshold of sentences elegible for summarisation
     
 
 # 5. get_edgar_summary: wraps up all the previous methods and returns the actual text summary.
-# - text: the string of text we want to summarise.
+# - text: the string of text we want to summarise, or its PreprocessedText. Defaults to self.preprocessed
+# - threshold_prop: the proportion of the average score a sentence needs to be in the summary
 
 
 class BusinessSummary(BusinessInfo):
 
-    def __init__(self, edgar_file):
+    @timed("business_summary.load")
+    def __init__(self, edgar_file, artifact_cache: ArtifactCache = None, stemmer: PorterStemmer = None, stop_words: set = None):
         super().__init__(edgar_file)
         self.indices = self.infoLines()
         self.text = self.businessInfo(self.indices)
+        self.artifact_cache = artifact_cache
+        self.stop_words = stop_words
+        self.preprocessed = PreprocessedText(self.text, stemmer, cache=artifact_cache, section="business")
         self.frequency_table = self._create_dictionary_table()
+        self.scorer = SentenceScorer(self.frequency_table, self.preprocessed.stemmer, self.preprocessed.stem_cache)
     
 
 
     def _create_dictionary_table(self) -> dict:
-        stop_words = set(stopwords.words("english"))
-        words = word_tokenize(self.text)
-        #reducing words to their root form
-        stem = PorterStemmer()
+        stop_words = self.stop_words
+        if stop_words is None:
+            ensure_resource("stopwords")
+            stop_words = set(stopwords.words("english"))
+        #words reduced to their root form, stemmed once by the shared preprocessing
         
         frequency_table = dict()
-        for wd in words:
-            wd = stem.stem(wd)
+        for wd in self.preprocessed.stems:
             if wd in stop_words:
                 continue
             if wd in frequency_table:
@@ -191,52 +261,32 @@ class BusinessSummary(BusinessInfo):
 
 
     # sentences = sent_tokenize(self.text)
-    def _calculate_sentence_scores(self, sentences: list[str]) -> dict:   
-        sentence_weight = dict()
-        for sentence in sentences:
-            sentence_wordcount = (len(word_tokenize(sentence)))
-            sentence_wordcount_without_stop_words = 0
-            for word_weight in self.frequency_table:
-                if word_weight in sentence.lower():
-                    sentence_wordcount_without_stop_words += 1
-                    if sentence[:7] in sentence_weight:
-                        sentence_weight[sentence[:7]] += self.frequency_table[word_weight]
-                    else:
-                        sentence_weight[sentence[:7]] = self.frequency_table[word_weight]
-
-        sentence_weight[sentence[:7]] = sentence_weight[sentence[:7]] / sentence_wordcount_without_stop_words
-        
-        return sentence_weight
+    def _calculate_sentence_scores(self, sentences: list[str]) -> np.ndarray:
+        return self.scorer.scores(sentences)
     
 
 
-    def _calculate_average_score(self, sentence_weight: dict) -> int:
-        sum_values = 0
-        for entry in sentence_weight:
-            sum_values += sentence_weight[entry]
-        
+    def _calculate_average_score(self, sentence_weight: np.ndarray) -> float:
+        scored = sentence_weight[sentence_weight > 0]
         #getting sentence average value from source text
-        average_score = (sum_values / len(sentence_weight))
-        return average_score
+        return float(scored.mean()) if scored.size else 0.0
     
     @staticmethod
     def _get_edgar_summary(sentences, sentence_weight, threshold):
-        sentence_counter = 0
-        article_summary = ''
-        
-        for sentence in sentences:
-            if sentence[:7] in sentence_weight and sentence_weight[sentence[:7]] >= (threshold):
-                article_summary += " " + sentence
-                sentence_counter += 1
-            
-        return article_summary
+        selected = SentenceScorer.select(sentence_weight, threshold)
+        return "".join(" " + sentence for sentence, keep in zip(sentences, selected) if keep)
     
-    def get_edgar_summary(self, text: str) -> str:
+    @timed("business_summary.summarise")
+    def get_edgar_summary(self, text=None, threshold_prop: float = 1.5) -> str:
+
+        if text is None:
+            text = self.preprocessed
+        elif isinstance(text, str):
+            text = PreprocessedText(text, self.preprocessed.stemmer)
 
-        sentences = sent_tokenize(text)
-        sentence_scores = self._calculate_sentence_scores(sentences)
+        sentence_scores = self._calculate_sentence_scores(text.tokens)
         threshold = self._calculate_average_score(sentence_scores)
-        article_summary = self._get_edgar_summary(sentences, sentence_scores, 1.5 * threshold)
+        article_summary = self._get_edgar_summary(text.sentences, sentence_scores, threshold_prop * threshold)
         return article_summary
     
 
@@ -0,0 +1,326 @@
+import atexit
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import HTTPCache
+from instrumentation import count, metrics, stage
+
+
+### CONCURRENT FETCHING ###
+### THE FOLLOWING CODE DOWNLOADS EDGAR DOCUMENTS OVER A POOL OF PERSISTENT KEEP-ALIVE CONNECTIONS ###
+### THE SEC ONLY ALLOWS A LIMITED NUMBER OF REQUESTS PER SECOND FROM EACH CLIENT, SO EVERY REQUEST FIRST TAKES A TOKEN ###
+### FROM A PER-HOST TOKEN BUCKET, AND THROTTLED OR FAILED REQUESTS ARE RETRIED WITH EXPONENTIAL BACKOFF ###
+### WHEN AN HTTPCache IS GIVEN, DOCUMENTS ALREADY ON DISK ARE SERVED FROM IT WITHOUT ANY NETWORK I/O ###
+
+
+# The SEC fair access policy allows at most 10 requests per second
+SEC_REQUESTS_PER_SECOND = 10
+DEFAULT_USER_AGENT = "My User Agent"
+
+# Where the fetchers shared by the scrapers keep their HTTP cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sec_edgar_http")
+
+# Status codes worth retrying: throttling and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+
+
+# class TokenBucket
+
+# ATTRIBUTES:
+# 1. rate: the number of tokens added to the bucket every second
+# 2. capacity: the maximum number of tokens the bucket can hold, i.e. the largest burst allowed
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. acquire: blocks until a token is available and takes it. Safe to call from several threads at once
+# - only takes self
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return None
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+
+
+# class FetchedPage
+# A light-weight stand-in for requests.Response holding only what the scrapers need
+
+# ATTRIBUTES:
+# 1. url: the URL that was requested
+# 2. status_code: the HTTP status code of the response
+# 3. content: the raw bytes of the body
+# 4. headers: a dictionary with the response headers
+# 5. text: the body decoded as a string (property)
+# 6. chunks: for streamed pages (see EdgarFetcher.stream), an iterator over the body which replaces content
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. iterContent: iterates over the body in chunks of bytes, reading it as it arrives for streamed pages
+# - only takes self
+
+
+# 2. charset: the character set declared in the Content-Type header, or None if there is none
+# - only takes self
+
+
+class FetchedPage:
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: dict = None, encoding: str = None, chunks=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.encoding = encoding or "utf-8"
+        self.chunks = chunks
+
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+
+    def iterContent(self):
+        if self.chunks is not None:
+            yield from self.chunks
+        elif self.content:
+            yield self.content
+
+
+    def charset(self) -> str:
+        content_type = self.headers.get("Content-Type") or ""
+        for parameter in content_type.split(";")[1:]:
+            name, _, value = parameter.strip().partition("=")
+            if name.lower() == "charset" and value:
+                return value.strip('"')
+        return None
+
+
+
+
+# class EdgarFetcher
+
+# ATTRIBUTES:
+# 1. agent_email: the SEC website blocks bots which are not identified, so an agent name and email are required to scrape the document
+# 2. rate: the maximum number of requests per second sent to any single host
+# 3. max_workers: the number of documents downloaded at the same time, which is also the size of the connection pool
+# 4. max_retries: how many times a failed or throttled request is retried before giving up, raising requests.ConnectionError, requests.Timeout
+#                 or, for a status in RETRY_STATUS_CODES, requests.HTTPError
+# 5. backoff: the base delay in seconds for the exponential backoff between retries
+# 6. timeout: the timeout in seconds of every single request
+# 7. cache: an optional HTTPCache. Cached documents are served from disk, and only revalidated with the server
+#           (ETag / Last-Modified) once they are older than max_age
+# 8. max_age: the age in seconds after which a cached document is revalidated. None, the default, never revalidates,
+#             as documents in the EDGAR archives do not change once filed
+# 9. session: the requests.Session shared by every request, which keeps the connections alive
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. fetch: downloads a single document, waiting for the rate limiter and retrying on failure. Returns a FetchedPage
+# - url: the URL of the document
+
+
+# 2. fetchMany: downloads several documents at once using a pool of threads
+# - urls: a list of URLs
+# Returns a dictionary where keys are the URLs and values are their FetchedPage
+
+
+# 3. stream: like fetch, but the body is not read into memory. Returns a FetchedPage whose chunks are read as they arrive
+#            (from the network, or from the cache when the document is cached)
+# - url: the URL of the document
+# - chunk_size: the size in bytes of each chunk
+
+
+# 4. close: closes the pooled connections and saves the access times of the cache
+# - only takes self
+
+
+class EdgarFetcher:
+
+    def __init__(self, agent_email=None, user_agent=DEFAULT_USER_AGENT, rate=SEC_REQUESTS_PER_SECOND,
+                 max_workers=8, max_retries=4, backoff=0.5, timeout=30, cache: HTTPCache = None, max_age=None):
+        self.agent_email = agent_email
+        self.rate = rate
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.max_age = max_age
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "From": f"{agent_email}"
+        })
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._buckets_lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate)
+            return self._buckets[host]
+
+
+
+    def _delay(self, attempt: int, response: requests.Response = None) -> float:
+        # Honour the server's Retry-After header when it gives one in seconds
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) * (1 + random.random())
+
+
+
+    def fetch(self, url: str) -> FetchedPage:
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None:
+            if self.max_age is None or time.time() - entry["stored"] < self.max_age:
+                return self._cachedPage(url, entry)
+            return self._download(url, entry)
+
+        return self._download(url)
+
+
+
+    def stream(self, url: str, chunk_size: int = 64 * 1024) -> FetchedPage:
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and (self.max_age is None or time.time() - entry["stored"] < self.max_age):
+            headers = {"Content-Type": entry.get("content_type") or ""}
+            return FetchedPage(url, entry["status_code"], b"", headers, entry.get("encoding"),
+                               chunks=self.cache.iterBlob(entry, chunk_size))
+
+        response = self._request(url, stream=True)
+        headers = dict(response.headers)
+        chunks = response.iter_content(chunk_size)
+        if metrics.enabled:
+            chunks = _counted(chunks)
+        if response.status_code == 200 and self.cache is not None:
+            chunks = self.cache.storeIter(url, response.status_code, chunks, headers, response.encoding)
+        return FetchedPage(url, response.status_code, b"", headers, response.encoding, chunks=chunks)
+
+
+
+    def _cachedPage(self, url: str, entry: dict) -> FetchedPage:
+        headers = {"Content-Type": entry.get("content_type") or ""}
+        return FetchedPage(url, entry["status_code"], self.cache.read(entry), headers, entry.get("encoding"))
+
+
+
+    def _request(self, url: str, headers: dict = None, stream: bool = False) -> requests.Response:
+        bucket = self._bucket(url)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            count("fetch.requests")
+            try:
+                with stage("fetch.request"):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                count("fetch.retries")
+                time.sleep(self._delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                if attempt == self.max_retries:
+                    # Still throttled or failing after every retry: an error, rather than an error page returned as the document
+                    response.close()
+                    raise requests.HTTPError(f"{response.status_code} from {url} after {self.max_retries} retries", response=response)
+                count("fetch.retries")
+                response.close()
+                time.sleep(self._delay(attempt, response))
+                continue
+
+            return response
+
+
+
+    def _download(self, url: str, entry: dict = None) -> FetchedPage:
+        conditional = HTTPCache.validators(entry) if entry is not None else {}
+        response = self._request(url, headers=conditional)
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(url)
+            return self._cachedPage(url, entry)
+
+        count("fetch.bytes", len(response.content))
+        if response.status_code == 200 and self.cache is not None:
+            self.cache.store(url, response.status_code, response.content, response.headers, response.encoding)
+
+        return FetchedPage(url, response.status_code, response.content, dict(response.headers), response.encoding)
+
+
+
+    def fetchMany(self, urls: list[str]) -> dict:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pages = pool.map(self.fetch, urls)
+            return dict(zip(urls, pages))
+
+
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+
+
+# Counts the bytes of a streamed body as they are read
+def _counted(chunks):
+    for chunk in chunks:
+        count("fetch.bytes", len(chunk))
+        yield chunk
+
+
+
+
+# One fetcher per agent email, so that every scraper object created in the same run shares
+# the same connection pool, the same rate limit and the same on-disk cache
+_shared_fetchers = {}
+_shared_lock = threading.Lock()
+
+def shared_fetcher(agent_email=None) -> EdgarFetcher:
+    with _shared_lock:
+        if agent_email not in _shared_fetchers:
+            _shared_fetchers[agent_email] = EdgarFetcher(agent_email=agent_email, cache=HTTPCache(DEFAULT_CACHE_DIR))
+            atexit.register(_shared_fetchers[agent_email].close)
+        return _shared_fetchers[agent_email]
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import cached_property
+
+import bs4
+from bs4 import BeautifulSoup
+
+from edgar_fetcher import EdgarFetcher
+from instrumentation import count, timed
+
+
+### PARSE-ONCE FILING MODEL ###
+### PARSING THE HTML OF A 10-K IS THE MOST EXPENSIVE STEP OF THE SCRAPING. THE FOLLOWING CLASS PARSES A FILING A SINGLE TIME ###
+### AND SERVES THE TEXT, THE TABLES AND KEYWORD SEARCHES FROM THAT ONE TREE. EVERY VIEW IS ONLY COMPUTED THE FIRST TIME IT IS ###
+### ASKED FOR AND THEN MEMOIZED, AND DOCUMENTS OPENED BY URL ARE KEPT IN A SMALL REGISTRY SO THAT TextDownload AND TableDownload ###
+### SHARE THE SAME PARSED FILING ###
+
+
+
+
+# class FilingDocument
+
+# ATTRIBUTES:
+# 1. content: the raw html of the filing, in bytes
+# 2. url: the URL the filing was downloaded from, if any
+# 3. status_code: the HTTP status code of the download (200 when the content was not downloaded)
+# 4. soup: the parsed BeautifulSoup tree. Parsed lazily, the first time any view needs it
+# 5. tables: the list of html tables in the document, as returned by soup.find_all("table")
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. fromUrl: returns the FilingDocument of a URL, downloading and parsing it only if it is not in the registry yet. Only 200 responses are registered
+# - url: the URL for the specific document we want to scrape
+# - fetcher: the EdgarFetcher used to download the document
+
+
+# 2. text: the text of the document, memoized per separator
+# - sep: the in between lines separation, usually \n
+
+
+# 3. findWord: the strings in the body of the document which contain a keyword (case insensitive), memoized per keyword
+# - word: the word we are looking for
+
+
+class FilingDocument:
+
+    # How many parsed filings fromUrl keeps alive at once
+    REGISTRY_SIZE = 8
+
+    _registry = OrderedDict()
+    _registry_lock = threading.Lock()
+    _in_flight = {}
+
+    def __init__(self, content: bytes, url=None, status_code=200):
+        self.content = content
+        self.url = url
+        self.status_code = status_code
+        self._texts = {}
+        self._words = {}
+
+
+
+    @classmethod
+    def fromUrl(cls, url: str, fetcher: EdgarFetcher) -> "FilingDocument":
+        with cls._registry_lock:
+            if url in cls._registry:
+                cls._registry.move_to_end(url)
+                count("filing_document.hits")
+                return cls._registry[url]
+            # Only one thread downloads and builds a given filing: the others wait for its Future, which stays in
+            # _in_flight until the document is in the registry, so no thread arriving later starts a second download
+            future = cls._in_flight.get(url)
+            downloading = future is None
+            if downloading:
+                future = cls._in_flight[url] = Future()
+
+        if not downloading:
+            return future.result()
+
+        try:
+            count("filing_document.misses")
+            page = fetcher.fetch(url)
+            document = cls(page.content, url=url, status_code=page.status_code)
+        except BaseException as error:
+            with cls._registry_lock:
+                cls._in_flight.pop(url, None)
+            future.set_exception(error)
+            raise
+
+        with cls._registry_lock:
+            # Error pages (404s...) are returned to the threads waiting for them but not kept, so the next call downloads the filing again
+            if page.status_code == 200:
+                cls._registry[url] = document
+                while len(cls._registry) > cls.REGISTRY_SIZE:
+                    cls._registry.popitem(last=False)
+            cls._in_flight.pop(url, None)
+        future.set_result(document)
+        return document
+
+
+
+    @cached_property
+    @timed("html.parse")
+    def soup(self) -> BeautifulSoup:
+        try:
+            return BeautifulSoup(self.content, "lxml")
+        except bs4.FeatureNotFound:
+            return BeautifulSoup(self.content, "html.parser")
+
+
+
+    @cached_property
+    def tables(self) -> bs4.element.ResultSet:
+        return self.soup.find_all("table")
+
+
+
+    @cached_property
+    def _bodyStrings(self) -> list:
+        body = self.soup.body or self.soup
+        return body.find_all(string=True)
+
+
+
+    @timed("html.text")
+    def text(self, sep=None) -> str:
+        if sep not in self._texts:
+            self._texts[sep] = self.soup.get_text(separator=sep) if sep else self.soup.get_text()
+        return self._texts[sep]
+
+
+
+    def findWord(self, word: str) -> list[str]:
+        key = word.lower()
+        if key not in self._words:
+            self._words[key] = [string for string in self._bodyStrings if key in string.lower()]
+        return self._words[key]
@@ -0,0 +1,418 @@
+import bisect
+import io
+import json
+import os
+import zlib
+from collections import OrderedDict
+
+
+### COMPRESSED STORAGE OF THE SAVED FILINGS ###
+### THE TEXT OF A 10-K COMPRESSES AROUND 4 TO 6 TIMES. THE FOLLOWING CODE SAVES THE TEXT FILES AS GZIP (apple.txt -> apple.txt.gz) WITHOUT ###
+### LOSING THE RANDOM ACCESS THE SECTION INDEX NEEDS: THE TEXT IS CUT IN FRAMES OF ABOUT frame_size BYTES, ENDING AT A LINE BREAK, AND ###
+### EVERY FRAME IS COMPRESSED AS AN INDEPENDENT GZIP MEMBER. A GZIP FILE MADE OF SEVERAL MEMBERS IS STILL A NORMAL GZIP FILE (gzip.open ###
+### AND zcat READ IT WHOLE), AND A SMALL JSON SIDECAR (apple.txt.gz.frames.json) KEEPS WHERE EVERY FRAME STARTS IN THE COMPRESSED AND IN ###
+### THE ORIGINAL TEXT, SO READING A BYTE RANGE OF THE TEXT ONLY DECOMPRESSES THE FRAMES WHICH OVERLAP IT ###
+
+### BusinessInfo, THE SectionIndex, THE SEARCH INDEX AND save_text IN main.py ACCEPT BOTH THE PLAIN AND THE COMPRESSED FILES, THROUGH THE ###
+### FUNCTIONS AT THE END OF THIS FILE. ANY OTHER GZIP FILE CAN BE READ TOO: ITS FRAMES (ITS MEMBERS) ARE FOUND WITH ONE PASS OVER IT THE ###
+### FIRST TIME, AND A FILE WITH A SINGLE MEMBER IS ONE LARGE FRAME ###
+
+
+COMPRESSED_SUFFIX = ".gz"
+FRAME_SIZE = 256 * 1024
+
+# wbits for zlib to write and read the gzip format
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(COMPRESSED_SUFFIX)
+
+
+
+def frames_path(path: str) -> str:
+    return f"{path}.frames.json"
+
+
+
+
+# class FramedWriter
+# A text file opened for writing (it has write and close, and works in a with block), which writes compressed frames
+
+# ATTRIBUTES:
+# 1. path: the path of the compressed file
+# 2. frame_size: the size of the text of every frame, in bytes. Frames end at the first line break after it. A line longer than 4 frames ends
+#                the frame before it, and if it is still too long it is cut at a character boundary, going on in the next frame
+# 3. level: the gzip compression level, from 1 (fastest) to 9 (smallest)
+# 4. encoding: the encoding of the text
+# 5. frames: the frames written so far, as [compressed offset, text offset, lines]
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. write: adds text to the file
+# - text: the string to write
+# Returns the number of characters written
+
+
+# 2. close: writes the last frame and the sidecar with the frames
+# - only takes self
+
+
+class FramedWriter:
+
+    def __init__(self, path: str, frame_size: int = FRAME_SIZE, level: int = 6, encoding: str = "utf-8"):
+        self.path = path
+        self.frame_size = frame_size
+        self.level = level
+        self.encoding = encoding
+        self.frames = []
+        self._file = open(path, "wb")
+        self._buffer = bytearray()
+        self._compressed = 0
+        self._size = 0
+
+
+
+    def write(self, text: str) -> int:
+        self._buffer += text.encode(self.encoding)
+        while len(self._buffer) >= self.frame_size:
+            cut = self._buffer.find(b"\n", self.frame_size - 1) + 1
+            if not cut:
+                if len(self._buffer) < 4 * self.frame_size:
+                    # The line goes on in the next write: wait for its end, unless it is very long
+                    break
+                # A very long line: the frame ends before it or, if the buffer is all that line, inside it
+                cut = self._buffer.rfind(b"\n") + 1 or self._characterBoundary(self.frame_size)
+            self._frame(bytes(self._buffer[:cut]))
+            del self._buffer[:cut]
+        return len(text)
+
+
+
+    # The last offset up to cut (inside the buffer) which does not split a UTF-8 character, whose continuation bytes are 10xxxxxx
+    def _characterBoundary(self, cut: int) -> int:
+        for boundary in range(cut, max(cut - 4, 0), -1):
+            if self._buffer[boundary] & 0xC0 != 0x80:
+                return boundary
+        return cut
+
+
+
+    def _frame(self, data: bytes) -> None:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+        member = compressor.compress(data) + compressor.flush()
+        self._file.write(member)
+        self.frames.append([self._compressed, self._size, data.count(b"\n")])
+        self._compressed += len(member)
+        self._size += len(data)
+
+
+
+    def close(self) -> None:
+        if self._file.closed:
+            return None
+        if self._buffer or not self.frames:
+            self._frame(bytes(self._buffer))
+            self._buffer.clear()
+        self._file.close()
+
+        stat = os.stat(self.path)
+        saved = {"version": FramedFile.VERSION, "size": self._size, "compressed_size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                 "frames": self.frames}
+        with open(frames_path(self.path) + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(saved, file)
+        os.replace(frames_path(self.path) + ".tmp", frames_path(self.path))
+
+
+
+    def __enter__(self):
+        return self
+
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+
+
+# class FramedFile
+# A compressed file opened for reading, with random access to the bytes of its text. It is a raw binary stream (io.RawIOBase), so it can
+# also be wrapped in io.BufferedReader and io.TextIOWrapper to be read as a normal text file (see open_text)
+
+# ATTRIBUTES:
+# 1. path: the path of the compressed file
+# 2. size: the size of the text, in bytes
+# 3. frames: the frames of the file, as [compressed offset, text offset, lines], from its sidecar (rebuilt if missing or out of date)
+# 4. cache_frames: the number of decompressed frames kept in memory, for reads close to each other
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. read_range: the bytes of the text from start to end, decompressing only the frames which overlap them
+# - start, end: the offsets in the text. end None is the end of the text
+
+
+# 2. iterFrames: the text of every frame in order, decompressed one at a time, to stream the whole file with little memory
+# - only takes self
+
+
+# 3. lineOffset: the offset in the text of a line (0-based). Only the frame holding the line is decompressed
+# - line: the number of the line
+
+
+# 4. read, readinto, seek, tell: the methods of a binary file (io.RawIOBase)
+
+
+class FramedFile(io.RawIOBase):
+
+    VERSION = 1
+
+    def __init__(self, path: str, cache_frames: int = 4):
+        super().__init__()
+        self.path = path
+        self.cache_frames = cache_frames
+        self._file = open(path, "rb")
+        self._cache = OrderedDict()
+        self._position = 0
+        self._loadFrames()
+
+
+
+    def _loadFrames(self) -> None:
+        stat = os.fstat(self._file.fileno())
+        try:
+            with open(frames_path(self.path), "r", encoding="utf-8") as file:
+                saved = json.load(file)
+            if saved["version"] == self.VERSION and (saved["compressed_size"], saved["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                self.frames, self.size = saved["frames"], saved["size"]
+                self._compressed_size = stat.st_size
+                self._starts = [frame[1] for frame in self.frames]
+                return None
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+        # A gzip file written by something else (or changed since): its members are its frames
+        self.frames, self.size = self._scan()
+        self._compressed_size = stat.st_size
+        self._starts = [frame[1] for frame in self.frames]
+        try:
+            saved = {"version": self.VERSION, "size": self.size, "compressed_size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                     "frames": self.frames}
+            with open(frames_path(self.path) + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(saved, file)
+            os.replace(frames_path(self.path) + ".tmp", frames_path(self.path))
+        except OSError:
+            pass
+
+
+
+    def _scan(self) -> tuple[list, int]:
+        frames = []
+        compressed, size = 0, 0
+        self._file.seek(0)
+        pending = self._file.read(1024 * 1024)
+        while pending:
+            frames.append([compressed, size, 0])
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+            while not decompressor.eof:
+                data = decompressor.decompress(pending)
+                size += len(data)
+                frames[-1][2] += data.count(b"\n")
+                pending = decompressor.unused_data
+                if not decompressor.eof:
+                    consumed = self._file.read(1024 * 1024)
+                    if not consumed:
+                        raise EOFError(f"{self.path} ends in the middle of a gzip member")
+                    pending = consumed
+            compressed = self._file.tell() - len(pending)
+            if not pending:
+                pending = self._file.read(1024 * 1024)
+        return frames, size
+
+
+
+    def _frameText(self, number: int) -> bytes:
+        if number in self._cache:
+            self._cache.move_to_end(number)
+            return self._cache[number]
+
+        start = self.frames[number][0]
+        end = self.frames[number + 1][0] if number + 1 < len(self.frames) else self._compressed_size
+        self._file.seek(start)
+        data = zlib.decompress(self._file.read(end - start), GZIP_WBITS)
+
+        self._cache[number] = data
+        while len(self._cache) > self.cache_frames:
+            self._cache.popitem(last=False)
+        return data
+
+
+
+    def _frameAt(self, offset: int) -> int:
+        return bisect.bisect_right(self._starts, offset) - 1
+
+
+
+    def read_range(self, start: int = 0, end: int = None) -> bytes:
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return b""
+        parts = []
+        for number in range(self._frameAt(start), self._frameAt(end - 1) + 1):
+            frame_start = self.frames[number][1]
+            data = self._frameText(number)
+            parts.append(data[max(0, start - frame_start):end - frame_start])
+        return b"".join(parts)
+
+
+
+    def iterFrames(self):
+        for number in range(len(self.frames)):
+            start = self.frames[number][0]
+            end = self.frames[number + 1][0] if number + 1 < len(self.frames) else self._compressed_size
+            self._file.seek(start)
+            yield zlib.decompress(self._file.read(end - start), GZIP_WBITS)
+
+
+
+    # A line starts after the line break ending the one before it, which can be in an earlier frame than the line if it is a very long one
+    def lineOffset(self, line: int) -> int:
+        if line <= 0:
+            return 0
+        for number, (_, start, lines) in enumerate(self.frames):
+            if line <= lines:
+                data = self._frameText(number)
+                position = 0
+                for _ in range(line):
+                    position = data.index(b"\n", position) + 1
+                return start + position
+            line -= lines
+        return self.size
+
+
+
+    def readable(self) -> bool:
+        return True
+
+
+
+    def seekable(self) -> bool:
+        return True
+
+
+
+    def readinto(self, buffer) -> int:
+        data = self.read_range(self._position, self._position + len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+
+
+    def tell(self) -> int:
+        return self._position
+
+
+
+    def close(self) -> None:
+        if not self.closed and hasattr(self, "_file"):
+            self._file.close()
+            self._cache.clear()
+        super().close()
+
+
+
+
+### READING AND WRITING PLAIN OR COMPRESSED TEXT FILES ###
+### THE FUNCTIONS BELOW TAKE EITHER KIND OF FILE, TELLING THEM APART BY THE .gz SUFFIX ###
+
+
+# Opens a text file for writing, compressed if compress is True (the path then gets the .gz suffix if it does not have it)
+# Returns the open file and its path
+def open_for_writing(path: str, compress: bool = False, encoding: str = "utf-8", frame_size: int = FRAME_SIZE):
+    if compress or is_compressed(path):
+        path = path if is_compressed(path) else path + COMPRESSED_SUFFIX
+        return FramedWriter(path, frame_size=frame_size, encoding=encoding), path
+    return open(path, "w", encoding=encoding), path
+
+
+
+# Opens a plain or compressed text file for reading, as a normal text file (with universal newlines, like open)
+def open_text(path: str, encoding: str = None):
+    if is_compressed(path):
+        return io.TextIOWrapper(io.BufferedReader(FramedFile(path)), encoding=encoding or "utf-8")
+    return open(path, encoding=encoding)
+
+
+
+# The bytes from start to end of the text of a plain or compressed file
+def read_range(path: str, start: int = 0, end: int = None) -> bytes:
+    if is_compressed(path):
+        with FramedFile(path) as file:
+            return file.read_range(start, end)
+    with open(path, "rb") as file:
+        file.seek(start)
+        return file.read() if end is None else file.read(max(0, end - start))
+
+
+
+# The chunks of the text of a plain or compressed file, in order, with the offset in the text where each one starts. The chunks of a
+# compressed file are its frames, and those of a plain file blocks of chunk_size bytes, both cut at their last line break (the rest goes
+# with the next chunk), so the chunks hold whole lines even when a very long line goes on over several frames
+def iter_chunks(path: str, chunk_size: int = FRAME_SIZE):
+    if is_compressed(path):
+        with FramedFile(path) as file:
+            yield from _whole_lines(file.iterFrames())
+        return None
+
+    with open(path, "rb") as file:
+        yield from _whole_lines(iter(lambda: file.read(chunk_size), b""))
+
+
+
+def _whole_lines(chunks):
+    offset = 0
+    pending = b""
+    for data in chunks:
+        data = pending + data
+        cut = data.rfind(b"\n") + 1
+        if not cut:
+            pending = data
+            continue
+        yield offset, data[:cut]
+        offset += cut
+        pending = data[cut:]
+    if pending:
+        yield offset, pending
+
+
+
+# The size of the text of a plain or compressed file, in bytes
+def text_size(path: str) -> int:
+    if is_compressed(path):
+        with FramedFile(path) as file:
+            return file.size
+    return os.path.getsize(path)
+
+
+
+# Compresses an existing plain text file (e.g. the reports already saved by save_text). Returns the path of the compressed file
+def compress_file(path: str, remove: bool = False, frame_size: int = FRAME_SIZE, level: int = 6) -> str:
+    compressed = path + COMPRESSED_SUFFIX
+    with FramedWriter(compressed, frame_size=frame_size, level=level, encoding="latin-1") as target:
+        # latin-1 maps every byte to one character and back, so the bytes are copied unchanged whatever the encoding of the file
+        for _, data in iter_chunks(path, frame_size):
+            target.write(data.decode("latin-1"))
+    if remove:
+        os.remove(path)
+    return compressed
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from instrumentation import count
+
+
+### ON-DISK HTTP CACHE ###
+### THE FOLLOWING CODE KEEPS A PERSISTENT COPY OF EVERY DOCUMENT DOWNLOADED FROM THE SEC WEBSITE, SO THAT RE-RUNS AND ###
+### REPEATED STAGES OF THE PIPELINE READ THE REPORT FROM DISK INSTEAD OF DOWNLOADING IT AGAIN ###
+
+### BODIES ARE STORED BY THE SHA-256 OF THEIR CONTENT (TWO URLS SERVING THE SAME DOCUMENT SHARE ONE FILE), AND AN INDEX ###
+### MAPS EVERY URL TO ITS BODY, ITS ETAG / LAST-MODIFIED VALIDATORS AND THE LAST TIME IT WAS USED. WHEN THE CACHE GROWS ###
+### PAST max_bytes THE LEAST RECENTLY USED ENTRIES ARE EVICTED ###
+
+
+
+
+# class HTTPCache
+
+# ATTRIBUTES:
+# 1. cache_dir: the folder where the index and the bodies are stored
+# 2. max_bytes: the maximum total size of the stored bodies, after which least recently used entries are evicted
+# 3. stats: a dictionary counting hits, misses, revalidations, stores and evictions
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. get: looks a URL up in the cache. Returns the index entry (a dictionary) or None, and counts the hit or miss
+# - url: the URL of the document
+
+
+# 2. read: returns the cached body of an entry as bytes
+# - entry: an entry returned by get
+
+
+# 3. validators: returns the conditional request headers (If-None-Match / If-Modified-Since) for an entry
+# - entry: an entry returned by get
+
+
+# 4. store: saves a downloaded body and its validators, evicting old entries if needed
+# - url: the URL of the document
+# - status_code, content, headers, encoding: the parts of the response to keep
+
+
+# 5. storeIter: like store, but for a streamed download. Yields the chunks back while writing them straight to disk
+# - url, status_code, headers, encoding: as in store
+# - chunks: an iterable with the chunks of the body
+
+
+# 6. iterBlob: reads the cached body of an entry back in chunks
+# - entry: an entry returned by get
+# - chunk_size: the size in bytes of each chunk
+
+
+# 7. refresh: marks an entry as revalidated after the server answered 304 Not Modified
+# - url: the URL of the document
+
+
+# 8. size: the total size in bytes of the stored bodies
+# - only takes self
+
+
+# 9. close: saves the access times recorded by get since the index was last written
+# - only takes self
+
+
+class HTTPCache:
+
+    INDEX_FILE = "index.json"
+    # get only records access times in memory; the index is written after this many hits (and by close), not on every read
+    SAVE_EVERY_HITS = 100
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._unsaved_hits = 0
+
+        os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+        self._index = self._loadIndex()
+
+
+
+    def _loadIndex(self) -> dict:
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
+
+    def _saveIndex(self) -> None:
+        path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, path)
+        self._unsaved_hits = 0
+
+
+
+    def _blobPath(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", digest[:2], digest)
+
+
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None or not os.path.exists(self._blobPath(entry["hash"])):
+                self.stats["misses"] += 1
+                count("http_cache.misses")
+                return None
+            self.stats["hits"] += 1
+            count("http_cache.hits")
+            entry["last_access"] = time.time()
+            self._unsaved_hits += 1
+            if self._unsaved_hits >= self.SAVE_EVERY_HITS:
+                self._saveIndex()
+            return dict(entry)
+
+
+
+    def read(self, entry: dict) -> bytes:
+        with open(self._blobPath(entry["hash"]), "rb") as file:
+            return file.read()
+
+
+
+    @staticmethod
+    def validators(entry: dict) -> dict:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+
+    def store(self, url: str, status_code: int, content: bytes, headers: dict, encoding: str = None) -> None:
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self._blobPath(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            # A unique temporary name, so two threads or processes storing the same body do not write to the same file
+            tmp_path = f"{blob}.{os.getpid()}-{threading.get_ident()}-{time.time_ns()}.tmp"
+            try:
+                with open(tmp_path, "wb") as file:
+                    file.write(content)
+                os.replace(tmp_path, blob)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        self._commit(url, digest, len(content), status_code, headers, encoding)
+
+
+
+    def storeIter(self, url: str, status_code: int, chunks, headers: dict, encoding: str = None):
+        # Passes the chunks of a streamed download through while writing them to disk, so the body is
+        # cached without ever being held in memory. Nothing is cached if the stream is not read to the end
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.cache_dir, "blobs", f"stream-{threading.get_ident()}-{time.time_ns()}.tmp")
+        try:
+            with open(tmp_path, "wb") as file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    file.write(chunk)
+                    yield chunk
+
+            blob = self._blobPath(digest.hexdigest())
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(tmp_path, blob)
+            self._commit(url, digest.hexdigest(), size, status_code, headers, encoding)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+
+    def iterBlob(self, entry: dict, chunk_size: int = 64 * 1024):
+        with open(self._blobPath(entry["hash"]), "rb") as file:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+
+    def _commit(self, url: str, digest: str, size: int, status_code: int, headers: dict, encoding: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._index[url] = {
+                "hash": digest,
+                "size": size,
+                "status_code": status_code,
+                "encoding": encoding,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "content_type": headers.get("Content-Type"),
+                "stored": now,
+                "last_access": now
+            }
+            self.stats["stores"] += 1
+            self._evict()
+            self._saveIndex()
+
+
+
+    def refresh(self, url: str) -> None:
+        with self._lock:
+            if url in self._index:
+                self._index[url]["stored"] = time.time()
+                self.stats["revalidated"] += 1
+                self._saveIndex()
+
+
+
+    def close(self) -> None:
+        with self._lock:
+            if self._unsaved_hits:
+                self._saveIndex()
+
+
+
+    def size(self) -> int:
+        # Bodies shared by several URLs are only counted once
+        with self._lock:
+            return sum({entry["hash"]: entry["size"] for entry in self._index.values()}.values())
+
+
+
+    def _evict(self) -> None:
+        blob_sizes = {}
+        references = {}
+        for entry in self._index.values():
+            blob_sizes[entry["hash"]] = entry["size"]
+            references[entry["hash"]] = references.get(entry["hash"], 0) + 1
+
+        total = sum(blob_sizes.values())
+        if total <= self.max_bytes:
+            return None
+
+        for url, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            del self._index[url]
+            self.stats["evictions"] += 1
+
+            # Only delete the body once no other URL points to it
+            references[entry["hash"]] -= 1
+            if references[entry["hash"]] == 0:
+                total -= blob_sizes[entry["hash"]]
+                try:
+                    os.remove(self._blobPath(entry["hash"]))
+                except FileNotFoundError:
+                    pass
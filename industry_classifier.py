@@ -0,0 +1,111 @@
+import numpy as np
+
+from nlp_preprocessing import PreprocessedText
+
+
+### COMPILED INDUSTRY KEYWORD MATCHING ###
+### THE INDUSTRY CLASSIFICATION COUNTS HOW MANY KEYWORDS OF EACH INDUSTRY APPEAR IN A TEXT. THE FOLLOWING CLASS COMPILES ALL THE ###
+### KEYWORDS OF ALL THE INDUSTRIES INTO A SINGLE TOKEN TRIE, SO ONE PASS OVER THE TOKENS OF A TEXT FINDS EVERY SINGLE-WORD AND ###
+### MULTI-WORD KEYWORD ("wealth management", "risk management") AND ADDS IT TO EVERY INDUSTRY IT BELONGS TO ###
+
+### KEYWORDS ARE MATCHED IGNORING CASE, EXCEPT ACRONYMS WRITTEN IN CAPITALS SUCH AS "IT", WHICH ONLY MATCH IN CAPITALS (OTHERWISE ###
+### "IT" WOULD MATCH EVERY "it" IN THE TEXT) ###
+
+
+# The key of a trie node holding the industries of the keyword which ends there
+_END = None
+
+
+
+
+# class IndustryClassifier
+
+# ATTRIBUTES:
+# 1. industries: the list of industries, in the order of the columns of the score matrices
+# 2. trie: the compiled keywords. Every node is a dictionary from the next token to the next node, and the industries of a keyword
+#          ending at a node are stored under the key None
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. scores: the number of keywords of every industry found in a text, as a np.ndarray in the order of industries
+# - text: a string, a PreprocessedText or an already tokenized list of words
+
+
+# 2. scoreMany: the scores of many texts at once
+# - texts: a list of texts, as in scores
+# Returns a np.ndarray with one row per text and one column per industry
+
+
+# 3. top: the industries with the highest scores, highest first (ties keep the order of industries)
+# - scores: the scores of one text
+# - n: how many industries to return
+# Returns a list of (industry, score) tuples
+
+
+class IndustryClassifier:
+
+    def __init__(self, keywords: dict):
+        self.industries = list(keywords)
+        self.trie = {}
+        for column, industry in enumerate(self.industries):
+            for keyword in keywords[industry]:
+                node = self.trie
+                for token in keyword.split():
+                    node = node.setdefault(self._keywordToken(token), {})
+                industries = node.setdefault(_END, [])
+                if column not in industries:
+                    industries.append(column)
+
+
+
+    @staticmethod
+    def _keywordToken(token: str) -> str:
+        return token if token.isupper() and len(token) > 1 else token.lower()
+
+
+
+    @staticmethod
+    def _words(text) -> list[str]:
+        if isinstance(text, PreprocessedText):
+            return text.words
+        if isinstance(text, str):
+            return PreprocessedText(text).words
+        return text
+
+
+
+    def scores(self, text) -> np.ndarray:
+        words = self._words(text)
+        lower_words = [word.lower() for word in words]
+        matches = []
+
+        for start in range(len(words)):
+            node = self.trie
+            position = start
+            while position < len(words):
+                # Lower case first, then the word as written for acronyms
+                child = node.get(lower_words[position])
+                if child is None and words[position] != lower_words[position]:
+                    child = node.get(words[position])
+                if child is None:
+                    break
+                node = child
+                if _END in node:
+                    matches.extend(node[_END])
+                position += 1
+
+        return np.bincount(np.asarray(matches, dtype=np.int64), minlength=len(self.industries))
+
+
+
+    def scoreMany(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), len(self.industries)), dtype=np.int64)
+        for row, text in enumerate(texts):
+            matrix[row] = self.scores(text)
+        return matrix
+
+
+
+    def top(self, scores: np.ndarray, n: int = 3) -> list[tuple[str, int]]:
+        order = np.argsort(-scores, kind="stable")[:n]
+        return [(self.industries[column], int(scores[column])) for column in order]
@@ -0,0 +1,302 @@
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak memory samples
+    resource = None
+
+
+### INSTRUMENTATION OF THE SCRAPING AND THE ANALYSIS ###
+### THE ENTRY POINTS OF THE SCRAPERS (TextDownload, TableDownload), OF THE ANALYSIS (BusinessInfo, BusinessSummary, Entities) AND THE ###
+### EXPENSIVE STEPS UNDER THEM (THE HTTP REQUESTS, THE PARSING OF THE HTML, THE TOKENIZATION, THE TAGGING, THE CHUNKING, THE EXCEL AND ###
+### DATABASE WRITES) ARE WRAPPED IN NAMED STAGES. WHEN THE METRICS ARE ENABLED, EVERY STAGE RECORDS HOW MANY TIMES IT RAN, ITS TOTAL AND ###
+### LONGEST TIME, AND THE PEAK MEMORY OF THE PROCESS WHEN IT ENDED (AND HOW MUCH THE STAGE RAISED IT), AND THE CODE COUNTS THE BYTES ###
+### FETCHED, THE TABLES AND SENTENCES PROCESSED AND THE HITS AND MISSES OF THE CACHES. THE RESULT IS A JSON REPORT, OR A TEXT FILE IN ###
+### THE PROMETHEUS EXPOSITION FORMAT (E.G. FOR THE TEXTFILE COLLECTOR OF THE NODE EXPORTER) ###
+
+### WHEN THE METRICS ARE DISABLED (THE DEFAULT) A STAGE IS ONE ATTRIBUTE LOOKUP AND A SHARED EMPTY CONTEXT MANAGER, AND A COUNTER ONE ###
+### ATTRIBUTE LOOKUP. THEY ARE ENABLED WITH enable(), OR FOR THE WHOLE RUN (INCLUDING THE WORKER PROCESSES OF pipeline.py) WITH THE ###
+### ENVIRONMENT VARIABLE EDGAR_METRICS=1 ###
+
+
+METRICS_VARIABLE = "EDGAR_METRICS"
+PROMETHEUS_PREFIX = "edgar"
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+_NULL_STAGE = nullcontext()
+
+
+
+
+def peak_rss() -> int:
+    # The peak resident memory of the process so far, in bytes (0 where it cannot be measured)
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+
+
+# class Metrics
+
+# ATTRIBUTES:
+# 1. enabled: whether anything is recorded
+# 2. memory: whether the stages sample the peak memory of the process when they end
+# 3. stages: for every stage, its calls, total seconds, longest call, the peak memory of the process after it and how much it raised it
+# 4. counters: a dictionary from the name of every counter to its value
+# 5. started: when the metrics were enabled or last reset (a time.time())
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. stage: a context manager timing a block of code as a stage
+# - name: the name of the stage, e.g. "nlp.sent_tokenize"
+
+
+# 2. count: adds to a counter
+# - name: the name of the counter, e.g. "fetch.bytes"
+# - n: the amount added
+
+
+# 3. report: the stages and counters recorded so far, as a dictionary ready for json
+# - only takes self
+
+
+# 4. merge: adds a report (e.g. from a worker process) to these metrics
+# - report: the output of report
+
+
+# 5. drain: returns the report and resets the metrics. Used by the worker processes to hand their metrics to the parent
+# - only takes self
+
+
+# 6. reset: forgets everything recorded so far
+# - only takes self
+
+
+# 7. writeJSON and writePrometheus: save the report as json, or in the Prometheus text format
+# - path: the path of the file
+
+
+class Metrics:
+
+    def __init__(self, enabled: bool = False, memory: bool = True):
+        self.enabled = enabled
+        self.memory = memory
+        self._lock = threading.Lock()
+        self.reset()
+
+
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.started = time.time()
+
+
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+
+
+    def count(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+
+    def _record(self, name: str, seconds: float, rss_before: int) -> None:
+        rss = peak_rss() if self.memory else 0
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_rss_bytes": 0, "rss_growth_bytes": 0}
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+            stage["peak_rss_bytes"] = max(stage["peak_rss_bytes"], rss)
+            stage["rss_growth_bytes"] += max(0, rss - rss_before)
+
+
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "seconds": time.time() - self.started,
+                "peak_rss_bytes": peak_rss(),
+                "stages": {name: dict(stage) for name, stage in sorted(self.stages.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+
+    def merge(self, report: dict) -> None:
+        with self._lock:
+            for name, other in report.get("stages", {}).items():
+                stage = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_rss_bytes": 0, "rss_growth_bytes": 0})
+                stage["calls"] += other["calls"]
+                stage["seconds"] += other["seconds"]
+                stage["rss_growth_bytes"] += other["rss_growth_bytes"]
+                for key in ("max_seconds", "peak_rss_bytes"):
+                    stage[key] = max(stage[key], other[key])
+            for name, value in report.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+
+
+    def drain(self) -> dict:
+        with self._lock:
+            report = {"stages": self.stages, "counters": self.counters}
+            self.stages = {}
+            self.counters = {}
+        return report
+
+
+
+    def writeJSON(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=1)
+
+
+
+    def writePrometheus(self, path: str) -> None:
+        # Written next to the file and renamed, so a collector never reads half a file
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            file.write(prometheus_text(self.report()))
+        os.replace(temporary, path)
+
+
+
+
+class _Stage:
+
+    __slots__ = ("metrics", "name", "start", "rss")
+
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+
+
+    def __enter__(self):
+        self.rss = peak_rss() if self.metrics.memory else 0
+        self.start = time.perf_counter()
+        return self
+
+
+
+    def __exit__(self, *exc_info):
+        self.metrics._record(self.name, time.perf_counter() - self.start, self.rss)
+        return False
+
+
+
+
+def _metric_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + "_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+
+# The report of a Metrics in the Prometheus text exposition format
+
+# Args:
+# 1. report: the output of Metrics.report
+
+# Returns:
+# The text, with one metric family per stage measure (labelled by stage) and one per counter
+def prometheus_text(report: dict) -> str:
+    families = [
+        ("stage_calls_total", "counter", "calls", "Times every stage ran"),
+        ("stage_seconds_total", "counter", "seconds", "Total seconds spent in every stage"),
+        ("stage_max_seconds", "gauge", "max_seconds", "Longest single run of every stage, in seconds"),
+        ("stage_peak_rss_bytes", "gauge", "peak_rss_bytes", "Peak resident memory of the process when every stage ended"),
+        ("stage_rss_growth_bytes_total", "counter", "rss_growth_bytes", "How much every stage raised the peak resident memory"),
+    ]
+    lines = []
+    for family, kind, key, description in families:
+        name = _metric_name(family)
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{{stage=\"{_label(stage)}\"}} {values[key]:g}" for stage, values in report["stages"].items()]
+
+    for counter, value in report["counters"].items():
+        name = _metric_name(counter) + "_total"
+        lines += [f"# TYPE {name} counter", f"{name} {value:g}"]
+
+    name = _metric_name("peak_rss_bytes")
+    lines += [f"# HELP {name} Peak resident memory of the process", f"# TYPE {name} gauge", f"{name} {report['peak_rss_bytes']:g}"]
+    return "\n".join(lines) + "\n"
+
+
+
+
+# The metrics of the process. The module functions below use them
+metrics = Metrics(enabled=os.environ.get(METRICS_VARIABLE, "").lower() in ("1", "true", "yes"))
+
+# A forked worker process starts with empty metrics (and a new lock), or the parent's would be counted twice when it hands them back
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: (setattr(metrics, "_lock", threading.Lock()), metrics.reset()))
+
+
+
+def enable(memory: bool = True) -> Metrics:
+    metrics.memory = memory
+    metrics.enabled = True
+    return metrics
+
+
+
+def disable() -> None:
+    metrics.enabled = False
+
+
+
+def stage(name: str):
+    return metrics.stage(name)
+
+
+
+def count(name: str, n: int = 1) -> None:
+    if metrics.enabled:
+        metrics.count(name, n)
+
+
+
+# Decorator timing every call of a function or method as a stage. When the metrics are disabled it only adds one attribute lookup
+
+# Args:
+# 1. name: the name of the stage
+
+# Returns:
+# The decorator
+def timed(name: str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            with _Stage(metrics, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,280 @@
+import re
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+
+### INLINE XBRL FACTS ###
+### THE 10-K REPORTS IN EDGAR ARE INLINE XBRL DOCUMENTS: EVERY NUMBER OF THE FINANCIAL STATEMENTS IS ALREADY TAGGED IN THE HTML AS AN ###
+### ix:nonFraction ELEMENT, WITH ITS CONCEPT (e.g. us-gaap:Revenues), THE CONTEXT DEFINING ITS PERIOD AND DIMENSIONS, ITS UNIT, ITS SCALE ###
+### AND ITS DECIMALS. THE FOLLOWING CLASS READS THOSE FACTS, AND THE DEFINITIONS OF THE CONTEXTS AND UNITS, IN A SINGLE STREAMING PASS ###
+### OVER THE DOCUMENT (AN lxml XMLPullParser FED WITH THE DOWNLOADED CHUNKS), WITHOUT REBUILDING ANY TABLE. EVERY ELEMENT IS DISCARDED ###
+### AS SOON AS IT HAS BEEN READ, SO THE MEMORY USED DOES NOT GROW WITH THE SIZE OF THE DOCUMENT ###
+
+
+IX = "http://www.xbrl.org/2013/inlineXBRL"
+XBRLI = "http://www.xbrl.org/2003/instance"
+XBRLDI = "http://xbrl.org/2006/xbrldi"
+XSI = "http://www.w3.org/2001/XMLSchema-instance"
+
+FACT_TAG = f"{{{IX}}}nonFraction"
+CONTEXT_TAG = f"{{{XBRLI}}}context"
+UNIT_TAG = f"{{{XBRLI}}}unit"
+KEPT_TAGS = {FACT_TAG, CONTEXT_TAG, UNIT_TAG}
+
+# Characters of the numbers which are only formatting
+NUMBER_FORMATTING = re.compile(r"[^\d.,]")
+
+# The numbers written in words (the ixt-sec:numwordsen format), e.g. "three", "twenty-five" or "one hundred"
+NUMBER_WORDS = {word: n for n, word in enumerate(
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen seventeen eighteen nineteen".split())}
+NUMBER_WORDS.update({word: 10 * n for n, word in enumerate("twenty thirty forty fifty sixty seventy eighty ninety".split(), start=2)})
+NUMBER_WORDS.update({"no": 0, "none": 0})
+SCALE_WORDS = {"hundred": 100, "thousand": 10 ** 3, "million": 10 ** 6, "billion": 10 ** 9, "trillion": 10 ** 12}
+
+# Some of the figures most often needed from a 10-K
+KEY_CONCEPTS = [
+    "us-gaap:Revenues",
+    "us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax",
+    "us-gaap:CostOfRevenue",
+    "us-gaap:GrossProfit",
+    "us-gaap:OperatingIncomeLoss",
+    "us-gaap:NetIncomeLoss",
+    "us-gaap:EarningsPerShareDiluted",
+    "us-gaap:Assets",
+    "us-gaap:Liabilities",
+    "us-gaap:StockholdersEquity",
+    "us-gaap:CashAndCashEquivalentsAtCarryingValue",
+    "us-gaap:NetCashProvidedByUsedInOperatingActivities",
+]
+
+
+
+
+# class IXBRLExtractor
+
+# ATTRIBUTES:
+# 1. facts: the list of facts read so far, one dictionary per ix:nonFraction
+# 2. contexts: a dictionary from the id of every context to its entity, period and dimensions
+# 3. units: a dictionary from the id of every unit to its measure (e.g. "iso4217:USD" or "iso4217:USD/xbrli:shares")
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. feed: parses the next chunk of the document
+# - chunk: bytes of the document
+
+
+# 2. close: finishes parsing and returns (facts, contexts) as two pd.DataFrame. The facts have one row per fact with its concept, value
+#           (scaled and signed), unit, decimals, period (start, end, or end only for instants), dimensions and context, and its format
+#           and text as written in the document. A fact whose text cannot be read in its format has the value NaN
+# - only takes self
+
+
+# 3. fromChunks: parses a whole document from an iterable of chunks (e.g. FetchedPage.iterContent) and returns the output of close
+# - chunks: the iterable of bytes
+
+
+# 4. keyFigures: the value of some concepts for the latest period of the report, without dimensions (i.e. for the whole company).
+#                For the concepts measured over a period, the longest period ending on the latest date (e.g. the year, not its last quarter)
+# - facts: the facts output by close
+# - concepts: the concepts to look up. By default KEY_CONCEPTS
+# Returns a pd.Series indexed by concept
+
+
+class IXBRLExtractor:
+
+    def __init__(self):
+        self.facts = []
+        self.contexts = {}
+        self.units = {}
+        self._open = 0
+        self._parser = etree.XMLPullParser(events=("start", "end"), recover=True, huge_tree=True, resolve_entities=False)
+
+
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.feed(chunk)
+        self._read()
+
+
+
+    def close(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        self._parser.close()
+        self._read()
+        return self._factTable(), self._contextTable()
+
+
+
+    @classmethod
+    def fromChunks(cls, chunks) -> tuple[pd.DataFrame, pd.DataFrame]:
+        extractor = cls()
+        for chunk in chunks:
+            extractor.feed(chunk)
+        return extractor.close()
+
+
+
+    def _read(self) -> None:
+        for event, element in self._parser.read_events():
+            tag = element.tag
+            if event == "start":
+                # Inside a fact, context or unit nothing is dropped until it ends and has been read
+                if tag in KEPT_TAGS:
+                    self._open += 1
+                continue
+
+            if tag == FACT_TAG:
+                self.facts.append(self._fact(element))
+            elif tag == CONTEXT_TAG:
+                self.contexts[element.get("id")] = self._context(element)
+            elif tag == UNIT_TAG:
+                self.units[element.get("id")] = self._unit(element)
+            if tag in KEPT_TAGS:
+                self._open -= 1
+            if self._open:
+                continue
+
+            # Everything already read is dropped, with the siblings which came before it
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+
+
+    @staticmethod
+    def _fact(element) -> dict:
+        text = "".join(element.itertext()).strip()
+        fmt = element.get("format", "")
+
+        if element.get(f"{{{XSI}}}nil") == "true":
+            value = np.nan
+        else:
+            # A fact in an unexpected format is recorded as NaN, with its text, rather than stopping the whole document
+            try:
+                value = IXBRLExtractor._number(text, fmt)
+            except ValueError:
+                value = np.nan
+            scale = element.get("scale")
+            if scale and scale.lstrip("-").isdigit():
+                value *= 10.0 ** int(scale)
+            if element.get("sign") == "-":
+                value = -value
+
+        return {
+            "concept": element.get("name"),
+            "value": value,
+            "unit": element.get("unitRef"),
+            "decimals": element.get("decimals"),
+            "context": element.get("contextRef"),
+            "id": element.get("id"),
+            "format": fmt or None,
+            "text": text,
+        }
+
+
+
+    # The number written in a fact, before its scale and sign. Raises a ValueError if the text cannot be read in its format
+    @staticmethod
+    def _number(text: str, fmt: str) -> float:
+        if fmt.endswith("fixed-zero") or fmt.endswith("zerodash") or text.lower() in ("no", "none"):
+            return 0.0
+        if "numwords" in fmt:
+            return IXBRLExtractor._words(text)
+
+        number = NUMBER_FORMATTING.sub("", text)
+        if not number.strip(".,"):
+            raise ValueError(f"no number in {text!r}")
+        if "comma-decimal" in fmt or "numcommadecimal" in fmt or "numdotcomma" in fmt:
+            # Dots group the thousands and a comma starts the decimals, e.g. 1.234.567,89
+            return float(number.replace(".", "").replace(",", "."))
+        return float(number.replace(",", ""))
+
+
+
+    # A number written in English words, e.g. "two hundred and five" or "three million"
+    @staticmethod
+    def _words(text: str) -> float:
+        words = [word for word in re.split(r"[\s\-,]+", text.lower()) if word and word != "and"]
+        if not words:
+            raise ValueError(f"no number in {text!r}")
+        total, current = 0, 0
+        for word in words:
+            if word in NUMBER_WORDS:
+                current += NUMBER_WORDS[word]
+            elif word == "hundred":
+                current = (current or 1) * 100
+            elif word in SCALE_WORDS:
+                total += (current or 1) * SCALE_WORDS[word]
+                current = 0
+            else:
+                raise ValueError(f"{word!r} is not a number")
+        return float(total + current)
+
+
+
+    @staticmethod
+    def _context(element) -> dict:
+        def first_text(path: str) -> str:
+            found = element.find(path)
+            return found.text.strip() if found is not None and found.text else None
+
+        dimensions = sorted(
+            f"{member.get('dimension')}={(member.text or '').strip() or ''.join(member.itertext()).strip()}"
+            for member in element.iter(f"{{{XBRLDI}}}explicitMember", f"{{{XBRLDI}}}typedMember")
+        )
+        return {
+            "entity": first_text(f".//{{{XBRLI}}}identifier"),
+            "start": first_text(f".//{{{XBRLI}}}startDate"),
+            "end": first_text(f".//{{{XBRLI}}}endDate") or first_text(f".//{{{XBRLI}}}instant"),
+            "instant": element.find(f".//{{{XBRLI}}}instant") is not None,
+            "dimensions": ";".join(dimensions),
+        }
+
+
+
+    @staticmethod
+    def _unit(element) -> str:
+        numerator = [m.text.strip() for m in element.iterfind(f"{{{XBRLI}}}divide/{{{XBRLI}}}unitNumerator/{{{XBRLI}}}measure")]
+        denominator = [m.text.strip() for m in element.iterfind(f"{{{XBRLI}}}divide/{{{XBRLI}}}unitDenominator/{{{XBRLI}}}measure")]
+        if numerator:
+            return "*".join(numerator) + "/" + "*".join(denominator)
+        return "*".join(m.text.strip() for m in element.iterfind(f"{{{XBRLI}}}measure"))
+
+
+
+    def _contextTable(self) -> pd.DataFrame:
+        contexts = pd.DataFrame.from_dict(self.contexts, orient="index", columns=["entity", "start", "end", "instant", "dimensions"])
+        contexts.index.name = "context"
+        for column in ("start", "end"):
+            contexts[column] = pd.to_datetime(contexts[column], errors="coerce")
+        return contexts
+
+
+
+    def _factTable(self) -> pd.DataFrame:
+        columns = ["concept", "value", "unit", "decimals", "context", "id", "format", "text"]
+        facts = pd.DataFrame(self.facts, columns=columns)
+        contexts = self._contextTable()
+
+        # The facts of the same concept and context repeated in several tables of the report are one fact
+        facts = facts.drop_duplicates(subset=["concept", "context", "unit", "value"]).reset_index(drop=True)
+        facts["unit"] = facts["unit"].map(self.units).fillna(facts["unit"])
+        facts = facts.join(contexts[["start", "end", "dimensions"]], on="context")
+        return facts[["concept", "start", "end", "value", "unit", "decimals", "dimensions", "context", "id", "format", "text"]]
+
+
+
+    @staticmethod
+    def keyFigures(facts: pd.DataFrame, concepts: list[str] = None) -> pd.Series:
+        concepts = concepts or KEY_CONCEPTS
+        company = facts[(facts["dimensions"].fillna("") == "") & facts["concept"].isin(concepts)]
+        if company.empty:
+            return pd.Series(dtype=float)
+        # Latest end date first and, among the periods ending on it, the longest (earliest start) first, so the fiscal year wins over
+        # the quarter ending on the same day. Instants have no start and come after the periods
+        ordered = company.sort_values(["end", "start"], ascending=[False, True], na_position="last", kind="stable")
+        latest = ordered.groupby("concept").head(1)
+        return latest.set_index("concept")["value"].reindex([c for c in concepts if c in set(latest["concept"])])
@@ -6,11 +6,21 @@ import re
 
 # Dependencies from other scripts
 from text_scrapper import TextDownload, TableDownload
+from edgar_fetcher import EdgarFetcher, shared_fetcher
 from business_info import BusinessInfo, BusinessSummary
-from product_industry_entities import Entities, INDUSTRY_KEYWORDS
+from product_industry_entities import Entities, nlp_artifact_cache as _nlp_artifact_cache
+from nlp_preprocessing import PreprocessedText
+from nlp_cache import ArtifactCache
+from search_index import PositionalIndex
+from yoy_summary import YoYSummary
+from instrumentation import enable, metrics, stage
+from ixbrl import IXBRLExtractor
+from table_classifier import FINANCIAL_KINDS
+from table_store import TableStore, write_excel
 
 # Webscraping packages
 import requests
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from bs4 import BeautifulSoup
 import bs4
 from bs4 import BeautifulSoup, element, Tag
@@ -19,18 +29,12 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
 # NLP packages
-import nltk
-from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize, sent_tokenize
+from nltk.tokenize import word_tokenize
 from nltk.tag import pos_tag
 from nltk.chunk import ne_chunk
 
-# Download pre-trained models from nltk
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('maxent_ne_chunker')
-nltk.download('words')
+# The pre-trained models from nltk are downloaded on first use if missing (see nltk_resources.py)
 
 
 
@@ -51,38 +55,109 @@ html_folder_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/r
 summary_folder_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/summaries_txt/"
 entity_folder_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/entities_txt/"
 
+# Path for the cache of tokens, stems and tags, reused by later runs on the same reports
+nlp_cache_folder_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/nlp_cache/"
+
+# Path for the database with the financial tables of every company, and for the optional excel workbooks
+tables_db_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/financial_tables.sqlite"
+sheets_folder_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/financial_sheets/"
+
+# Path for the indexes of the sentences of every company, to summarise a new filing against the previous one (see yoy_summary.py)
+yoy_index_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/yoy_index/"
+
+# Path for the full-text index of the saved text files, to search keywords and phrases in every report without downloading them again
+search_index_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/search_index/"
+
+# The timings and counters of every step of a run (see instrumentation.py). They are only collected when collect_metrics is True
+# (or the environment variable EDGAR_METRICS=1 is set), and saved as json and, if metrics_prometheus_path is not None, in the Prometheus text format
+collect_metrics = False
+metrics_report_path = "/Users/rodrigolopeprieto/Desktop/untitled_folder/theia_dev/run_metrics.json"
+metrics_prometheus_path = None
+
 
 
 
 ### DOWNLOAD AND STORE THE TEXT FILES AND THE HTML SOURCE ###
 
 
+# The reports are downloaded concurrently through a single EdgarFetcher, which shares its keep-alive connections
+# between downloads and keeps the whole batch within the SEC rate limit
+
 # Args: 
 # 1. urls: the dictionary of names of the companies and links to their EDGAR reports
 # 2. path: specify a folder path
+# 3. fetcher: the EdgarFetcher to download with. Defaults to the one shared by every scraper using agent_email
+# 4. stream: if True the text is extracted while downloading, with bounded memory (see TextDownload.extractText)
+# 5. compress: if True the text files are saved compressed, as {company}.txt.gz (see filing_store.py). The rest of the analysis reads them the same way
 
 # Returns: 
 # A dictionary where keys are the names of the companies and values are the path to their saved text file
 
-def save_text(urls: dict, path: str) -> dict:
+def save_text(urls: dict, path: str, fetcher: EdgarFetcher = None, stream: bool = False, compress: bool = False) -> dict:
+
+    fetcher = fetcher or shared_fetcher(agent_email)
+
+    def download(company: str) -> str:
+        td = TextDownload(urls[company], agent_email=agent_email, fetcher=fetcher)
+        return td.extractText(f"{path}" + f"{company}.txt", sep="\n", stream=stream, compress=compress)
 
-    paths = {}
-    for company in urls.keys():
-        td = TextDownload(reports_url[company], agent_email=agent_email)
-        td.extractText(f"{path}" + f"{company}.txt", sep="\n")
-        paths[company] = f"{path}" + f"{company}.txt"
+    with ThreadPoolExecutor(max_workers=fetcher.max_workers) as pool:
+        paths = dict(zip(urls.keys(), pool.map(download, urls.keys())))
 
     return paths
 
 
-def save_html(urls: dict, path: str) -> None:
-    for url in urls.keys():
-        hd = TextDownload(reports_url[url], agent_email=agent_email)
-        hd.extractHTML(f"{path}" + f"{url}.html")
+# Saves the html source of the reports. The raw source is downloaded over HTTP through the same fetcher (and cache) as the text,
+# and a browser from a shared pool is only used when render is True
+
+# Args: 
+# 1. urls, path, fetcher: as in save_text
+# 2. render: if True the pages are rendered in Chrome instead of downloaded
+
+def save_html(urls: dict, path: str, fetcher: EdgarFetcher = None, render: bool = False) -> None:
+
+    fetcher = fetcher or shared_fetcher(agent_email)
+
+    def download(company: str) -> None:
+        hd = TextDownload(urls[company], agent_email=agent_email, fetcher=fetcher)
+        hd.extractHTML(f"{path}" + f"{company}.html", render=render)
+
+    with ThreadPoolExecutor(max_workers=fetcher.max_workers) as pool:
+        list(pool.map(download, urls.keys()))
     return None
 
 
 
+### FULL-TEXT SEARCH OF THE SAVED REPORTS ###
+
+# Adds the new and changed text files to the full-text index (see search_index.py). The unchanged ones are skipped, so it can run after every download
+
+# Args:
+# 1. text_paths: the dictionary of names of the companies and paths to their saved text files (the output of save_text)
+# 2. path: the folder of the index
+
+# Returns:
+# The PositionalIndex, to search with e.g. index.search('"net sales" NEAR/10 iphone')
+
+def update_search_index(text_paths: dict, path: str = search_index_path) -> PositionalIndex:
+    index = PositionalIndex(path)
+    index.add(text_paths)
+    return index
+
+
+
+### CACHE OF NLP INTERMEDIATES ###
+
+# The cache is invalidated whenever the stop word list or the industry keywords change
+
+# Returns: 
+# The ArtifactCache used by business_summary and get_entities
+
+def nlp_artifact_cache(path: str = nlp_cache_folder_path) -> ArtifactCache:
+    return _nlp_artifact_cache(path)
+
+
+
 ### GET BUSINESS SUMMARIES FOR THE EDGAR FILES ###
 
 # Given that we have already saved the text from the EDGAR reports, we are now gonna examine it and provide a summary of the first section of the document
@@ -93,23 +168,21 @@ def save_html(urls: dict, path: str) -> None:
 # 2. threshold_prop: the name proportion of the threshold for sentence scores we want in order to be included in the summary
 #                    a lower threshold prop give a longer summary and vice versa. The default to 0.8 as it appears to be the most appropriate when tested.
 # 3. summary_name: the name we want to give to the summary file
+# 4. artifact_cache: an optional ArtifactCache. With it, re-running with a different threshold_prop skips the tokenization
 
 # Returns: 
 # Saves the summary as a txt file and returns a string with the business information  summary if needed
 
-def business_summary(filepath: str, summary_name: str, threshold_prop=0.8, return_summary= False) -> str:
+def business_summary(filepath: str, summary_name: str, threshold_prop=0.8, return_summary= False, artifact_cache: ArtifactCache = None) -> str:
 
-    # Take the subset of the file (first section) with the business information
-    b = BusinessInfo(filepath)
-    indices = b.infoLines()
-    business_info = b.businessInfo(indices)
-
-    # Summarise the first section
-    bs = BusinessSummary(filepath)
-    sentences = sent_tokenize(business_info)
-    sentence_scores = bs._calculate_sentence_scores(sentences)
+    # Take the subset of the file (first section) with the business information, and summarise it.
+    # BusinessSummary reads the file and tokenizes the section once, and its sentences and tokens are reused for the scoring
+    bs = BusinessSummary(filepath, artifact_cache=artifact_cache)
+    document = bs.preprocessed
+    sentence_scores = bs._calculate_sentence_scores(document.tokens)
     threshold = bs._calculate_average_score(sentence_scores) * threshold_prop
-    business_summary = bs._get_edgar_summary(sentences, sentence_scores, threshold)
+    business_summary = bs._get_edgar_summary(document.sentences, sentence_scores, threshold)
+    document.persist()
 
     # Save the summary
     with open(summary_name, "w") as a:
@@ -124,31 +197,67 @@ def business_summary(filepath: str, summary_name: str, threshold_prop=0.8, retur
         return None
     
 
+### YEAR-OVER-YEAR BUSINESS SUMMARIES ###
+
+# Summarises the business section of a filing against the previous filing of the same company, only tokenizing the paragraphs which changed,
+# and saves the summary with the new and changed text highlighted (see yoy_summary.py). The filings of a company must be summarised oldest first
+
+# Args:
+# 1. filepath: the path to the saved text file with the EDGAR report
+# 2. company_name: the name of the company, which names its index in yoy_index_path
+# 3. summary_name: the name we want to give to the summary file
+# 4. threshold_prop: as in business_summary
+
+# Returns:
+# The result of YoYSummary.summarise: the summary, the new, changed and removed sentences and the counts of the work done
+def yoy_business_summary(filepath: str, company_name: str, summary_name: str, threshold_prop=0.8) -> dict:
+    result = YoYSummary(yoy_index_path, threshold_prop).summarise(filepath, company_name)
+    with open(summary_name, "w") as a:
+        a.write(YoYSummary.render(result))
+    return result
+
+
+
 ### GET PRODUCT NAMES AND INDUSTRY ENTITIES ###
 
 # Analyse the text to extract the names of the main products and classify the company by industry
 # When classifying by industry the function returns the three closest matches 
     
 # Args: 
-# 1. business_info: a string containing the business information or the business summary of the company
+# 1. business_info: a string containing the business information or the business summary of the company, or its PreprocessedText
 # 2. company_name: needed to save the file in an identifyable way
+# 3. artifact_cache: an optional ArtifactCache, from which the tags of an unchanged text are loaded instead of recomputed
+# 4. ner_pool: an optional ProcessPoolExecutor created with initializer=_init_ner_worker. With it, the product entities are tagged
+#              in parallel chunks (see Entities.productEntitiesBatched), which pays off for long texts such as the whole business section
 
 # Returns: 
 # None. Saves the files to the desired folder but does not return anything in the program
-def get_entities(business_info: str, company_name: str) -> None:
+def get_entities(business_info, company_name: str, artifact_cache: ArtifactCache = None, ner_pool: ProcessPoolExecutor = None) -> None:
+
+    # Tokenize and tag the text once for both kinds of entities
+    if isinstance(business_info, PreprocessedText):
+        document = business_info
+    else:
+        document = PreprocessedText(business_info, cache=artifact_cache, section="entities")
 
     e = Entities()
     with open(f"{entity_folder_path}" + f"{company_name}" + "_entities.txt", "w") as f:
         f.write("Industry entities: ")
     
-    for i, i_entity in enumerate(e.industryEntities(business_info)):
-        f.write(f"{i + 1}" + " " + str(i_entity) + " ")
-    
-    f.write("\n")
-    
-    f.write("Product entities: ")
-    for i, p_entity in enumerate(e.productEntities(business_info)):
-        f.write(f"{i + 1}" + " " + str(p_entity) + " ")
+        for i, i_entity in enumerate(e.industryEntities(document)):
+            f.write(f"{i + 1}" + " " + str(i_entity) + " ")
+        
+        f.write("\n")
+        
+        f.write("Product entities: ")
+        if ner_pool is None:
+            products = e.productEntities(document)
+        else:
+            products, _ = e.productEntitiesBatched(document, pool=ner_pool)
+        for i, p_entity in enumerate(products):
+            f.write(f"{i + 1}" + " " + str(p_entity) + " ")
+
+    document.persist()
 
 
 ### GRAB FINANCIAL REPORTS AND SAVE AS EXCEL SPREADSHEETS ###
@@ -166,82 +275,130 @@ def replace_characters(input_string, characters_to_replace):
 
 
 
-# A function to download all financial report tables and download them as excel spreadsheets
+# A function to download the financial statements of a report and store them in the shared table database (see table_store.py),
+# and optionally as the sheets of one excel workbook per company. The tables are classified first (see table_classifier.py), so
+# only the tables of the kinds asked for are extracted to the database, not the layout and notes tables
 
 # Args: 
 # 1. url: the url of the report - this is needed to obtain the html source code, from which we identify the tables
-# 2. company_name: needed to save the file in their respective folder
+# 2. company_name: needed to identify the tables of the company in the database, and to name the workbook
+# 3. store: the TableStore to write to. Defaults to the database at tables_db_path
+# 4. excel: if True the tables are also saved as the sheets of one workbook in sheets_folder_path
+# 5. kinds: the kinds of tables to keep. Defaults to the income statements, balance sheets and cash flow statements
 
 # Returns: 
-# None. Saves the files to the desired folder but does not return anything in the program
-def get_sheets(url:str, company_name: str) -> list[str]:
+# A list with the errors encountered writing the workbook, or ["None"]
+def get_sheets(url:str, company_name: str, store: TableStore = None, excel: bool = False, kinds: tuple = FINANCIAL_KINDS) -> list[str]:
     
-    excel_logs = []
-    # Get the source html for the tables
-    t = TableDownload(url)
-    html_tables = t.getTableSource(f"{agent_email}")
+    # Get the source html for the tables, and the tables as pd.DataFrame keyed by their position in the document
+    t = TableDownload(url, agent_email=agent_email)
+    tables = t.getTablesByPosition(t.getTableSource())
 
-    # Get them as pd.DataFrame
-    tables = t.getTables(html_tables)
+    # Keep only the financial statements
+    index = t.classifyTables(tables)
+    positions = t.classifier.select(index, kinds)
+    tables = {position: tables[position] for position in positions}
 
-    for table in tables:
-        table_name = str(table.iloc[0, 0])
-        table_name = replace_characters(table_name, [" ", "  ", ",", ".", ":", ";", "(1)", "$", "(", ")"])
+    # All the tables of the filing go into the database in one transaction
+    store = store or TableStore(tables_db_path)
+    store.write(company_name, tables, url=url, kinds=index.loc[positions, "kind"].tolist())
+
+    excel_logs = []
+    if excel:
         try:
-            table.to_excel(f"/Users/rodrigolopeprieto/Desktop/theia_insights/financial_sheets/{company_name}/{table_name}.xlsx")
+            write_excel(f"{sheets_folder_path}{company_name}.xlsx", tables)
         except Exception as e:
             excel_logs.append(e)
-            continue
 
-        print("Errors encountered in:")
-        if excel_logs:
-            return excel_logs
-        else:
-            return ["None"]
+    if excel_logs:
+        print("Errors encountered in:", company_name)
+        return excel_logs
+    else:
+        return ["None"]
+
+
+# The fast path for the financial data: reads the inline XBRL facts of the report in one streaming pass (see ixbrl.py)
+# and stores them in the table database, next to the tables
+
+# Args: 
+# 1. url: the url of the report
+# 2. company_name: needed to identify the facts of the company in the database
+# 3. store: the TableStore to write to. Defaults to the database at tables_db_path
+
+# Returns: 
+# A pd.Series with the key figures of the report (see IXBRLExtractor.keyFigures)
+def get_facts(url: str, company_name: str, store: TableStore = None) -> pd.Series:
+
+    facts, _ = TableDownload(url, agent_email=agent_email).getFacts()
+
+    store = store or TableStore(tables_db_path)
+    store.writeFacts(company_name, facts)
+    return IXBRLExtractor.keyFigures(facts)
 
 
 def main():
 
+    if collect_metrics:
+        enable()
+
 
     # 1. Save the text and html
-    text_paths = save_text(reports_url, txt_folder_path) 
-    save_html(reports_url, html_folder_path) 
+    with stage("main.download"):
+        text_paths = save_text(reports_url, txt_folder_path) 
+        save_html(reports_url, html_folder_path) 
+    update_search_index(text_paths)
 
 
 
     # 2. Get the business summaries and save them in a separate folder
+    artifact_cache = nlp_artifact_cache()
     summaries = {}
-    for company in text_paths.keys():
-        summary = business_summary(text_paths[company], company, return_summary = True)
-        summaries[company] = summary
+    with stage("main.summaries"):
+        for company in text_paths.keys():
+            summary = business_summary(text_paths[company], company, return_summary = True, artifact_cache = artifact_cache)
+            summaries[company] = summary
     
 
 
     # 3. Save the product and industry entities
-    for company in summaries.keys():
-        get_entities(summaries[company], company_name = company)
+    with stage("main.entities"):
+        for company in summaries.keys():
+            get_entities(summaries[company], company_name = company, artifact_cache = artifact_cache)
 
 
 
-    # 4. Download the financial spreadsheets
-    for company in reports_url.keys():
-        get_sheets(reports_url[company], company)
+    # 4. Download the financial tables into one database
+    table_store = TableStore(tables_db_path)
+    with stage("main.tables"):
+        for company in reports_url.keys():
+            get_sheets(reports_url[company], company, store = table_store)
+            get_facts(reports_url[company], company, store = table_store)
 
 
-    # 5. Get the financial summaries
-    
-    for company in reports_url.keys():
+    # 5. Get the financial summaries, from the text files saved in step 1. A report which fails is reported with its error
+    #    and the others go on, rather than being skipped silently
+    with stage("main.financials"):
+        for company in text_paths.keys():
+            try:
+                b = BusinessInfo(text_paths[company])
+                fin_indices = b.finLines()
+                if len(fin_indices) < 2:
+                    print("No financial section (Items 7 and 9) in:", company)
+                    continue
+                fin_info = b.finInfo(fin_indices)
 
-        try:
-            b = BusinessInfo(f"/Users/rodrigolopeprieto/Desktop/theia_insights/reports_txt/{company}.txt")
-            fin_indices = b.finLines()    
-            fin_info = b.finInfo(fin_indices)
-            
-            with open(f"/Users/rodrigolopeprieto/Desktop/theia_insights/summaries_txt/{company}_financial_summary.txt", "w") as f:
-                f.write(fin_info)
-                
-        except Exception:
-            continue
+                with open(f"{summary_folder_path}" + f"{company}_financial_summary.txt", "w") as f:
+                    f.write(fin_info)
+
+            except Exception as e:
+                print(f"Errors encountered in the financial summary of {company} ({text_paths[company]}): {type(e).__name__}: {e}")
+
+
+    # 6. Save the timings and counters of the run
+    if metrics.enabled:
+        metrics.writeJSON(metrics_report_path)
+        if metrics_prometheus_path is not None:
+            metrics.writePrometheus(metrics_prometheus_path)
 
 
 
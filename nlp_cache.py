@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import zlib
+
+from instrumentation import count
+
+
+### PERSISTENT CACHE OF NLP INTERMEDIATES ###
+### TOKENIZING, STEMMING, POS TAGGING AND ne_chunk ARE THE SLOW PART OF THE SUMMARIES AND THE ENTITY RECOGNITION, AND THEIR RESULT ###
+### ONLY DEPENDS ON THE TEXT. THE FOLLOWING CLASS STORES THOSE ARTIFACTS ON DISK (PICKLED AND zlib COMPRESSED), KEYED BY THE HASH OF ###
+### THE TEXT, THE SECTION THEY BELONG TO AND THE VERSION OF THE PIPELINE, SO RE-RUNS ON UNCHANGED REPORTS SKIP ALL OF THAT WORK ###
+
+### THE KEY ALSO INCLUDES A FINGERPRINT OF THE DEPENDENCIES GIVEN TO THE CACHE (E.G. THE STOP WORD LIST AND INDUSTRY_KEYWORDS), SO ###
+### CHANGING ANY OF THEM INVALIDATES EVERY ENTRY. THE LEAST RECENTLY USED ENTRIES ARE EVICTED ONCE THE CACHE GROWS PAST max_bytes ###
+
+
+# Bump this whenever the way the artifacts are computed changes, to invalidate every cached entry
+PIPELINE_VERSION = 1
+
+
+
+
+# class ArtifactCache
+
+# ATTRIBUTES:
+# 1. cache_dir: the folder where the entries are stored
+# 2. max_bytes: the maximum total size of the entries, after which the least recently used ones are evicted
+# 3. fingerprint: the hash of the pipeline version and of the dependencies, part of every key
+# 4. stats: a dictionary counting hits, misses, stores and evictions
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. key: the key of a text and section
+# - text: the text the artifacts were computed from
+# - section: the name of the part of the report, e.g. "business" or "summary"
+
+
+# 2. get: returns the dictionary of artifacts stored for a text and section, or None
+# - text, section: as in key
+
+
+# 3. put: stores a dictionary of artifacts (sentences, tokens, tags, ...) for a text and section
+# - text, section: as in key
+# - artifacts: the dictionary of artifacts. Values must be picklable
+
+
+class ArtifactCache:
+
+    SUFFIX = ".pkl.z"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 ** 2, dependencies: dict = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        # Running total of the size of the entries, so put does not walk the folder. Computed by one scan on the first put
+        self._total = None
+
+        fingerprint = json.dumps({"version": PIPELINE_VERSION, "dependencies": dependencies or {}}, sort_keys=True, default=str)
+        self.fingerprint = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+
+    def key(self, text: str, section: str) -> str:
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{text_hash}:{section}:{self.fingerprint}".encode("utf-8")).hexdigest()
+
+
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + self.SUFFIX)
+
+
+
+    def get(self, text: str, section: str) -> dict:
+        path = self._path(self.key(text, section))
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = None
+
+        artifacts = None
+        if data is not None:
+            # Unpickling can fail with almost anything (AttributeError, ModuleNotFoundError, ...) when the entry is
+            # truncated or was written by other code, so any error is a miss and the broken entry is removed
+            try:
+                artifacts = pickle.loads(zlib.decompress(data))
+            except Exception:
+                self._remove(path, len(data))
+
+        if artifacts is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            count("nlp_cache.misses")
+            return None
+
+        # The modification time marks the last use, for the LRU eviction. Another process sharing the folder
+        # may have evicted the entry since it was read, which is a miss like any other
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.stats["misses"] += 1
+            count("nlp_cache.misses")
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        count("nlp_cache.hits")
+        return artifacts
+
+
+
+    def put(self, text: str, section: str, artifacts: dict) -> None:
+        path = self._path(self.key(text, section))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(pickle.dumps(artifacts, protocol=pickle.HIGHEST_PROTOCOL), 6)
+
+        # A unique temporary name, so two threads or processes storing the same key do not write to the same file
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}-{time.time_ns()}.tmp"
+        try:
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+            with self._lock:
+                if self._total is None:
+                    self._total = self._scan()[1]
+                try:
+                    self._total -= os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp_path, path)
+                self._total += len(data)
+
+                self.stats["stores"] += 1
+                if self._total > self.max_bytes:
+                    self._evict()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+
+    def _remove(self, path: str, size: int) -> None:
+        with self._lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return None
+            if self._total is not None:
+                self._total -= size
+
+
+
+    # Returns every entry as (last use, size, path) and their total size
+    def _scan(self) -> tuple:
+        entries = []
+        for folder in os.scandir(self.cache_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith(self.SUFFIX):
+                    # Entries evicted by another process since the folder was listed are skipped
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries, sum(size for _, size, _ in entries)
+
+
+
+    # Only called once the running total is over max_bytes. The folder is scanned again, which also picks up
+    # the entries written by other processes sharing it, and the total is reset to what is left
+    def _evict(self) -> None:
+        entries, total = self._scan()
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.stats["evictions"] += 1
+        self._total = total
@@ -0,0 +1,140 @@
+from functools import cached_property
+
+from nltk.chunk import ne_chunk
+from nltk.stem import PorterStemmer
+from nltk.tag import pos_tag
+from nltk.tokenize import sent_tokenize, word_tokenize
+
+from instrumentation import count, stage, timed
+from nlp_cache import ArtifactCache
+from nltk_resources import ensure_resource
+
+
+### SHARED NLP PREPROCESSING ###
+### THE SUMMARISATION AND THE ENTITY RECOGNITION ALL NEED THE SAME SENTENCES, TOKENS, STEMS AND POS TAGS OF A TEXT. THE FOLLOWING ###
+### CLASS COMPUTES EACH OF THEM AT MOST ONCE PER TEXT, AND ONLY WHEN IT IS FIRST NEEDED, SO THAT THE SAME OBJECT CAN BE HANDED TO ###
+### BusinessSummary AND Entities WITHOUT ANY TEXT BEING TOKENIZED TWICE ###
+
+### WITH AN ArtifactCache (SEE nlp_cache.py), THE ARTIFACTS ALREADY COMPUTED IN A PREVIOUS RUN FOR THE SAME TEXT ARE LOADED FROM DISK, ###
+### AND persist SAVES THE ONES COMPUTED IN THIS RUN ###
+
+
+
+
+# class PreprocessedText
+
+# ATTRIBUTES:
+# 1. text: the raw text, in string format
+# 2. sentences: the sentences of the text, from nltk sent_tokenize
+# 3. tokens: the words of every sentence, a list of lists of strings. Flattened, they are exactly word_tokenize(text)
+# 4. words: all the words of the text, in order
+# 5. lower_words: the words in lower case
+# 6. stems: the stem of every word (memoized, so every distinct word is only stemmed once)
+# 7. pos_tags: the part of speech tags of the words, from nltk pos_tag
+# 8. named_entities: the named entity tree of the text, from nltk ne_chunk
+# 9. stem_cache: the dictionary of stems already computed, which can be shared with a SentenceScorer
+# 10. cache: an optional ArtifactCache the artifacts are loaded from and persisted to
+# 11. section: the name of the part of the report the text comes from, part of the cache key (e.g. "business" or "summary")
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. stem: the memoized stem of a word
+# - word: the word to stem
+
+
+# 2. persist: saves the artifacts computed so far to the cache, if there is a cache and anything new was computed
+# - only takes self
+
+
+class PreprocessedText:
+
+    # The artifacts worth caching: the rest are cheap to derive from them
+    CACHED_ARTIFACTS = ("sentences", "tokens", "stems", "pos_tags", "named_entities")
+
+    def __init__(self, text: str, stemmer: PorterStemmer = None, cache: ArtifactCache = None, section: str = "text"):
+        self.text = text
+        self.stemmer = stemmer or PorterStemmer()
+        self.stem_cache = {}
+        self.cache = cache
+        self.section = section
+        self._persisted = set()
+
+        if cache is not None:
+            artifacts = cache.get(text, section)
+            if artifacts:
+                self.stem_cache.update(artifacts.pop("stem_cache", {}))
+                # cached_property looks in the instance dictionary first, so loaded artifacts are never recomputed
+                self.__dict__.update(artifacts)
+                self._persisted = set(artifacts)
+
+
+
+    def persist(self) -> None:
+        if self.cache is None:
+            return None
+        artifacts = {name: self.__dict__[name] for name in self.CACHED_ARTIFACTS if name in self.__dict__}
+        if set(artifacts) - self._persisted:
+            artifacts["stem_cache"] = self.stem_cache
+            self.cache.put(self.text, self.section, artifacts)
+            self._persisted = set(artifacts) - {"stem_cache"}
+
+
+
+    def stem(self, word: str) -> str:
+        stem = self.stem_cache.get(word)
+        if stem is None:
+            stem = self.stem_cache[word] = self.stemmer.stem(word)
+        return stem
+
+
+
+    @cached_property
+    @timed("nlp.sent_tokenize")
+    def sentences(self) -> list[str]:
+        ensure_resource("punkt")
+        sentences = sent_tokenize(self.text)
+        count("nlp.sentences", len(sentences))
+        return sentences
+
+
+
+    @cached_property
+    @timed("nlp.word_tokenize")
+    def tokens(self) -> list[list[str]]:
+        return [word_tokenize(sentence, preserve_line=True) for sentence in self.sentences]
+
+
+
+    @cached_property
+    def words(self) -> list[str]:
+        return [word for sentence in self.tokens for word in sentence]
+
+
+
+    @cached_property
+    def lower_words(self) -> list[str]:
+        return [word.lower() for word in self.words]
+
+
+
+    @cached_property
+    @timed("nlp.stem")
+    def stems(self) -> list[str]:
+        return [self.stem(word) for word in self.words]
+
+
+
+    @cached_property
+    @timed("nlp.pos_tag")
+    def pos_tags(self) -> list[tuple[str, str]]:
+        ensure_resource("tagger")
+        return pos_tag(self.words)
+
+
+
+    @cached_property
+    def named_entities(self):
+        tags = self.pos_tags
+        ensure_resource("ne_chunker", "words")
+        with stage("nlp.ne_chunk"):
+            return ne_chunk(tags)
@@ -0,0 +1,122 @@
+import argparse
+import os
+import sys
+import threading
+
+import nltk
+
+
+### LAZY LOADING OF THE nltk MODELS ###
+### THE TOKENIZERS, THE TAGGER, THE NAMED ENTITY CHUNKER AND THE STOP WORDS NEED DATA WHICH nltk DOWNLOADS SEPARATELY. INSTEAD OF CALLING ###
+### nltk.download ON EVERY IMPORT (A NETWORK ROUND-TRIP PER MODEL, IN EVERY PROCESS), THE CODE USING A MODEL CALLS ensure_resource RIGHT ###
+### BEFORE ITS FIRST USE. IT LOOKS FOR THE MODEL ON DISK, AND ONLY DOWNLOADS IT IF IT IS MISSING. EVERY RESOURCE IS ONLY CHECKED ONCE PER ###
+### PROCESS, SO LATER CALLS COST A SET LOOKUP ###
+
+### THE NAMES OF THE PACKAGES CHANGED IN nltk 3.9 (E.G. punkt BECAME punkt_tab, AND 3.9 CANNOT USE THE OLD ONE), SO THE PACKAGE OF EVERY ###
+### RESOURCE DEPENDS ON THE INSTALLED VERSION OF nltk ###
+
+### WITH THE ENVIRONMENT VARIABLE EDGAR_NLTK_OFFLINE=1 NOTHING IS EVER DOWNLOADED, AND A MISSING MODEL RAISES A LookupError STRAIGHT AWAY. ###
+### THIS IS MEANT FOR WORKERS WITHOUT INTERNET ACCESS, AFTER PREFETCHING EVERYTHING WITH: python nltk_resources.py ###
+
+
+_NEW_PACKAGES = tuple(int(part) for part in nltk.__version__.split(".")[:2]) >= (3, 9)
+
+# For every resource, its nltk.data path and the package to download
+if _NEW_PACKAGES:
+    RESOURCES = {
+        "punkt": ("tokenizers/punkt_tab/english/", "punkt_tab"),
+        "tagger": ("taggers/averaged_perceptron_tagger_eng/", "averaged_perceptron_tagger_eng"),
+        "ne_chunker": ("chunkers/maxent_ne_chunker_tab/english_ace_multiclass/", "maxent_ne_chunker_tab"),
+        "words": ("corpora/words", "words"),
+        "stopwords": ("corpora/stopwords", "stopwords"),
+    }
+else:
+    RESOURCES = {
+        "punkt": ("tokenizers/punkt", "punkt"),
+        "tagger": ("taggers/averaged_perceptron_tagger", "averaged_perceptron_tagger"),
+        "ne_chunker": ("chunkers/maxent_ne_chunker", "maxent_ne_chunker"),
+        "words": ("corpora/words", "words"),
+        "stopwords": ("corpora/stopwords", "stopwords"),
+    }
+
+OFFLINE_VARIABLE = "EDGAR_NLTK_OFFLINE"
+
+_ensured = set()
+_lock = threading.Lock()
+
+
+
+def offline() -> bool:
+    return os.environ.get(OFFLINE_VARIABLE, "").lower() in ("1", "true", "yes")
+
+
+
+def _find(name: str) -> bool:
+    try:
+        nltk.data.find(RESOURCES[name][0])
+        return True
+    except LookupError:
+        return False
+
+
+
+# Makes sure the data of some resources is on disk, downloading it if needed (unless offline)
+
+# Args:
+# 1. names: the names of the resources, keys of RESOURCES
+# 2. quiet: if False, the progress of the downloads is printed
+
+# Returns:
+# None. Raises a LookupError if a resource is missing and cannot be downloaded
+def ensure_resource(*names: str, quiet: bool = True) -> None:
+    for name in names:
+        if name in _ensured:
+            continue
+
+        with _lock:
+            if name in _ensured:
+                continue
+            if not _find(name):
+                if offline():
+                    raise LookupError(f"The nltk resource {name!r} is not installed and {OFFLINE_VARIABLE} is set. "
+                                      f"Run python nltk_resources.py on a machine with internet access first")
+                try:
+                    nltk.download(RESOURCES[name][1], quiet=quiet, raise_on_error=True)
+                except ValueError as e:
+                    raise LookupError(f"The nltk resource {name!r} could not be downloaded: {e}") from e
+                if not _find(name):
+                    raise LookupError(f"The nltk resource {name!r} could not be downloaded")
+            _ensured.add(name)
+
+
+
+# Checks (and unless check_only, downloads) every resource. Returns the names of the missing ones
+def prefetch(check_only: bool = False, quiet: bool = False) -> list[str]:
+    missing = []
+    for name in RESOURCES:
+        if check_only:
+            if not _find(name):
+                missing.append(name)
+            continue
+        try:
+            ensure_resource(name, quiet=quiet)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the nltk models used by the EDGAR analysis ahead of time")
+    parser.add_argument("--check", action="store_true", help="only report the missing models, without downloading them")
+    args = parser.parse_args()
+
+    missing = prefetch(check_only=args.check)
+    for name in RESOURCES:
+        print(f"{name:<12}{'missing' if name in missing else 'ok'}")
+    sys.exit(1 if missing else 0)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,636 @@
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+
+from business_info import BusinessInfo, BusinessSummary
+from edgar_fetcher import shared_fetcher
+from instrumentation import METRICS_VARIABLE, enable, metrics, stage as metrics_stage
+from nlp_cache import ArtifactCache
+from nlp_preprocessing import PreprocessedText
+from product_industry_entities import Entities, nlp_artifact_cache
+from table_classifier import FINANCIAL_KINDS
+from table_store import TableStore, write_excel
+from text_scrapper import TextDownload, TableDownload
+
+
+### BATCH PIPELINE FOR MANY FILINGS ###
+### main() RUNS EVERY STEP AS A LOOP OVER ALL THE COMPANIES BEFORE STARTING THE NEXT STEP. THE FOLLOWING CODE RUNS THE STEPS OF EVERY ###
+### FILING AS A SMALL GRAPH OF STAGES (DOWNLOAD -> SECTIONS -> SUMMARY -> ENTITIES, AND DOWNLOAD -> TABLES AND FACTS): A STAGE OF A FILING STARTS ###
+### AS SOON AS THE STAGES IT DEPENDS ON ARE DONE, THE NETWORK STAGES RUN IN A POOL OF THREADS AND THE NLP STAGES IN A POOL OF PROCESSES, ###
+### SO THE DOWNLOADS OF SOME FILINGS OVERLAP WITH THE SUMMARIES OF OTHERS ###
+
+### ONLY max_active FILINGS ARE IN PROGRESS AT ANY TIME (THE REST ARE NOT EVEN READ FROM THE INPUT), SO THOUSANDS OF FILINGS DO NOT PILE ###
+### UP IN MEMORY. A FAILING STAGE ONLY STOPS THE STAGES OF THAT FILING WHICH DEPEND ON IT, AND ITS ERROR IS RECORDED IN A PROGRESS ###
+### MANIFEST. RUNNING AGAIN WITH THE SAME MANIFEST SKIPS EVERY STAGE WHICH IS ALREADY DONE ###
+
+### THE RUNS ARE INCREMENTAL: THE MANIFEST KEEPS THE HASH OF THE CONTENT OF EVERY ARTIFACT (THE TEXT, THE SUMMARIES, THE ENTITIES, THE ###
+### SHEETS), AND FOR EVERY STAGE THE FINGERPRINT OF ITS CODE AND SETTINGS AND THE HASHES OF THE ARTIFACTS IT WAS COMPUTED FROM. A STAGE ###
+### ONLY RUNS AGAIN WHEN ONE OF THOSE CHANGED (OR ITS OUTPUT IS GONE), SO ADDING A COMPANY ONLY RUNS THAT COMPANY, AND CHANGING THE ###
+### threshold_prop OF THE SUMMARIES RE-RUNS THE SUMMARIES, AND THE ENTITIES ONLY OF THE SUMMARIES WHICH ACTUALLY CHANGED ###
+
+### RUN FROM THE COMMAND LINE WITH: python pipeline.py filings.csv --agent-email you@example.com --output folder ###
+### WHERE filings.csv HAS ONE "name,url" PER LINE ###
+
+
+# The statuses of a stage of a filing. UNCHANGED is only reported to progress, for the stages which were up to date
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+UNCHANGED = "unchanged"
+
+NETWORK = "network"
+CPU = "cpu"
+
+
+
+
+# class Stage
+
+# ATTRIBUTES:
+# 1. name: the name of the stage, which other stages use to depend on it
+# 2. function: called as function(name, url, inputs), where inputs is a dictionary from the name of every stage it depends on to its result.
+#              Its result must be JSON serializable (e.g. a path), to be kept in the manifest. CPU stages run in other processes, so their
+#              function must be picklable: a module-level function, or a functools.partial of one
+# 3. depends: the names of the stages whose results it needs
+# 4. kind: NETWORK to run in the pool of threads, CPU to run in the pool of processes
+# 5. version: bump it when the code of the function changes, to run the stage again on every filing
+# 6. fingerprint: the hash of the name, version and function of the stage, including the arguments of a functools.partial.
+#                 A stage whose fingerprint changed runs again on every filing
+
+
+class Stage:
+
+    def __init__(self, name: str, function, depends: tuple = (), kind: str = CPU, version: int = 1):
+        if kind not in (NETWORK, CPU):
+            raise ValueError(f"Unknown kind of stage: {kind}")
+        self.name = name
+        self.function = function
+        self.depends = tuple(depends)
+        self.kind = kind
+        self.version = version
+
+        target = function.func if isinstance(function, partial) else function
+        description = {
+            "name": name,
+            "version": version,
+            "function": f"{target.__module__}.{target.__qualname__}",
+            "arguments": function.keywords if isinstance(function, partial) else {},
+        }
+        self.fingerprint = hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+
+
+# The hash of the content of the result of a stage: of the files, if it is a path or a list of paths, or of the value otherwise
+def artifact_hash(result) -> str:
+    digest = hashlib.sha256()
+    for item in result if isinstance(result, list) else [result]:
+        if isinstance(item, str) and os.path.isfile(item):
+            with open(item, "rb") as file:
+                for block in iter(lambda: file.read(1024 ** 2), b""):
+                    digest.update(block)
+        else:
+            digest.update(json.dumps(item, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+
+# Whether the files of the result of a stage are still there
+def _outputs_exist(result) -> bool:
+    return all(os.path.exists(item) for item in (result if isinstance(result, list) else [result]) if isinstance(item, str))
+
+
+
+
+# class ProgressManifest
+
+# ATTRIBUTES:
+# 1. path: the JSON file where the progress is saved. If None, the progress is only kept in memory
+# 2. save_interval: the minimum number of seconds between two saves while running, so big batches are not rewritten after every stage
+# 3. filings: a dictionary from the name of every filing to its url and the record of every stage: its status, result, seconds and error,
+#             the fingerprint of the stage, the hashes of its inputs and the hash of its result
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. register: adds a filing, or updates its url. A new url re-runs the first stages, and the rest only if their inputs change
+# - name, url: the name and url of the filing
+
+
+# 2. record: records the outcome of a stage of a filing
+# - name, stage: the filing and the stage
+# - status: DONE, FAILED or SKIPPED
+# - result: the result of the stage, if DONE
+# - error: the error message, if FAILED or SKIPPED
+# - seconds: how long the stage took
+# - fingerprint: the fingerprint of the stage
+# - inputs: the hashes the stage was computed from (of the results of the stages it depends on, or of the url)
+# - digest: the artifact_hash of the result
+
+
+# 3. status, result and artifactHash: the status (None if it never ran), the result and the hash of the result of a stage of a filing
+# - name, stage: the filing and the stage
+
+
+# 4. stage: the whole record of a stage of a filing, or None
+# - name, stage: the filing and the stage
+
+
+# 5. save: writes the manifest to path, replacing it atomically
+# - force: if False, only saves when save_interval seconds have passed since the last save
+
+
+# 6. summary: a dictionary counting the filings in every status, for every stage
+
+
+# 7. failures: the list of (name, stage, error) of every failed stage
+
+
+class ProgressManifest:
+
+    VERSION = 2
+
+    def __init__(self, path: str = None, save_interval: float = 2.0):
+        self.path = path
+        self.save_interval = save_interval
+        self.filings = {}
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                saved = json.load(file)
+            if saved.get("version") == self.VERSION:
+                self.filings = saved["filings"]
+
+
+
+    def register(self, name: str, url: str) -> None:
+        with self._lock:
+            self.filings.setdefault(name, {"url": url, "stages": {}})["url"] = url
+
+
+
+    def record(self, name: str, stage: str, status: str, result=None, error: str = None, seconds: float = None,
+               fingerprint: str = None, inputs: dict = None, digest: str = None) -> None:
+        with self._lock:
+            self.filings[name]["stages"][stage] = {
+                "status": status, "result": result, "error": error, "seconds": seconds,
+                "fingerprint": fingerprint, "inputs": inputs, "hash": digest,
+            }
+
+
+
+    def stage(self, name: str, stage: str) -> dict:
+        return self.filings.get(name, {}).get("stages", {}).get(stage)
+
+
+
+    def status(self, name: str, stage: str) -> str:
+        return self.filings.get(name, {}).get("stages", {}).get(stage, {}).get("status")
+
+
+
+    def result(self, name: str, stage: str):
+        return self.filings[name]["stages"][stage]["result"]
+
+
+
+    def artifactHash(self, name: str, stage: str) -> str:
+        return self.filings[name]["stages"][stage]["hash"]
+
+
+
+    def save(self, force: bool = True) -> None:
+        if self.path is None or (not force and time.monotonic() - self._last_save < self.save_interval):
+            return None
+
+        with self._lock:
+            data = json.dumps({"version": self.VERSION, "filings": self.filings}, indent=1)
+            self._last_save = time.monotonic()
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(self.path + ".tmp", self.path)
+
+
+
+    def summary(self) -> dict:
+        counts = {}
+        for filing in self.filings.values():
+            for stage, outcome in filing["stages"].items():
+                stage_counts = counts.setdefault(stage, {})
+                stage_counts[outcome["status"]] = stage_counts.get(outcome["status"], 0) + 1
+        return counts
+
+
+
+    def failures(self) -> list[tuple[str, str, str]]:
+        return [
+            (name, stage, outcome["error"])
+            for name, filing in self.filings.items()
+            for stage, outcome in filing["stages"].items()
+            if outcome["status"] == FAILED
+        ]
+
+
+
+
+# Runs a stage, times it and hashes its result, in the worker. Module-level, so the pool of processes can pickle it
+# A worker process also hands back the metrics recorded while running the stage (see instrumentation.py), which would be lost otherwise
+def _run_stage(function, name: str, url: str, inputs: dict, stage_name: str = None) -> tuple:
+    start = time.perf_counter()
+    with metrics_stage(f"pipeline.{stage_name}"):
+        result = function(name, url, inputs)
+    seconds = time.perf_counter() - start
+    worker_metrics = metrics.drain() if metrics.enabled and multiprocessing.parent_process() is not None else None
+    return result, seconds, artifact_hash(result), worker_metrics
+
+
+
+
+# class BatchRunner
+
+# ATTRIBUTES:
+# 1. stages: the list of Stages, in an order where every stage comes after the stages it depends on
+# 2. manifest: the ProgressManifest where the progress is recorded, and from which a previous run is resumed. A stage of a filing only runs
+#              if it never ran, if its fingerprint or the hashes of its inputs changed, or if its output files are missing
+# 3. network_workers: the number of threads of the NETWORK stages
+# 4. cpu_workers: the number of processes of the CPU stages (by default, one per core)
+# 5. max_active: the maximum number of filings in progress at the same time
+# 6. cpu_initializer: an optional function run once by every process when it starts, e.g. to load models. The processes are started by a
+#                    forkserver, so like the functions of the CPU stages it must be picklable, and they inherit nothing else from this process
+# 7. retry_failed: if True, the stages which failed in a previous run are run again even if their inputs did not change
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. run: runs every stage of every filing and returns the manifest
+# - filings: an iterable of (name, url) pairs, or a dictionary from names to urls. It is only read as filings are admitted. A pair repeated
+#            is only run once, and a name repeated with another url raises a ValueError
+# - progress: an optional function called as progress(name, stage, status) after every stage, with status UNCHANGED for the stages
+#             which were up to date
+
+
+class BatchRunner:
+
+    def __init__(self, stages: list[Stage], manifest: ProgressManifest = None, network_workers: int = 8, cpu_workers: int = None,
+                 max_active: int = None, cpu_initializer=None, retry_failed: bool = False):
+        names = set()
+        for stage in stages:
+            if stage.name in names:
+                raise ValueError(f"Two stages are called {stage.name}")
+            missing = [name for name in stage.depends if name not in names]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on {missing}, which must come before it")
+            names.add(stage.name)
+
+        self.stages = stages
+        self.manifest = manifest if manifest is not None else ProgressManifest()
+        self.network_workers = network_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.max_active = max_active or 2 * (self.network_workers + self.cpu_workers)
+        self.cpu_initializer = cpu_initializer
+        self.retry_failed = retry_failed
+
+
+
+    def _inputHashes(self, name: str, url: str, stage: Stage) -> dict:
+        if not stage.depends:
+            return {"url": hashlib.sha256(url.encode("utf-8")).hexdigest()}
+        return {depend: self.manifest.artifactHash(name, depend) for depend in stage.depends}
+
+
+
+    def _upToDate(self, name: str, stage: Stage, inputs: dict) -> bool:
+        record = self.manifest.stage(name, stage.name)
+        if record is None or record.get("fingerprint") != stage.fingerprint or record.get("inputs") != inputs:
+            return False
+        if record["status"] == DONE:
+            return _outputs_exist(record["result"])
+        return record["status"] == FAILED and not self.retry_failed
+
+
+
+    def run(self, filings, progress=None) -> ProgressManifest:
+        if isinstance(filings, dict):
+            filings = filings.items()
+        pending = iter(filings)
+        exhausted = False
+        # The url of every filing admitted, so a filing listed twice is not run twice at the same time
+        admitted = {}
+
+        # For every filing in progress, the stages not finished yet
+        active = {}
+        # For every running future, its filing and stage
+        running = {}
+        # The number of running stages of every kind, kept at most at twice the workers so the rest wait here, in order
+        capacity = {NETWORK: 2 * self.network_workers, CPU: 2 * self.cpu_workers}
+        in_flight = {NETWORK: 0, CPU: 0}
+
+        # The processes are started by a forkserver, not forked from this process: the download threads may be holding locks (of the
+        # HTTP cache, the FilingDocument registry, the connection pools...) when a worker starts, and a forked child would inherit them held
+        with ThreadPoolExecutor(self.network_workers) as network_pool, \
+                ProcessPoolExecutor(self.cpu_workers, mp_context=multiprocessing.get_context("forkserver"),
+                                    initializer=self.cpu_initializer) as cpu_pool:
+            pools = {NETWORK: network_pool, CPU: cpu_pool}
+
+            while True:
+                # Admit new filings while there is room
+                while not exhausted and len(active) < self.max_active:
+                    try:
+                        name, url = next(pending)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if name in admitted:
+                        if admitted[name] != url:
+                            raise ValueError(f"Filing {name} is given twice, with {admitted[name]} and {url}")
+                        continue
+                    admitted[name] = url
+                    self.manifest.register(name, url)
+                    active[name] = (url, {stage.name: stage for stage in self.stages})
+
+                self._submit(active, running, pools, in_flight, capacity, progress)
+
+                if not running:
+                    if exhausted and not active:
+                        break
+                    # Nothing is running and nothing more can be admitted, so the stages left would wait for each other forever
+                    if exhausted or len(active) >= self.max_active:
+                        raise RuntimeError(f"No stage of {sorted(active)} can run")
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, stage, inputs = running.pop(future)
+                    in_flight[stage.kind] -= 1
+                    url, remaining = active[name]
+                    try:
+                        result, seconds, digest, worker_metrics = future.result()
+                    except Exception as e:
+                        self.manifest.record(name, stage.name, FAILED, error=f"{type(e).__name__}: {e}",
+                                             fingerprint=stage.fingerprint, inputs=inputs)
+                    else:
+                        self.manifest.record(name, stage.name, DONE, result=result, seconds=seconds,
+                                             fingerprint=stage.fingerprint, inputs=inputs, digest=digest)
+                        if worker_metrics:
+                            metrics.merge(worker_metrics)
+                    del remaining[stage.name]
+                    if progress is not None:
+                        progress(name, stage.name, self.manifest.status(name, stage.name))
+                    if not remaining:
+                        del active[name]
+                self.manifest.save(force=False)
+
+        self.manifest.save()
+        return self.manifest
+
+
+
+    def _submit(self, active: dict, running: dict, pools: dict, in_flight: dict, capacity: dict, progress) -> None:
+        started = {(name, stage.name) for name, stage, _ in running.values()}
+
+        for name, (url, remaining) in list(active.items()):
+            for stage in list(remaining.values()):
+                if (name, stage.name) in started:
+                    continue
+                # A dependency still to run in this run has no status yet, whatever it was in a previous run
+                statuses = [None if depend in remaining else self.manifest.status(name, depend) for depend in stage.depends]
+                if any(status in (FAILED, SKIPPED) for status in statuses):
+                    self.manifest.record(name, stage.name, SKIPPED, error="a stage it depends on did not finish")
+                    del remaining[stage.name]
+                    if progress is not None:
+                        progress(name, stage.name, SKIPPED)
+                    continue
+                if any(status != DONE for status in statuses):
+                    continue
+
+                input_hashes = self._inputHashes(name, url, stage)
+                if self._upToDate(name, stage, input_hashes):
+                    del remaining[stage.name]
+                    if progress is not None:
+                        progress(name, stage.name, UNCHANGED)
+                    continue
+                if in_flight[stage.kind] >= capacity[stage.kind]:
+                    continue
+
+                inputs = {depend: self.manifest.result(name, depend) for depend in stage.depends}
+                future = pools[stage.kind].submit(_run_stage, stage.function, name, url, inputs, stage.name)
+                running[future] = (name, stage, input_hashes)
+                in_flight[stage.kind] += 1
+
+            if not remaining:
+                del active[name]
+
+
+
+
+### THE STAGES OF THE EDGAR PIPELINE ###
+### THE SAME STEPS AS main(), WRITING INTO SUBFOLDERS OF ONE OUTPUT FOLDER ###
+
+
+# The ArtifactCache of every folder, created once per process
+_artifact_caches = {}
+
+
+
+def _artifact_cache(folder: str) -> ArtifactCache:
+    if folder not in _artifact_caches:
+        _artifact_caches[folder] = nlp_artifact_cache(folder)
+    return _artifact_caches[folder]
+
+
+
+# Downloads the text of the filing, compressed if compress is True (see filing_store.py). Returns the path of the text file
+def download_stage(name: str, url: str, inputs: dict, agent_email: str, folder: str, compress: bool = False) -> str:
+    path = os.path.join(folder, "reports_txt", f"{name}.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return TextDownload(url, agent_email, fetcher=shared_fetcher(agent_email)).extractText(path, stream=True, compress=compress)
+
+
+
+# Builds the section index of the text file (saved next to it for the next stages) and saves the financial summary
+# Returns the path of the financial summary, or None if the filing has no Items 7 and 9
+def sections_stage(name: str, url: str, inputs: dict, folder: str) -> str:
+    b = BusinessInfo(inputs["download"])
+    fin_indices = b.finLines()
+    if len(fin_indices) < 2:
+        return None
+
+    path = os.path.join(folder, "summaries_txt", f"{name}_financial_summary.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(b.finInfo(fin_indices))
+    return path
+
+
+
+# Summarises the business section. Returns the path of the summary
+def summary_stage(name: str, url: str, inputs: dict, folder: str, threshold_prop: float = 0.8) -> str:
+    bs = BusinessSummary(inputs["download"], artifact_cache=_artifact_cache(os.path.join(folder, "nlp_cache")))
+    document = bs.preprocessed
+    sentence_scores = bs._calculate_sentence_scores(document.tokens)
+    threshold = bs._calculate_average_score(sentence_scores) * threshold_prop
+    summary = bs._get_edgar_summary(document.sentences, sentence_scores, threshold)
+    document.persist()
+
+    path = os.path.join(folder, "summaries_txt", f"{name}_summary.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(summary)
+    return path
+
+
+
+# Finds the industry and product entities of the summary. Returns the path of the entities file
+def entities_stage(name: str, url: str, inputs: dict, folder: str) -> str:
+    with open(inputs["summary"]) as f:
+        summary = f.read()
+    document = PreprocessedText(summary, cache=_artifact_cache(os.path.join(folder, "nlp_cache")), section="entities")
+
+    e = Entities()
+    path = os.path.join(folder, "entities_txt", f"{name}_entities.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("Industry entities: ")
+        for i, i_entity in enumerate(e.industryEntities(document)):
+            f.write(f"{i + 1}" + " " + str(i_entity) + " ")
+        f.write("\n")
+        f.write("Product entities: ")
+        for i, p_entity in enumerate(e.productEntities(document)):
+            f.write(f"{i + 1}" + " " + str(p_entity) + " ")
+
+    document.persist()
+    return path
+
+
+
+# Stores the financial statements of the filing (see table_classifier.py) in the table database of the output folder (see table_store.py), and optionally in one excel workbook.
+# The page comes from the HTTP cache filled by the download stage
+# Returns the path of the database, the number of tables and the path of the workbook (or None, also when no statement was found)
+def tables_stage(name: str, url: str, inputs: dict, agent_email: str, folder: str, excel: bool = False,
+                 kinds: tuple = FINANCIAL_KINDS) -> dict:
+    t = TableDownload(url, agent_email, fetcher=shared_fetcher(agent_email))
+    tables = t.getTablesByPosition(t.getTableSource())
+    index = t.classifyTables(tables)
+    positions = t.classifier.select(index, kinds)
+    tables = {position: tables[position] for position in positions}
+
+    os.makedirs(folder, exist_ok=True)
+    store_path = os.path.join(folder, "financial_tables.sqlite")
+    count = TableStore(store_path).write(name, tables, url=url, kinds=index.loc[positions, "kind"].tolist())
+
+    workbook = None
+    if excel and tables:
+        workbook = os.path.join(folder, "financial_sheets", f"{name}.xlsx")
+        os.makedirs(os.path.dirname(workbook), exist_ok=True)
+        write_excel(workbook, tables)
+    return {"store": store_path, "tables": count, "excel": workbook}
+
+
+
+# Stores the inline XBRL facts of the filing in the table database of the output folder. Returns the path of the database and the number of facts
+def facts_stage(name: str, url: str, inputs: dict, agent_email: str, folder: str) -> dict:
+    facts, _ = TableDownload(url, agent_email, fetcher=shared_fetcher(agent_email)).getFacts()
+
+    os.makedirs(folder, exist_ok=True)
+    store_path = os.path.join(folder, "financial_tables.sqlite")
+    return {"store": store_path, "facts": TableStore(store_path).writeFacts(name, facts)}
+
+
+
+# The stages of the EDGAR pipeline
+
+# Args:
+# 1. agent_email: the email sent to the SEC with every request
+# 2. folder: the output folder, where reports_txt, summaries_txt, entities_txt, nlp_cache, financial_tables.sqlite and financial_sheets are created
+# 3. threshold_prop: as in business_summary in main.py
+# 4. tables: if False, the tables are not exported
+# 5. excel: if True, the tables of every filing are also saved as the sheets of one excel workbook
+# 6. facts: if False, the inline XBRL facts are not stored
+# 7. compress: if True, the text of the filings is saved compressed (reports_txt/{name}.txt.gz, see filing_store.py)
+
+# Returns:
+# The list of Stages, to be given to a BatchRunner
+def edgar_stages(agent_email: str, folder: str, threshold_prop: float = 0.8, tables: bool = True, excel: bool = False,
+                 facts: bool = True, compress: bool = False) -> list[Stage]:
+    stages = [
+        Stage("download", partial(download_stage, agent_email=agent_email, folder=folder, compress=compress), kind=NETWORK),
+        Stage("sections", partial(sections_stage, folder=folder), depends=("download",)),
+        Stage("summary", partial(summary_stage, folder=folder, threshold_prop=threshold_prop), depends=("download",)),
+        Stage("entities", partial(entities_stage, folder=folder), depends=("summary",)),
+    ]
+    if tables:
+        stages.append(Stage("tables", partial(tables_stage, agent_email=agent_email, folder=folder, excel=excel), depends=("download",), kind=NETWORK))
+    if facts:
+        stages.append(Stage("facts", partial(facts_stage, agent_email=agent_email, folder=folder), depends=("download",), kind=NETWORK))
+    return stages
+
+
+
+# Reads the filings of a csv file with one "name,url" per line, lazily. Repeated lines are skipped, and a name repeated with another url raises a ValueError
+def read_filings(path: str):
+    seen = {}
+    with open(path, newline="") as file:
+        for number, row in enumerate(csv.reader(file), 1):
+            if len(row) >= 2 and not row[0].startswith("#"):
+                name, url = row[0].strip(), row[1].strip()
+                if name in seen:
+                    if seen[name] != url:
+                        raise ValueError(f"{path}, line {number}: filing {name} was already given with {seen[name]}")
+                    continue
+                seen[name] = url
+                yield name, url
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the EDGAR pipeline over many filings")
+    parser.add_argument("filings", help="a csv file with one name,url per line")
+    parser.add_argument("--agent-email", required=True)
+    parser.add_argument("--output", default="edgar_output")
+    parser.add_argument("--manifest", default=None, help="defaults to manifest.json in the output folder")
+    parser.add_argument("--network-workers", type=int, default=8)
+    parser.add_argument("--cpu-workers", type=int, default=None)
+    parser.add_argument("--no-tables", action="store_true")
+    parser.add_argument("--no-facts", action="store_true")
+    parser.add_argument("--excel", action="store_true", help="also save the tables of every filing as one excel workbook")
+    parser.add_argument("--retry-failed", action="store_true")
+    parser.add_argument("--compress", action="store_true", help="save the text of the filings compressed (see filing_store.py)")
+    parser.add_argument("--metrics", default=None, help="save the timings and counters of the run as json to this path (see instrumentation.py)")
+    parser.add_argument("--prometheus", default=None, help="also save them in the Prometheus text format to this path")
+    args = parser.parse_args()
+
+    if args.metrics or args.prometheus:
+        # Through the environment, so the worker processes record them too
+        os.environ[METRICS_VARIABLE] = "1"
+        enable()
+
+    manifest = ProgressManifest(args.manifest or os.path.join(args.output, "manifest.json"))
+    stages = edgar_stages(args.agent_email, args.output, tables=not args.no_tables, excel=args.excel, facts=not args.no_facts,
+                          compress=args.compress)
+    runner = BatchRunner(stages, manifest, network_workers=args.network_workers, cpu_workers=args.cpu_workers,
+                         retry_failed=args.retry_failed)
+    runner.run(read_filings(args.filings), progress=lambda name, stage, status: print(f"{name:<20}{stage:<10}{status}"))
+
+    print(json.dumps(manifest.summary(), indent=1))
+    for name, stage, error in manifest.failures():
+        print(f"FAILED {name} {stage}: {error}")
+
+    if args.metrics:
+        metrics.writeJSON(args.metrics)
+    if args.prometheus:
+        metrics.writePrometheus(args.prometheus)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,18 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import nltk
-from nltk.tokenize import word_tokenize
-from nltk.tag import pos_tag
-from nltk.chunk import ne_chunk
+import numpy as np
+
+from nltk.corpus import stopwords
+from nltk.tag import PerceptronTagger
+
+from industry_classifier import IndustryClassifier
+from instrumentation import timed
+from nlp_cache import ArtifactCache
+from nlp_preprocessing import PreprocessedText
+from nltk_resources import ensure_resource
 
 
 
@@ -15,12 +26,8 @@ from nltk.chunk import ne_chunk
 ### KEYWORDS IN THE TEXT. WE ALSO RETURN THE OTHER TOP 3 POTENTIAL INDUSTRIES WHERE THE COMPANY BELONGS ###
 
 
-### IMPORTANT: WE NEED TO DOWNLOAD SOME PRETRAINED MODELS FROM nltk FOR ENTITY RECOGNITION. THOSE ARE THE FOLLOWING: ###
-
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('maxent_ne_chunker')
-nltk.download('words')
+### IMPORTANT: ENTITY RECOGNITION NEEDS SOME PRETRAINED MODELS FROM nltk (punkt, THE PERCEPTRON TAGGER, THE NE CHUNKER AND words). ###
+### THEY ARE DOWNLOADED ON FIRST USE IF MISSING (SEE nltk_resources.py), OR AHEAD OF TIME WITH: python nltk_resources.py ###
 
 
 
@@ -43,6 +50,56 @@ INDUSTRY_KEYWORDS = {
         # Add more industries and their associated keywords as needed
 }
 
+# All the keywords compiled into one token trie, matched in a single pass over a text (see industry_classifier.py)
+INDUSTRY_CLASSIFIER = IndustryClassifier(INDUSTRY_KEYWORDS)
+
+# Organizations containing any of these words are not products
+GENERAL_WORDS = ["Company", "Companys", "Business", "Securities", "Exchange", "SEC", "Workplace", "Reports"]
+
+
+
+### PARALLEL ENTITY RECOGNITION ###
+### pos_tag AND ne_chunk RELOAD THEIR MODELS ON EVERY CALL AND RUN ON A SINGLE CORE. FOR LONG TEXTS (E.G. THE WHOLE BUSINESS SECTION) ###
+### productEntitiesBatched SPLITS THE SENTENCES INTO CHUNKS AND TAGS THEM IN A PROCESS POOL, WHOSE WORKERS LOAD THE TAGGER AND THE ###
+### CHUNKER ONCE WHEN THEY START. THE FUNCTIONS BELOW RUN INSIDE THE WORKERS, SO THEY HAVE TO LIVE AT MODULE LEVEL ###
+
+try:
+    from nltk.chunk import ne_chunker
+except ImportError:
+    # nltk < 3.9 ships the chunker as a pickle
+    def ne_chunker():
+        return nltk.data.load("chunkers/maxent_ne_chunker/english_ace_multiclass.pickle")
+
+_worker_models = {}
+
+
+
+# Loads the models of a worker process. Pass it as the initializer of any pool given to productEntitiesBatched
+def _init_ner_worker() -> None:
+    ensure_resource("tagger", "ne_chunker", "words")
+    _worker_models["tagger"] = PerceptronTagger()
+    _worker_models["chunker"] = ne_chunker()
+
+
+
+# The ArtifactCache of the summaries and the entities in a folder. Its entries are invalidated whenever the stop word list or the industry
+# keywords change, so every user of the folder (main.py, pipeline.py, summary_service.py) must build it here, with the same dependencies
+def nlp_artifact_cache(path: str) -> ArtifactCache:
+    ensure_resource("stopwords")
+    dependencies = {"stopwords": sorted(stopwords.words("english")), "industry_keywords": INDUSTRY_KEYWORDS}
+    return ArtifactCache(path, dependencies=dependencies)
+
+
+
+# Tags and chunks a list of tokenized sentences. Returns the named entity tree and the seconds it took
+def _tag_chunk(sentences: list[list[str]]) -> tuple:
+    if not _worker_models:
+        _init_ner_worker()
+    start = time.perf_counter()
+    words = [word for sentence in sentences for word in sentence]
+    tree = _worker_models["chunker"].parse(_worker_models["tagger"].tag(words))
+    return tree, time.perf_counter() - start
+
 
 
 
@@ -51,26 +108,72 @@ INDUSTRY_KEYWORDS = {
 
 
 # 1. productEntities: searches the text for keywords which can be labeled to be a product, by making use of the pos_tag and ne_chunk libraries from nltk
-# - text: the relevant text we want to analyse, in string format
+# - text: the relevant text we want to analyse, in string format, or its PreprocessedText (see nlp_preprocessing.py) to reuse its tokens and tags
 # Returns a list of strings with the product names
 
 
-# 2. industryEntities: performs the search of industry keywords for classification of the text. A majority vote is conducted and the top 3 potential 
+# 2. productEntitiesBatched: the same as productEntities, tagging chunks of sentences in parallel processes. The merged tree is stored in the
+#                            PreprocessedText, so it is persisted to the ArtifactCache like the one of productEntities
+# - text: as in productEntities
+# - max_workers: the number of processes (by default, one per core)
+# - chunk_sentences: the number of sentences of every chunk
+# - pool: an optional ProcessPoolExecutor created with initializer=_init_ner_worker, to reuse the same workers across many companies
+# Returns the list of product names and a list with the sentences, tokens and seconds of every chunk
+
+
+# 3. industryEntities: performs the search of industry keywords for classification of the text. A majority vote is conducted and the top 3 potential 
 #                      industries where the company could belong
-# - text: the relevant text we want to analyse, in string format
+# - text: the relevant text we want to analyse, in string format, or its PreprocessedText
 # Returns a list of strings with the top 3 industries and their scores
 
 
+# 4. industryScores: scores many texts at once, for classifying a large corpus in one batch call
+# - texts: a list of texts, each in string format or a PreprocessedText
+# Returns a np.ndarray with one row per text and one column per industry, in the order of INDUSTRY_KEYWORDS
+
+
 
 class Entities:
 
     @staticmethod
-    def productEntities(text: str) -> list[str]:
+    @timed("entities.products")
+    def productEntities(text) -> list[str]:
 
-        tokens = word_tokenize(text)
-        pos_tags = pos_tag(tokens)
-        named_entities = ne_chunk(pos_tags)
-        
+        document = text if isinstance(text, PreprocessedText) else PreprocessedText(text)
+        return Entities._products(document.named_entities)
+
+
+
+    @staticmethod
+    @timed("entities.products")
+    def productEntitiesBatched(text, max_workers: int = None, chunk_sentences: int = 200,
+                               pool: ProcessPoolExecutor = None) -> tuple[list[str], list[dict]]:
+
+        document = text if isinstance(text, PreprocessedText) else PreprocessedText(text)
+        if "named_entities" in document.__dict__:
+            # Already tagged (or loaded from the ArtifactCache): nothing to parallelise
+            return Entities._products(document.named_entities), []
+
+        chunks = [document.tokens[i:i + chunk_sentences] for i in range(0, len(document.tokens), chunk_sentences)]
+        if pool is None:
+            # Started by a forkserver rather than forked, as the caller may have threads holding locks (see BatchRunner.run)
+            with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("forkserver"), initializer=_init_ner_worker) as own_pool:
+                results = list(own_pool.map(_tag_chunk, chunks))
+        else:
+            results = list(pool.map(_tag_chunk, chunks))
+
+        # The chunks end at sentence boundaries, so joining their trees gives the tree of the whole text
+        document.named_entities = nltk.tree.Tree("S", [node for tree, _ in results for node in tree])
+        timings = [
+            {"chunk": i, "sentences": len(chunk), "tokens": sum(len(sentence) for sentence in chunk), "seconds": seconds}
+            for i, (chunk, (_, seconds)) in enumerate(zip(chunks, results))
+        ]
+        return Entities._products(document.named_entities), timings
+
+
+
+    @staticmethod
+    def _products(named_entities) -> list[str]:
         products = []
         for entity in named_entities:
             if isinstance(entity, nltk.tree.Tree):
@@ -80,7 +183,6 @@ class Entities:
                     entity_name = " ".join([word for word, tag in entity.leaves()])
                     if len(entity_name.split()) <= 3:  # Consider only entities with up to 3 words
                         products.append(entity_name)
-        GENERAL_WORDS = ["Company", "Companys", "Business", "Securities", "Exchange", "SEC", "Workplace", "Reports"]
         unique_products = list(set(products))
         output = [prod for prod in unique_products if not any(gen in prod.split() for gen in GENERAL_WORDS)]
         return output
@@ -88,16 +190,20 @@ class Entities:
 
 
     @staticmethod
-    def industryEntities(text: str) -> list[str]:
-        tokens = word_tokenize(text.lower())  
-        thematic_words_count = {industry: sum(1 for word in tokens if word in keywords)
-                            for industry, keywords in INDUSTRY_KEYWORDS.items()}
-        
-        top_industries = sorted(thematic_words_count.items(), key=lambda x: x[1], reverse=True)[:3]
+    @timed("entities.industry")
+    def industryEntities(text) -> list[str]:
+        scores = INDUSTRY_CLASSIFIER.scores(text)
+        top_industries = INDUSTRY_CLASSIFIER.top(scores, 3)
 
         output = []
         for industry, count in top_industries:
             print(industry, ":", count)
             output.append(industry)
         
-        return output
\ No newline at end of file
+        return output
+    
+
+
+    @staticmethod
+    def industryScores(texts: list) -> np.ndarray:
+        return INDUSTRY_CLASSIFIER.scoreMany(texts)
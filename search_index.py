@@ -0,0 +1,548 @@
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from filing_store import COMPRESSED_SUFFIX, read_range
+
+
+### POSITIONAL FULL-TEXT INDEX OF THE SAVED FILINGS ###
+### LOOKING A KEYWORD UP IN A FILING (TextDownload.find_word_in_website) DOWNLOADS AND PARSES IT AGAIN AND SCANS EVERY STRING OF THE HTML. ###
+### THE FOLLOWING CODE BUILDS AN INVERTED INDEX OVER THE SAVED TEXT FILES (E.G. reports_txt/): FOR EVERY WORD, THE FILINGS IT APPEARS IN ###
+### AND ITS POSITIONS (THE NUMBER OF THE WORD IN THE FILING). WITH THE POSITIONS, THE INDEX ANSWERS WORDS, PHRASES ("net sales") AND ###
+### PROXIMITY QUERIES (revenue NEAR/10 services) ACROSS THOUSANDS OF FILINGS WITHOUT READING THEM, AND ONLY OPENS A FILE TO CUT THE SNIPPET ###
+### AROUND A MATCH ###
+### THE TEXT FILES CAN BE PLAIN OR COMPRESSED (SEE filing_store.py): THE OFFSETS KEPT ARE THOSE OF THE UNCOMPRESSED TEXT ###
+
+### THE INDEX IS A FOLDER OF SEGMENTS. EVERY BATCH OF NEW OR CHANGED FILINGS IS WRITTEN AS A NEW SEGMENT, AND NEVER CHANGES AGAIN: ###
+### - terms.npy: THE SORTED WORDS OF THE SEGMENT, AND offsets.npy: WHERE THE POSTINGS OF EVERY WORD START ###
+### - docs.npy AND positions.npy: THE POSTINGS, ONE (FILING, POSITION) PAIR PER WORD OCCURRENCE, SORTED BY WORD, FILING AND POSITION ###
+### - checkpoints.npy: THE BYTE OFFSET IN ITS FILE OF EVERY CHECKPOINT_EVERY-TH WORD OF EVERY FILING, TO FIND THE TEXT OF A MATCH QUICKLY ###
+### - documents.json: THE NAME, PATH, SIZE AND MODIFICATION TIME OF EVERY FILING ###
+### THE ARRAYS ARE OPENED MEMORY-MAPPED (np.load WITH mmap_mode), SO OPENING THE INDEX READS NOTHING AND A QUERY ONLY TOUCHES THE PAGES ###
+### OF THE WORDS IT LOOKS UP. A FILING WHICH CHANGED IS INDEXED AGAIN IN THE NEW SEGMENT AND ITS OLD COPY IS MARKED AS DELETED IN ###
+### index.json, AND ONCE THERE ARE MORE THAN max_segments SEGMENTS THEY ARE MERGED INTO ONE ###
+
+
+# A word: a run of ASCII letters and digits, in lower case ("10-K" is the two words "10" and "k")
+TOKEN = re.compile(rb"[A-Za-z0-9]+")
+# Longer words are cut to this length, in the index and in the queries alike
+MAX_TERM_LENGTH = 32
+# The byte offset of one word in every CHECKPOINT_EVERY is kept for the snippets
+CHECKPOINT_EVERY = 64
+
+# A query is made of quoted phrases, proximity clauses (a NEAR/5 b, where a and b can be quoted phrases) and words, all of which must match
+QUERY_CLAUSE = re.compile(r'("[^"]+"|[^\s"]+)\s+NEAR/(\d+)\s+("[^"]+"|[^\s"]+)|"([^"]+)"|([^\s"]+)')
+
+
+
+
+def filing_name(path: str) -> str:
+    # apple.txt and apple.txt.gz are both "apple"
+    name = os.path.basename(path)
+    if name.endswith(COMPRESSED_SUFFIX):
+        name = name[:-len(COMPRESSED_SUFFIX)]
+    return os.path.splitext(name)[0]
+
+
+
+def tokenize(text) -> list[bytes]:
+    # The words of a text (or of a query), as they are stored in the index
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return [word[:MAX_TERM_LENGTH] for word in TOKEN.findall(text.lower())]
+
+
+
+
+# class _Segment
+# One immutable segment of the index (see above). Used through PositionalIndex
+
+class _Segment:
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.name = os.path.basename(folder)
+        with open(os.path.join(folder, "documents.json"), "r", encoding="utf-8") as file:
+            self.documents = json.load(file)
+        load = lambda name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+        self.terms = load("terms")
+        self.offsets = load("offsets")
+        self.docs = load("docs")
+        self.positions = load("positions")
+        self.checkpoints = load("checkpoints")
+        self.live = np.ones(len(self.documents), dtype=bool)
+
+
+
+    @staticmethod
+    def write(folder: str, terms: np.ndarray, term_ids: np.ndarray, docs: np.ndarray, positions: np.ndarray,
+              checkpoints: np.ndarray, documents: list[dict]) -> None:
+        # The postings come in any order: sorted here by word, filing and position
+        order = np.lexsort((positions, docs, term_ids))
+        term_ids = term_ids[order]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=offsets[1:])
+
+        # Written under a temporary name and renamed, so a segment is either complete or absent
+        temporary = folder + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        np.save(os.path.join(temporary, "terms.npy"), terms.astype(f"S{MAX_TERM_LENGTH}"))
+        np.save(os.path.join(temporary, "offsets.npy"), offsets)
+        np.save(os.path.join(temporary, "docs.npy"), docs[order].astype(np.int32))
+        np.save(os.path.join(temporary, "positions.npy"), positions[order].astype(np.int32))
+        np.save(os.path.join(temporary, "checkpoints.npy"), checkpoints.astype(np.int64))
+        with open(os.path.join(temporary, "documents.json"), "w", encoding="utf-8") as file:
+            json.dump(documents, file)
+        os.replace(temporary, folder)
+
+
+
+    @classmethod
+    def build(cls, folder: str, filings: list[tuple[str, str]]) -> None:
+        vocabulary = {}
+        term_ids, lengths, checkpoints, documents = [], [], [], []
+
+        for name, path in filings:
+            stat = os.stat(path)
+            data = read_range(path)
+            ids, starts = [], []
+            # bytes.lower only changes ASCII letters, so the offsets are those of the file
+            for match in TOKEN.finditer(data.lower()):
+                ids.append(vocabulary.setdefault(match.group()[:MAX_TERM_LENGTH], len(vocabulary)))
+                starts.append(match.start())
+            documents.append({"name": name, "path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                              "words": len(ids), "checkpoint_start": sum(len(c) for c in checkpoints)})
+            term_ids.append(np.array(ids, dtype=np.int64))
+            checkpoints.append(np.array(starts[::CHECKPOINT_EVERY], dtype=np.int64))
+            lengths.append(len(ids))
+
+        # The ids follow the order of appearance: renumbered in alphabetical order, as the terms are stored sorted
+        words = np.array(list(vocabulary), dtype=f"S{MAX_TERM_LENGTH}")
+        alphabetical = np.argsort(words, kind="stable")
+        rank = np.empty(len(words), dtype=np.int64)
+        rank[alphabetical] = np.arange(len(words))
+
+        all_ids = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int64)
+        docs = np.repeat(np.arange(len(lengths)), lengths)
+        positions = np.concatenate([np.arange(n) for n in lengths]) if lengths else np.zeros(0, dtype=np.int64)
+        cls.write(folder, words[alphabetical], rank[all_ids], docs, positions,
+                  np.concatenate(checkpoints) if checkpoints else np.zeros(0, dtype=np.int64), documents)
+
+
+
+    def keys(self, word: bytes) -> np.ndarray:
+        # The occurrences of a word in the live filings, as filing << 32 | position (so sorting them sorts by filing, then position)
+        i = int(np.searchsorted(self.terms, word))
+        if i == len(self.terms) or self.terms[i] != word:
+            return np.zeros(0, dtype=np.int64)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        docs = np.asarray(self.docs[start:end], dtype=np.int64)
+        keys = (docs << 32) | np.asarray(self.positions[start:end], dtype=np.int64)
+        return keys if self.live.all() else keys[self.live[docs]]
+
+
+
+    def phrase(self, words: list[bytes]) -> np.ndarray:
+        # The positions where the words appear one after the other, as keys of the first word
+        keys = self.keys(words[0])
+        for offset, word in enumerate(words[1:], start=1):
+            if not keys.size:
+                break
+            keys = np.intersect1d(keys, self.keys(word) - offset, assume_unique=True)
+        return keys
+
+
+
+    @staticmethod
+    def near(first: np.ndarray, second: np.ndarray, distance: int) -> np.ndarray:
+        # The keys of first with a key of second at most distance words away, in the same filing
+        low = np.searchsorted(second, first - distance, side="left")
+        high = np.searchsorted(second, first + distance, side="right")
+        return first[high > low]
+
+
+
+
+# class PositionalIndex
+
+# ATTRIBUTES:
+# 1. folder: the folder of the index. It is created if it does not exist
+# 2. max_segments: the number of segments above which add merges them all into one
+# 3. segments: the list of open segments
+# 4. filings: a dictionary from the name of every indexed filing to its segment and its number in the segment
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. add: indexes new filings, and again the filings whose file changed since they were indexed (in one new segment). The rest are skipped
+# - filings: a dictionary from the name of every filing to the path of its text file, or a list of paths (named after the file, e.g. "apple"
+#            for apple.txt or apple.txt.gz)
+# Returns the names of the filings indexed
+
+
+# 2. addFolder: adds every text file of a folder (see add)
+# - folder: the folder, e.g. reports_txt
+# - patterns: the glob pattern (or list of patterns) of the files to add. By default the plain and the compressed text files
+
+
+# 3. remove: removes filings from the index
+# - names: the names of the filings
+
+
+# 4. merge: rewrites all the segments as a single one without the deleted filings
+# - only takes self
+
+
+# 5. search: runs a query and returns the filings matching it, most matches first
+# - query: words (all of them must appear), "quoted phrases" and proximity clauses (a NEAR/10 b: a and b at most 10 words apart),
+#          e.g. '"net sales" services NEAR/5 revenue'
+# - limit: the maximum number of filings returned
+# - snippets: the number of snippets cut from every filing, around its first matches
+# - width: the number of characters of context on each side of a snippet
+# - filings: if given, only these filings are searched
+# Returns a list of dictionaries with the filing, its path, its number of matches, the positions of its matches, the number of words of
+# every match and its snippets
+
+
+# 6. snippet: the text around a position of a filing, with the match between square brackets. None if the file changed since it was indexed
+# - name: the name of the filing
+# - position: the position of the first word of the match
+# - length: the number of words of the match
+# - width: as in search
+
+
+class PositionalIndex:
+
+    VERSION = 1
+
+    def __init__(self, folder: str, max_segments: int = 8):
+        self.folder = folder
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+
+
+
+    def _manifestPath(self) -> str:
+        return os.path.join(self.folder, "index.json")
+
+
+
+    def _load(self) -> None:
+        try:
+            with open(self._manifestPath(), "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+            if manifest.get("version") != self.VERSION:
+                raise ValueError(f"Unknown index version {manifest.get('version')}")
+        except FileNotFoundError:
+            manifest = {"version": self.VERSION, "segments": [], "deleted": {}, "next_segment": 0}
+        self._manifest = manifest
+
+        self.segments = [_Segment(os.path.join(self.folder, name)) for name in manifest["segments"]]
+        self.filings = {}
+        for number, segment in enumerate(self.segments):
+            for doc in manifest["deleted"].get(segment.name, []):
+                segment.live[doc] = False
+            for doc, document in enumerate(segment.documents):
+                if segment.live[doc]:
+                    self.filings[document["name"]] = (number, doc)
+
+
+
+    def _save(self) -> None:
+        self._manifest["segments"] = [segment.name for segment in self.segments]
+        self._manifest["deleted"] = {segment.name: np.flatnonzero(~segment.live).tolist()
+                                     for segment in self.segments if not segment.live.all()}
+        with open(self._manifestPath() + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(self._manifest, file)
+        os.replace(self._manifestPath() + ".tmp", self._manifestPath())
+
+
+
+    def _newSegmentFolder(self) -> str:
+        name = f"segment_{self._manifest['next_segment']:06d}"
+        self._manifest["next_segment"] += 1
+        return os.path.join(self.folder, name)
+
+
+
+    def _document(self, name: str) -> dict:
+        number, doc = self.filings[name]
+        return self.segments[number].documents[doc]
+
+
+
+    def _changed(self, name: str, path: str) -> bool:
+        if name not in self.filings:
+            return True
+        document = self._document(name)
+        stat = os.stat(path)
+        return (document["path"], document["size"], document["mtime_ns"]) != (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+
+    def add(self, filings) -> list[str]:
+        if not isinstance(filings, dict):
+            filings = {filing_name(path): path for path in filings}
+
+        with self._lock:
+            changed = [(name, path) for name, path in filings.items() if self._changed(name, path)]
+            if not changed:
+                return []
+
+            folder = self._newSegmentFolder()
+            _Segment.build(folder, changed)
+            self._delete([name for name, _ in changed])
+            self.segments.append(_Segment(folder))
+            number = len(self.segments) - 1
+            for doc, (name, _) in enumerate(changed):
+                self.filings[name] = (number, doc)
+            self._save()
+
+            if len(self.segments) > self.max_segments:
+                self._merge()
+        return [name for name, _ in changed]
+
+
+
+    def addFolder(self, folder: str, patterns=("*.txt", "*.txt" + COMPRESSED_SUFFIX)) -> list[str]:
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        paths = {path for pattern in patterns for path in glob.glob(os.path.join(folder, pattern))}
+        return self.add(sorted(paths))
+
+
+
+    def _delete(self, names: list[str]) -> None:
+        for name in names:
+            if name in self.filings:
+                number, doc = self.filings.pop(name)
+                self.segments[number].live[doc] = False
+
+
+
+    def remove(self, names: list[str]) -> None:
+        with self._lock:
+            self._delete(names)
+            self._save()
+
+
+
+    def merge(self) -> None:
+        with self._lock:
+            self._merge()
+
+
+
+    def _merge(self) -> None:
+        if len(self.segments) <= 1 and all(segment.live.all() for segment in self.segments):
+            return None
+
+        terms = np.unique(np.concatenate([np.asarray(segment.terms) for segment in self.segments])) if self.segments else np.zeros(0, dtype=f"S{MAX_TERM_LENGTH}")
+        term_ids, docs, positions, checkpoints, documents = [], [], [], [], []
+        for segment in self.segments:
+            # The live filings of the segment, renumbered after the ones of the previous segments
+            renumber = np.full(len(segment.documents), -1, dtype=np.int64)
+            renumber[segment.live] = np.arange(int(segment.live.sum())) + len(documents)
+            local_docs = np.asarray(segment.docs, dtype=np.int64)
+            keep = segment.live[local_docs]
+
+            global_terms = np.searchsorted(terms, np.asarray(segment.terms))
+            term_ids.append(np.repeat(global_terms, np.diff(np.asarray(segment.offsets)))[keep])
+            docs.append(renumber[local_docs[keep]])
+            positions.append(np.asarray(segment.positions, dtype=np.int64)[keep])
+
+            for doc in np.flatnonzero(segment.live):
+                document = dict(segment.documents[doc])
+                start = document["checkpoint_start"]
+                count = -(-document["words"] // CHECKPOINT_EVERY)
+                document["checkpoint_start"] = sum(len(c) for c in checkpoints)
+                checkpoints.append(np.asarray(segment.checkpoints[start:start + count]))
+                documents.append(document)
+
+        folder = self._newSegmentFolder()
+        concatenate = lambda arrays: np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+        _Segment.write(folder, terms, concatenate(term_ids), concatenate(docs), concatenate(positions), concatenate(checkpoints), documents)
+
+        old = self.segments
+        self.segments = [_Segment(folder)]
+        self.filings = {document["name"]: (0, doc) for doc, document in enumerate(documents)}
+        self._save()
+        # The old segments are only deleted once index.json no longer lists them (open memory maps stay valid)
+        for segment in old:
+            shutil.rmtree(segment.folder, ignore_errors=True)
+
+
+
+    @staticmethod
+    def _parse(query: str) -> list[tuple]:
+        clauses = []
+        for near_first, distance, near_second, phrase, word in QUERY_CLAUSE.findall(query):
+            if distance:
+                clauses.append(("near", tokenize(near_first.strip('"')), tokenize(near_second.strip('"')), int(distance)))
+            elif phrase or word:
+                words = tokenize(phrase or word)
+                if words:
+                    clauses.append(("phrase", words))
+        return clauses
+
+
+
+    def _matches(self, segment: _Segment, clauses: list[tuple]) -> tuple[np.ndarray, np.ndarray]:
+        # The keys of the matches of all the clauses in the filings matching every clause, and the number of words of every match
+        matched = None
+        found = []
+        for clause in clauses:
+            if clause[0] == "near":
+                _, first, second, distance = clause
+                if not first or not second:
+                    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+                # The match is the first phrase, the second one is only its context
+                keys = _Segment.near(segment.phrase(first), segment.phrase(second), distance)
+                found.append((keys, len(first)))
+            else:
+                keys = segment.phrase(clause[1])
+                found.append((keys, len(clause[1])))
+
+            if matched is None:
+                matched = keys
+            else:
+                # Only the filings matching every clause are kept
+                common = np.intersect1d(np.unique(matched >> 32), np.unique(keys >> 32), assume_unique=True)
+                matched = np.union1d(matched[np.isin(matched >> 32, common)], keys[np.isin(keys >> 32, common)])
+            if not matched.size:
+                break
+
+        if matched is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # A position matched by several clauses (e.g. a word which also starts a phrase) is highlighted as the longest of them
+        lengths = np.ones(matched.size, dtype=np.int64)
+        for keys, length in found:
+            if length > 1:
+                mask = np.isin(matched, keys)
+                lengths[mask] = np.maximum(lengths[mask], length)
+        return matched, lengths
+
+
+
+    def search(self, query: str, limit: int = 10, snippets: int = 3, width: int = 80, filings: list[str] = None) -> list[dict]:
+        clauses = self._parse(query)
+        if not clauses:
+            return []
+        wanted = set(filings) if filings is not None else None
+
+        results = []
+        for segment in self.segments:
+            keys, lengths = self._matches(segment, clauses)
+            if not keys.size:
+                continue
+            docs, starts, counts = np.unique(keys >> 32, return_index=True, return_counts=True)
+            for doc, start, count in zip(docs, starts, counts):
+                document = segment.documents[int(doc)]
+                if wanted is not None and document["name"] not in wanted:
+                    continue
+                results.append({
+                    "filing": document["name"],
+                    "path": document["path"],
+                    "matches": int(count),
+                    "positions": (keys[start:start + count] & 0xFFFFFFFF).tolist(),
+                    "lengths": lengths[start:start + count].tolist(),
+                })
+
+        results.sort(key=lambda result: (-result["matches"], result["filing"]))
+        results = results[:limit]
+        for result in results:
+            result["snippets"] = [
+                snippet for snippet in (self.snippet(result["filing"], position, length, width)
+                                        for position, length in zip(result["positions"][:snippets], result["lengths"]))
+                if snippet is not None
+            ]
+        return results
+
+
+
+    def snippet(self, name: str, position: int, length: int = 1, width: int = 80) -> str:
+        number, doc = self.filings[name]
+        segment = self.segments[number]
+        document = segment.documents[doc]
+        try:
+            stat = os.stat(document["path"])
+        except FileNotFoundError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (document["size"], document["mtime_ns"]) or position >= document["words"]:
+            return None
+
+        offset = int(segment.checkpoints[document["checkpoint_start"] + position // CHECKPOINT_EVERY])
+        skip = position % CHECKPOINT_EVERY
+        # One read from the context before the checkpoint to past the match. It grows when the words from the checkpoint are longer than it
+        block = 16 * 1024
+        while True:
+            window_start = max(0, offset - width * 2)
+            data = read_range(document["path"], window_start, offset + block)
+            spans = [match.span() for match in TOKEN.finditer(data, offset - window_start)][:skip + length]
+            if len(spans) == skip + length and spans[-1][1] + width * 2 <= len(data) or len(data) < offset + block - window_start:
+                break
+            block *= 4
+
+        start, end = spans[skip][0], spans[-1][1]
+        before, match, after = data[max(0, start - width * 2):start], data[start:end], data[end:end + width * 2]
+
+        decode = lambda raw: " ".join(raw.decode("utf-8", errors="ignore").split())
+        before, after = decode(before)[-width:], decode(after)[:width]
+        return f"...{before} [{decode(match)}] {after}..."
+
+
+
+    def __len__(self) -> int:
+        return len(self.filings)
+
+
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.filings
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the full-text index of the saved filings")
+    parser.add_argument("--index", default="search_index", help="the folder of the index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="index the new and changed text files of a folder")
+    add.add_argument("folder")
+    add.add_argument("--pattern", action="append", help="the files to add (can be repeated). By default *.txt and *.txt.gz")
+    search = commands.add_parser("search", help="search the index")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=10)
+    search.add_argument("--snippets", type=int, default=3)
+    commands.add_parser("merge", help="merge all the segments into one")
+    args = parser.parse_args()
+
+    index = PositionalIndex(args.index)
+    if args.command == "add":
+        start = time.perf_counter()
+        added = index.addFolder(args.folder, args.pattern) if args.pattern else index.addFolder(args.folder)
+        print(f"{len(added)} filings indexed in {time.perf_counter() - start:.2f} s ({len(index)} in the index)")
+    elif args.command == "merge":
+        index.merge()
+    else:
+        start = time.perf_counter()
+        results = index.search(args.query, limit=args.limit, snippets=args.snippets)
+        print(f"{len(results)} filings in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for result in results:
+            print(f"\n{result['filing']} ({result['matches']} matches)")
+            for snippet in result["snippets"]:
+                print(f"  {snippet}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import json
+import os
+import re
+
+from filing_store import iter_chunks, read_range
+
+
+### 10-K SECTION INDEX ###
+### A 10-K IS SPLIT IN ITEMS (1, 1A, 1B, 2, ..., 7, 7A, 8, 9, ...). THE FOLLOWING CODE FINDS WHERE EVERY ITEM STARTS AND ENDS IN A ###
+### SAVED TEXT FILE WITH A SINGLE PASS OF ONE COMPILED REGEX OVER THE FILE, READ IN CHUNKS OF WHOLE LINES, AND SAVES THE RESULT AS A SMALL JSON ###
+### "SIDECAR" FILE NEXT TO THE TEXT (apple.txt -> apple.txt.sections.json). LATER RUNS LOAD THE SIDECAR INSTEAD OF SCANNING AGAIN, ###
+### AND READING A SECTION ONLY READS ITS BYTES ###
+
+### THE TEXT FILE CAN ALSO BE COMPRESSED (apple.txt.gz, SEE filing_store.py): IT IS THEN SCANNED ONE FRAME AT A TIME, AND READING A SECTION ###
+### ONLY DECOMPRESSES THE FRAMES HOLDING IT. THE OFFSETS ARE ALWAYS THOSE OF THE UNCOMPRESSED TEXT ###
+
+### EVERY ITEM HEADING APPEARS AT LEAST TWICE: IN THE TABLE OF CONTENTS AND AT THE START OF THE SECTION ITSELF. THE HEADING ###
+### KEPT FOR EACH ITEM IS THE ONE FOLLOWED BY THE LONGEST STRETCH OF TEXT BEFORE THE NEXT HEADING, WHICH IS THE SECTION ITSELF, ###
+### AMONG THE HEADINGS AFTER THE START OF THE BODY OF THE REPORT ###
+
+
+# An item heading at the start of a line, e.g. "Item 1.    Business", "ITEM 1A.\tRISK FACTORS" or "Item 9C." on its own
+ITEM_HEADING = re.compile(rb"^[ \t]*item(?:[ \t]|\xc2\xa0)+(\d{1,2}[a-c]?)(?:[ \t]*[.:]|[ \t]*\r?$)", re.IGNORECASE | re.MULTILINE)
+
+
+
+
+# class SectionIndex
+
+# ATTRIBUTES:
+# 1. sections: a dictionary where keys are the item names in upper case ("1", "1A", "7", ...) and values are dictionaries with the
+#              start_byte, end_byte, start_line and end_line of the section. The start is the heading line, and the end is the
+#              heading of the next item (0-based lines, end excluded)
+# 2. size, mtime_ns: the size and modification time of the text file, used to tell whether a saved sidecar is still valid
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. build: scans a text file and returns its SectionIndex
+# - path: the path to the saved text file with the EDGAR report
+
+
+# 2. load: returns the SectionIndex of a text file, from its sidecar if it is up to date, otherwise building it and saving the sidecar
+# - path: the path to the saved text file with the EDGAR report
+
+
+# 3. save: writes the sidecar of the index next to the text file
+# - path: the path to the saved text file with the EDGAR report
+
+
+# 4. lines: the first and last line of an item or of a run of items
+# - first: the first item, e.g. "7"
+# - last: the item where the run stops (excluded), e.g. "9". If None, only the first item
+
+
+# 5. read: returns the text of an item or of a run of items, reading (or decompressing) only its bytes
+# - path: the path to the saved text file with the EDGAR report
+# - first, last: as in lines
+
+
+class SectionIndex:
+
+    VERSION = 1
+
+    def __init__(self, sections: dict, size: int = None, mtime_ns: int = None):
+        self.sections = sections
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+
+
+    @staticmethod
+    def sidecarPath(path: str) -> str:
+        return f"{path}.sections.json"
+
+
+
+    @classmethod
+    def build(cls, path: str) -> "SectionIndex":
+        stat = os.stat(path)
+        headings = []
+        line = 0
+        size = 0
+        last_byte = b""
+        # The chunks hold whole lines, so the headings (which are anchored to the lines) are never split between two chunks
+        for base, data in iter_chunks(path):
+            last_position = 0
+            for match in ITEM_HEADING.finditer(data):
+                start = match.start()
+                # Skip the indentation matched before the word "item", so offsets point at the start of the line
+                start = data.rfind(b"\n", 0, start) + 1
+                line += data[last_position:start].count(b"\n")
+                last_position = start
+                headings.append((match.group(1).decode("ascii").upper(), base + start, line))
+            line += data[last_position:].count(b"\n")
+            size = base + len(data)
+            last_byte = data[-1:] or last_byte
+
+        if size == 0:
+            return cls({}, stat.st_size, stat.st_mtime_ns)
+        total_lines = line + (last_byte != b"\n")
+
+        # Every heading ends where the next one starts, and the last one at the end of the file
+        candidates = {}
+        for i, (item, start_byte, start_line) in enumerate(headings):
+            if i + 1 < len(headings):
+                end_byte, end_line = headings[i + 1][1], headings[i + 1][2]
+            else:
+                end_byte, end_line = size, total_lines
+            span = {"start_byte": start_byte, "end_byte": end_byte, "start_line": start_line, "end_line": end_line}
+            candidates.setdefault(item, []).append(span)
+
+        def longest(spans: list[dict]) -> dict:
+            return max(spans, key=lambda span: span["end_byte"] - span["start_byte"])
+
+        # The body of the report starts at the real Item 1 heading. Short items (e.g. "Item 9. None") can be shorter than
+        # their table of contents entry, so headings after that point are preferred
+        body_start = longest(candidates["1"])["start_byte"] if "1" in candidates else 0
+        spans = {}
+        for item, item_spans in candidates.items():
+            in_body = [span for span in item_spans if span["start_byte"] >= body_start]
+            spans[item] = longest(in_body or item_spans)
+
+        return cls(spans, stat.st_size, stat.st_mtime_ns)
+
+
+
+    @classmethod
+    def load(cls, path: str) -> "SectionIndex":
+        stat = os.stat(path)
+        try:
+            with open(cls.sidecarPath(path), "r", encoding="utf-8") as file:
+                saved = json.load(file)
+            if saved["version"] == cls.VERSION and saved["size"] == stat.st_size and saved["mtime_ns"] == stat.st_mtime_ns:
+                return cls(saved["sections"], saved["size"], saved["mtime_ns"])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+        index = cls.build(path)
+        try:
+            index.save(path)
+        except OSError:
+            # A read-only folder only means the index is rebuilt next time
+            pass
+        return index
+
+
+
+    def save(self, path: str) -> None:
+        saved = {"version": self.VERSION, "size": self.size, "mtime_ns": self.mtime_ns, "sections": self.sections}
+        with open(self.sidecarPath(path) + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(saved, file, indent=1)
+        os.replace(self.sidecarPath(path) + ".tmp", self.sidecarPath(path))
+
+
+
+    def _span(self, first: str, last: str = None) -> dict:
+        section = self.sections[first.upper()]
+        if last is None:
+            return section
+        end = self.sections[last.upper()]
+        return {"start_byte": section["start_byte"], "end_byte": end["start_byte"],
+                "start_line": section["start_line"], "end_line": end["start_line"]}
+
+
+
+    def lines(self, first: str, last: str = None) -> tuple[int, int]:
+        span = self._span(first, last)
+        return span["start_line"], span["end_line"]
+
+
+
+    def read(self, path: str, first: str, last: str = None) -> str:
+        span = self._span(first, last)
+        return read_range(path, span["start_byte"], span["end_byte"]).decode("utf-8", errors="replace")
@@ -0,0 +1,90 @@
+import numpy as np
+
+from nltk.stem import PorterStemmer
+from nltk.tokenize import word_tokenize
+
+from nltk_resources import ensure_resource
+
+
+### VECTORISED SENTENCE SCORING ###
+### THE SCORE OF A SENTENCE IS THE AVERAGE FREQUENCY (IN THE WHOLE TEXT) OF THE DISTINCT IMPORTANT WORDS IT CONTAINS. THE FOLLOWING ###
+### CLASS TOKENIZES AND STEMS EVERY SENTENCE ONCE, BUILDS A SPARSE SENTENCE-BY-TERM MATRIX (IN CSR FORM: FOR EVERY SENTENCE, THE ###
+### IDS OF ITS TERMS) AND THEN COMPUTES ALL THE SCORES, THEIR AVERAGE AND THE SELECTION OF SENTENCES WITH numpy ARRAY OPERATIONS. ###
+### SCORES ARE KEPT BY SENTENCE POSITION, SO TWO SENTENCES STARTING WITH THE SAME WORDS NO LONGER SHARE A SCORE ###
+
+
+
+
+# class SentenceScorer
+
+# ATTRIBUTES:
+# 1. vocabulary: a dictionary mapping every stemmed word of the frequency table to its column in the term matrix
+# 2. weights: a np.ndarray with the frequency of every word of the vocabulary, in column order
+# 3. stemmer: the stemmer used for the frequency table. Stems are memoized, so every distinct word is only stemmed once
+# 4. stem_cache: the dictionary of memoized stems. Passing the stem_cache of a PreprocessedText shares the stems already computed
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. stem: the memoized stem of a word
+# - word: the word to stem
+
+
+# 2. termMatrix: builds the sparse sentence-by-term matrix of a list of sentences
+# - sentences: a list of sentences, each either a string or an already tokenized list of words
+# Returns (indptr, indices): the terms of sentence i are indices[indptr[i]:indptr[i + 1]], each term counted once per sentence
+
+
+# 3. scores: the score of every sentence, as a np.ndarray in the order of the sentences. Sentences without any word of the vocabulary score 0
+# - sentences: as in termMatrix
+
+
+# 4. select: a boolean np.ndarray telling which sentences make it into the summary
+# - scores: the output of scores
+# - threshold: the minimum score of a sentence in the summary
+
+
+class SentenceScorer:
+
+    def __init__(self, frequency_table: dict, stemmer: PorterStemmer = None, stem_cache: dict = None):
+        self.vocabulary = {word: i for i, word in enumerate(frequency_table)}
+        self.weights = np.fromiter(frequency_table.values(), dtype=float, count=len(frequency_table))
+        self.stemmer = stemmer or PorterStemmer()
+        self.stem_cache = stem_cache if stem_cache is not None else {}
+
+
+
+    def stem(self, word: str) -> str:
+        stem = self.stem_cache.get(word)
+        if stem is None:
+            stem = self.stem_cache[word] = self.stemmer.stem(word)
+        return stem
+
+
+
+    def termMatrix(self, sentences: list) -> tuple[np.ndarray, np.ndarray]:
+        indptr = np.zeros(len(sentences) + 1, dtype=np.int64)
+        indices = []
+        if any(isinstance(sentence, str) for sentence in sentences):
+            ensure_resource("punkt")
+        for i, sentence in enumerate(sentences):
+            tokens = word_tokenize(sentence) if isinstance(sentence, str) else sentence
+            terms = {self.vocabulary.get(self.stem(token)) for token in tokens}
+            terms.discard(None)
+            indices.extend(terms)
+            indptr[i + 1] = len(indices)
+        return indptr, np.asarray(indices, dtype=np.int64)
+
+
+
+    def scores(self, sentences: list) -> np.ndarray:
+        indptr, indices = self.termMatrix(sentences)
+        rows = np.repeat(np.arange(len(sentences)), np.diff(indptr))
+        totals = np.bincount(rows, weights=self.weights[indices], minlength=len(sentences))
+        counts = np.diff(indptr)
+        return np.divide(totals, counts, out=np.zeros(len(sentences)), where=counts > 0)
+
+
+
+    @staticmethod
+    def select(scores: np.ndarray, threshold: float) -> np.ndarray:
+        return (scores > 0) & (scores >= threshold)
@@ -0,0 +1,138 @@
+import codecs
+from html.parser import HTMLParser
+
+
+### STREAMING HTML TO TEXT ###
+### FOR VERY LARGE FILINGS, BUILDING THE WHOLE BeautifulSoup TREE AND THE WHOLE get_text STRING KEEPS SEVERAL COPIES OF THE ###
+### DOCUMENT IN MEMORY. THE FOLLOWING CLASS IS AN EVENT-BASED (SAX STYLE) PARSER WHICH IS FED THE DOCUMENT CHUNK BY CHUNK AS IT ###
+### ARRIVES, AND WRITES EVERY PIECE OF TEXT STRAIGHT TO THE OUTPUT FILE. PEAK MEMORY ONLY DEPENDS ON THE SIZE OF THE CHUNKS AND ###
+### OF THE LONGEST SINGLE PIECE OF TEXT, NOT ON THE SIZE OF THE FILING ###
+
+### THE OUTPUT MATCHES BeautifulSoup(html, "lxml").get_text(separator=sep), AS IN FilingDocument.text: THE TEXT OF SCRIPTS, STYLES, ###
+### TEMPLATES AND COMMENTS IS LEFT OUT, LINE BREAKS ARE NORMALISED TO \n AND WHITESPACE IS TREATED AS lxml AND BeautifulSoup DO (SEE _flush) ###
+
+
+
+
+# class StreamingTextWriter
+
+# ATTRIBUTES:
+# 1. out: an open text file (or any object with a write method) where the text is written
+# 2. sep: the in between strings separation, usually \n. None joins the strings with nothing in between
+# 3. chars_written: the number of characters written so far
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. feedBytes: decodes a chunk of raw bytes and parses it. Characters split between two chunks are handled by an incremental decoder
+# - chunk: the chunk of bytes
+
+
+# 2. feed (inherited from HTMLParser): parses a chunk of already decoded html
+# - data: the chunk of html as a string
+
+
+# 3. close: parses whatever is left in the buffers and writes the last piece of text
+# - only takes self
+
+
+class StreamingTextWriter(HTMLParser):
+
+    # Tags whose content get_text does not return
+    SKIPPED_TAGS = {"script", "style", "template"}
+    # Tags whose whitespace BeautifulSoup keeps as it is
+    PRESERVED_TAGS = {"pre", "textarea"}
+    # What BeautifulSoup considers whitespace when collapsing strings
+    ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+    def __init__(self, out, sep=None, encoding="utf-8"):
+        super().__init__(convert_charrefs=True)
+        self.out = out
+        self.sep = sep or ""
+        self.chars_written = 0
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._pending = []
+        self._skipping = 0
+        self._preserving = 0
+        self._first = True
+        self._started = False
+
+
+
+    def feedBytes(self, chunk: bytes) -> None:
+        self.feed(self._decoder.decode(chunk))
+
+
+
+    def close(self) -> None:
+        self.feed(self._decoder.decode(b"", final=True))
+        super().close()
+        self._flush()
+
+
+
+    # The parser can split one piece of text in several calls to handle_data (for instance when it falls between
+    # two chunks), so text is only written out once a tag, comment or the end of the document closes it
+    def _flush(self) -> None:
+        if not self._pending:
+            return None
+        # lxml turns \r\n and \r into \n and drops the whitespace before the root element (e.g. the line breaks after <?xml ...?>
+        # and <!DOCTYPE>), then BeautifulSoup collapses every other whitespace only string to one \n (or one space if it has no line break)
+        text = "".join(self._pending).replace("\r\n", "\n").replace("\r", "\n")
+        self._pending = []
+        if not text.strip(self.ASCII_SPACES):
+            if not self._started:
+                return None
+            if not self._preserving:
+                text = "\n" if "\n" in text else " "
+        if not self._first:
+            self.out.write(self.sep)
+            self.chars_written += len(self.sep)
+        self.out.write(text)
+        self.chars_written += len(text)
+        self._first = False
+
+
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self._started = True
+        if tag in self.SKIPPED_TAGS:
+            self._skipping += 1
+        if tag in self.PRESERVED_TAGS:
+            self._preserving += 1
+
+
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in self.SKIPPED_TAGS and self._skipping:
+            self._skipping -= 1
+        if tag in self.PRESERVED_TAGS and self._preserving:
+            self._preserving -= 1
+
+
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self._started = True
+
+
+
+    def handle_data(self, data):
+        if not self._skipping and data:
+            self._pending.append(data)
+
+
+
+    def handle_comment(self, data):
+        self._flush()
+
+
+
+    def handle_decl(self, decl):
+        self._flush()
+
+
+
+    def handle_pi(self, data):
+        self._flush()
@@ -0,0 +1,604 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from nltk.corpus import stopwords
+from nltk.stem import PorterStemmer
+from nltk.tokenize import sent_tokenize
+
+from business_info import BusinessSummary
+from instrumentation import count, metrics, prometheus_text, stage
+from nlp_preprocessing import PreprocessedText
+from nltk_resources import ensure_resource
+from product_industry_entities import INDUSTRY_CLASSIFIER, Entities, _init_ner_worker, _tag_chunk, nlp_artifact_cache
+
+
+### LONG-RUNNING SUMMARISATION SERVICE ###
+### EVERY RUN OF main.py PAYS FOR IMPORTING pandas, bs4, selenium AND nltk AND FOR LOADING THE nltk MODELS BEFORE SUMMARISING ANYTHING, ###
+### WHICH FOR ONE FILING TAKES LONGER THAN THE SUMMARY ITSELF (AND ne_chunk LOADS ITS MODEL AGAIN ON EVERY CALL). THE FOLLOWING SERVICE ###
+### LOADS THE STOP WORDS, THE STEMMER, THE SENTENCE TOKENIZER, THE TAGGER AND THE NAMED ENTITY CHUNKER ONCE, IN EVERY WORKER WHEN IT ###
+### STARTS, AND THEN ANSWERS REQUESTS OVER LOCAL HTTP (A TCP PORT OR A UNIX SOCKET), SO A REQUEST ONLY PAYS FOR THE WORK ON ITS FILING ###
+
+### THE ENDPOINTS TAKE THE FILING AS THE PATH OF A SAVED TEXT FILE (PLAIN OR COMPRESSED, SEE filing_store.py) RELATIVE TO THE FOLDER ###
+### OF THE SERVICE, AS A QUERY STRING (GET) OR A JSON OBJECT (POST), AND ANSWER IN JSON: ###
+### - /summary?filing=apple.txt&threshold=0.8: THE SUMMARY OF THE BUSINESS SECTION (SEE BusinessSummary) ###
+### - /section?filing=apple.txt&item=7[&last=8][&summary=1]: THE TEXT OF A SECTION (SEE SectionIndex), OR ITS SUMMARY ###
+### - /industry?filing=apple.txt[&top=3][&source=summary]: THE TOP INDUSTRIES AND THEIR SCORES (SEE IndustryClassifier) ###
+### - /products?filing=apple.txt[&source=summary]: THE PRODUCT NAMES (SEE Entities) ###
+### THE ENTITIES ARE FOUND IN THE SUMMARY, AS IN main.py (source=business USES THE WHOLE BUSINESS SECTION). /health REPORTS THE LOAD OF ###
+### THE SERVICE, AND /metrics ITS STAGES IN THE PROMETHEUS TEXT FORMAT WHEN THE METRICS ARE ENABLED (SEE instrumentation.py) ###
+
+### THE REQUESTS ARE BATCHED: THE ONES ARRIVING WITHIN batch_window OF EACH OTHER FOR THE SAME FILING RUN AS ONE TASK, WHICH LOADS AND ###
+### TOKENIZES THE FILING ONCE FOR ALL OF THEM. EVERY WORKER ALSO KEEPS ITS LAST CACHED_FILINGS FILINGS (UNTIL THEIR FILE CHANGES). THE ###
+### WORKERS ARE PROCESSES BY DEFAULT (THE NLP IS PURE PYTHON, SO THREADS WOULD SHARE ONE CORE), AND AT MOST queue_size REQUESTS ARE ###
+### ACCEPTED AT ONCE: THE NEXT ONES ARE TURNED AWAY WITH 503 AND A Retry-After HEADER INSTEAD OF QUEUEING WITHOUT BOUND ###
+
+### START IT WITH: python summary_service.py --folder reports_txt --port 8765, THEN: curl 'http://127.0.0.1:8765/summary?filing=apple.txt' ###
+
+
+ENDPOINTS = ("summary", "section", "industry", "products")
+SOURCES = ("summary", "business")
+DEFAULT_THRESHOLD = 0.8
+# The filings every worker keeps loaded, tokenized and summarised
+CACHED_FILINGS = 8
+
+# The models of the worker (in process mode, of every worker process), loaded once by _init_worker
+_models = {}
+_filings = OrderedDict()
+_filings_lock = threading.Lock()
+
+
+
+
+class ServiceBusy(Exception):
+    # Raised when the service already holds queue_size requests: answered with 503
+    pass
+
+
+
+class RequestError(Exception):
+    # A request which cannot be answered, with the HTTP status to answer with
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+
+
+### THE WORKERS ###
+### THE FUNCTIONS BELOW RUN INSIDE THE WORKERS, SO IN PROCESS MODE THEY HAVE TO LIVE AT MODULE LEVEL ###
+
+# Loads the models of a worker. It is the initializer of the process pool, and is called once in the service itself in thread mode
+
+# Args:
+# 1. products: whether to load the tagger and the named entity chunker, only needed by /products
+# 2. cache_dir: an optional folder for an ArtifactCache (see nlp_cache.py), so the tokens of a filing survive a restart of the service
+def _init_worker(products: bool = True, cache_dir: str = None) -> None:
+    ensure_resource("punkt", "stopwords")
+    _models["stop_words"] = frozenset(stopwords.words("english"))
+    _models["stemmer"] = PorterStemmer()
+    # With the same dependencies as main.py and pipeline.py, so the entries of a shared folder are only reused if they are valid for the service
+    _models["cache"] = nlp_artifact_cache(cache_dir) if cache_dir else None
+    # nltk keeps the punkt tokenizer once it has been used
+    sent_tokenize("The tokenizer is loaded. It is kept.")
+    if products:
+        _init_ner_worker()
+
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+
+# The loaded filing of a path, from the cache of the worker when its file has not changed
+def _filing(path: str) -> dict:
+    info = os.stat(path)
+    key = (path, info.st_size, info.st_mtime_ns)
+    with _filings_lock:
+        filing = _filings.get(key)
+        if filing is not None:
+            _filings.move_to_end(key)
+            return filing
+
+    business = BusinessSummary(path, _models["cache"], _models["stemmer"], _models["stop_words"])
+    filing = {"business": business, "summaries": {}, "documents": {}}
+    with _filings_lock:
+        _filings[key] = filing
+        while len(_filings) > CACHED_FILINGS:
+            _filings.popitem(last=False)
+    return filing
+
+
+
+def _summary(filing: dict, threshold: float) -> str:
+    summary = filing["summaries"].get(threshold)
+    if summary is None:
+        summary = filing["summaries"][threshold] = filing["business"].get_edgar_summary(threshold_prop=threshold)
+    return summary
+
+
+
+# The PreprocessedText the entities are found in: the summary (as in main.py) or the whole business section
+def _document(filing: dict, source: str, threshold: float) -> PreprocessedText:
+    if source == "business":
+        return filing["business"].preprocessed
+    document = filing["documents"].get(threshold)
+    if document is None:
+        document = filing["documents"][threshold] = PreprocessedText(_summary(filing, threshold), _models["stemmer"],
+                                                                     cache=_models["cache"], section="entities")
+    return document
+
+
+
+def _answer(filing: dict, endpoint: str, parameters: dict):
+    business = filing["business"]
+    threshold = parameters["threshold"]
+
+    if endpoint == "summary":
+        return _summary(filing, threshold)
+
+    if endpoint == "section":
+        sections = business.sectionIndex().sections
+        for item in (parameters["item"], parameters["last"]):
+            if item is not None and item not in sections:
+                raise RequestError(404, f"no Item {item} in {os.path.basename(business.edgar_file)}")
+        text = business.sectionText(parameters["item"], parameters["last"])
+        if parameters["summary"]:
+            return business.get_edgar_summary(text, threshold)
+        return text
+
+    document = _document(filing, parameters["source"], threshold)
+    if endpoint == "industry":
+        top = INDUSTRY_CLASSIFIER.top(INDUSTRY_CLASSIFIER.scores(document), parameters["top"])
+        return [{"industry": industry, "score": score} for industry, score in top]
+
+    # products: tagged and chunked with the models already loaded, instead of pos_tag and ne_chunk loading theirs
+    if "named_entities" not in document.__dict__:
+        document.named_entities, _ = _tag_chunk(document.tokens)
+    return Entities._products(document.named_entities)
+
+
+
+# Runs a batch of requests on the same filing, loading and tokenizing it once for all of them
+
+# Args:
+# 1. path: the path of the text file of the filing
+# 2. requests: a list of (endpoint, parameters) tuples
+
+# Returns:
+# A list with, for every request, (200, result) or (status, error message), and the metrics recorded by the worker process while running
+# the batch (see instrumentation.py), which would be lost otherwise. None in thread mode, where they are recorded in the service itself
+def _run_batch(path: str, requests: list[tuple[str, dict]]) -> tuple[list[tuple[int, object]], dict]:
+    answers = _answers(path, requests)
+    worker_metrics = metrics.drain() if metrics.enabled and multiprocessing.parent_process() is not None else None
+    return answers, worker_metrics
+
+
+
+def _answers(path: str, requests: list[tuple[str, dict]]) -> list[tuple[int, object]]:
+    try:
+        filing = _filing(path)
+    except FileNotFoundError:
+        return [(404, f"no filing {os.path.basename(path)}")] * len(requests)
+    except Exception as error:
+        return [(500, f"{type(error).__name__}: {error}")] * len(requests)
+
+    answers = []
+    for endpoint, parameters in requests:
+        try:
+            answers.append((200, _answer(filing, endpoint, parameters)))
+        except RequestError as error:
+            answers.append((error.status, str(error)))
+        except Exception as error:
+            answers.append((500, f"{type(error).__name__}: {error}"))
+
+    if _models["cache"] is not None:
+        filing["business"].preprocessed.persist()
+        for document in filing["documents"].values():
+            document.persist()
+    return answers
+
+
+
+
+# class SummaryService
+
+# ATTRIBUTES:
+# 1. folder: the folder of the text files. The filings of the requests are paths relative to it, and cannot leave it
+# 2. workers: the number of workers (by default, one per core)
+# 3. processes: whether the workers are processes (the default) or threads of the service
+# 4. queue_size: the most requests accepted at once, running or waiting. Beyond it submit raises ServiceBusy
+# 5. batch_window: the seconds a request waits for others on the same filing before its batch is sent to a worker
+# 6. max_batch: the most requests sent to the workers at once
+# 7. pending: the requests accepted and not answered yet
+# 8. served, rejected and batches: the requests answered, turned away and the batches run since the start
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. start: starts the workers, waits for them to load their models, and starts the batching thread
+# - only takes self
+
+
+# 2. submit: accepts a request
+# - endpoint: one of ENDPOINTS
+# - parameters: the parameters of the request, as strings (see parameters)
+# Returns a concurrent.futures.Future with the (status, result) of the request. Raises RequestError for an invalid request and ServiceBusy when full
+
+
+# 3. parameters: checks the parameters of a request and converts them
+# - endpoint: one of ENDPOINTS
+# - raw: a dictionary of parameters as strings (or, from a JSON body, numbers and booleans)
+# Returns the path of the filing and the dictionary of parameters
+
+
+# 4. health: the load of the service and its counters, as a dictionary ready for json
+# - only takes self
+
+
+# 5. close: stops the batching thread and the workers
+# - only takes self
+
+
+class SummaryService:
+
+    def __init__(self, folder: str, workers: int = None, processes: bool = True, queue_size: int = 64, batch_window: float = 0.005,
+                 max_batch: int = 32, products: bool = True, cache_dir: str = None):
+        self.folder = os.path.realpath(folder)
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.queue_size = queue_size
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.products = products
+        self.cache_dir = cache_dir
+        self.pending = 0
+        self.served = 0
+        self.rejected = 0
+        self.batches = 0
+        self.started = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._executor = None
+        self._dispatcher = None
+
+
+
+    def _newExecutor(self):
+        if self.processes:
+            # Started by a forkserver rather than forked from the threads of the server, which may be holding locks (see BatchRunner.run)
+            return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("forkserver"), initializer=_init_worker,
+                                       initargs=(self.products, self.cache_dir))
+        return ThreadPoolExecutor(self.workers, thread_name_prefix="summary-worker")
+
+
+
+    def start(self) -> "SummaryService":
+        # Checked (and downloaded if missing) here once, rather than failing in every worker
+        ensure_resource("punkt", "stopwords", *(("tagger", "ne_chunker", "words") if self.products else ()))
+        if not self.processes:
+            _init_worker(self.products, self.cache_dir)
+        self._executor = self._newExecutor()
+        # The pool starts a process per task while none is idle, so this starts them all and waits for their models
+        for future in [self._executor.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="summary-batcher", daemon=True)
+        self._dispatcher.start()
+        self.started = time.time()
+        return self
+
+
+
+    def parameters(self, endpoint: str, raw: dict) -> tuple[str, dict]:
+        if endpoint not in ENDPOINTS:
+            raise RequestError(404, f"unknown endpoint /{endpoint}, use one of: " + ", ".join("/" + name for name in ENDPOINTS))
+        if not raw.get("filing"):
+            raise RequestError(400, "missing parameter: filing")
+
+        path = os.path.realpath(os.path.join(self.folder, str(raw["filing"])))
+        if os.path.commonpath([path, self.folder]) != self.folder:
+            raise RequestError(403, "the filing must be inside the folder of the service")
+        if not os.path.isfile(path):
+            raise RequestError(404, f"no filing {raw['filing']}")
+
+        try:
+            parameters = {
+                "threshold": float(raw.get("threshold", DEFAULT_THRESHOLD)),
+                "source": str(raw.get("source", "summary")),
+                "top": int(raw.get("top", 3)),
+                "item": str(raw["item"]).upper() if raw.get("item") else None,
+                "last": str(raw["last"]).upper() if raw.get("last") else None,
+                "summary": str(raw.get("summary", "")).lower() in ("1", "true", "yes"),
+            }
+        except ValueError as error:
+            raise RequestError(400, f"invalid parameter: {error}")
+        if parameters["threshold"] <= 0 or parameters["top"] < 1:
+            raise RequestError(400, "threshold and top must be positive")
+        if parameters["source"] not in SOURCES:
+            raise RequestError(400, "source must be one of: " + ", ".join(SOURCES))
+        if endpoint == "section" and parameters["item"] is None:
+            raise RequestError(400, "missing parameter: item")
+        if endpoint == "products" and not self.products:
+            raise RequestError(404, "the service was started without the product models (--no-products)")
+        return path, parameters
+
+
+
+    def submit(self, endpoint: str, parameters: dict) -> Future:
+        path, parameters = self.parameters(endpoint, parameters)
+        with self._lock:
+            if self.pending >= self.queue_size:
+                self.rejected += 1
+                count("service.rejected")
+                raise ServiceBusy(f"{self.pending} requests pending")
+            self.pending += 1
+
+        future = Future()
+        self._queue.put((path, endpoint, parameters, future))
+        return future
+
+
+
+    def _dispatch(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return None
+
+            # Collects the requests arriving within batch_window of the first one, by filing
+            batch, size = {}, 0
+            deadline = time.monotonic() + self.batch_window
+            while request is not None:
+                batch.setdefault(request[0], []).append(request)
+                size += 1
+                timeout = deadline - time.monotonic()
+                if size >= self.max_batch or timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+
+            for path, requests in batch.items():
+                self._send(path, requests)
+
+
+
+    def _send(self, path: str, requests: list) -> None:
+        with self._lock:
+            self.batches += 1
+        count("service.batches")
+        count("service.batched_requests", len(requests))
+        # The pool the batch goes to, so that if it breaks only that pool is replaced
+        executor = self._executor
+        try:
+            task = executor.submit(_run_batch, path, [(endpoint, parameters) for _, endpoint, parameters, _ in requests])
+        except (BrokenExecutor, RuntimeError) as error:
+            task = Future()
+            task.set_exception(error)
+        task.add_done_callback(lambda task: self._finish(requests, task, executor))
+
+
+
+    def _finish(self, requests: list, task: Future, executor) -> None:
+        error = task.exception()
+        if error is None:
+            answers, worker_metrics = task.result()
+            if worker_metrics:
+                metrics.merge(worker_metrics)
+        else:
+            answers = [(500, f"{type(error).__name__}: {error}")] * len(requests)
+            if isinstance(error, BrokenExecutor):
+                # A worker died (e.g. out of memory): the next batches go to a new pool. The other batches which were sent
+                # to the same broken pool find it already replaced and leave the new one alone
+                with self._lock:
+                    broken = self._executor is executor
+                    if broken:
+                        self._executor = self._newExecutor()
+                if broken:
+                    executor.shutdown(wait=False)
+
+        with self._lock:
+            self.pending -= len(requests)
+            self.served += len(requests)
+        for (_, _, _, future), answer in zip(requests, answers):
+            future.set_result(answer)
+
+
+
+    def health(self) -> dict:
+        with self._lock:
+            return {
+                "status": "ok",
+                "folder": self.folder,
+                "workers": self.workers,
+                "processes": self.processes,
+                "pending": self.pending,
+                "queue_size": self.queue_size,
+                "served": self.served,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "uptime": time.time() - self.started if self.started else 0.0,
+            }
+
+
+
+    def close(self) -> None:
+        self._queue.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+
+
+### THE HTTP SERVER ###
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        raw = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self._handle(url.path.strip("/"), raw)
+
+
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        raw = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                return self._reply(400, {"error": "the body must be a JSON object"})
+            if not isinstance(body, dict):
+                return self._reply(400, {"error": "the body must be a JSON object"})
+            raw.update(body)
+        self._handle(url.path.strip("/"), raw)
+
+
+
+    def _handle(self, endpoint: str, raw: dict) -> None:
+        service = self.server.service
+        if endpoint == "health":
+            return self._reply(200, service.health())
+        if endpoint == "metrics":
+            return self._reply(200, prometheus_text(metrics.report()), "text/plain; version=0.0.4")
+
+        start = time.perf_counter()
+        with stage(f"service.{endpoint}" if endpoint in ENDPOINTS else "service.unknown"):
+            try:
+                future = service.submit(endpoint, raw)
+                status, result = future.result(timeout=self.server.timeout_seconds)
+            except RequestError as error:
+                return self._reply(error.status, {"error": str(error)})
+            except ServiceBusy as error:
+                return self._reply(503, {"error": f"the service is busy ({error}), retry later"}, headers={"Retry-After": "1"})
+            # concurrent.futures.TimeoutError, which is only the built-in TimeoutError from Python 3.11
+            except FutureTimeout:
+                return self._reply(504, {"error": f"no answer within {self.server.timeout_seconds} s"})
+
+        if status != 200:
+            return self._reply(status, {"error": result})
+        self._reply(200, {"filing": raw["filing"], "endpoint": endpoint, "result": result,
+                          "seconds": round(time.perf_counter() - start, 6)})
+
+
+
+    def _reply(self, status: int, body, content_type: str = "application/json", headers: dict = None) -> None:
+        data = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+
+    def address_string(self) -> str:
+        # The clients of a Unix socket have no address
+        return self.client_address[0] if self.client_address else "local"
+
+
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind expects a (host, port) address
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+
+# Creates the HTTP server of a service, on a TCP port of host or on a Unix socket
+
+# Args:
+# 1. service: the started SummaryService
+# 2. host and port: the address to listen on (use 127.0.0.1: the service has no authentication)
+# 3. socket_path: the path of a Unix socket to listen on instead. An old socket left at the path is replaced
+# 4. timeout: the most seconds a request waits for its answer before getting 504
+# 5. verbose: whether to log every request to stderr
+
+# Returns:
+# The server. Call serve_forever() on it, and shutdown() from another thread to stop it
+def make_server(service: SummaryService, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None, timeout: float = 300.0,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    server.timeout_seconds = timeout
+    server.verbose = verbose
+    return server
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve summaries, sections, industries and products of the saved filings with warm models")
+    parser.add_argument("--folder", default="reports_txt", help="the folder of the text files")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", default=None, help="listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=None, help="by default, one per core")
+    parser.add_argument("--threads", action="store_true", help="run the work in threads of the service instead of processes")
+    parser.add_argument("--queue-size", type=int, default=64, help="requests accepted at once before answering 503")
+    parser.add_argument("--batch-window", type=float, default=5.0, help="milliseconds to wait for more requests on the same filing")
+    parser.add_argument("--no-products", action="store_true", help="do not load the tagger and the chunker (no /products)")
+    parser.add_argument("--nlp-cache", default=None, help="a folder to keep the tokens of the filings across restarts (see nlp_cache.py)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    service = SummaryService(args.folder, args.workers, not args.threads, args.queue_size, args.batch_window / 1000,
+                             products=not args.no_products, cache_dir=args.nlp_cache).start()
+    server = make_server(service, args.host, args.port, args.socket, args.timeout, args.verbose)
+    address = args.socket or f"http://{args.host}:{server.server_port}"
+    print(f"{service.workers} workers ready in {time.perf_counter() - start:.1f} s, serving {service.folder} on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+
+if __name__ == "__main__":
+    main()
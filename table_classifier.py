@@ -0,0 +1,137 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+### CLASSIFICATION OF THE TABLES OF A FILING ###
+### MOST TABLES OF AN EDGAR REPORT ARE LAYOUT OR NOTES TABLES. THE FOLLOWING CLASS TELLS THE TABLE OF CONTENTS AND THE THREE FINANCIAL ###
+### STATEMENTS (INCOME STATEMENT, BALANCE SHEET AND CASH FLOW STATEMENT) APART FROM THE REST, SO ONLY THOSE NEED TO BE EXPORTED ###
+
+### EVERY TABLE IS REDUCED TO ONE STRING: ITS COLUMN NAMES AND ITS LABEL COLUMNS (THE TEXT COLUMNS). THE STRINGS OF ALL THE TABLES ###
+### OF THE FILING ARE THEN MATCHED AT ONCE, WITH ONE VECTORISED pandas STRING OPERATION PER KEYWORD PATTERN, AND THE SCORE OF A TABLE ###
+### FOR A KIND IS THE NUMBER OF DIFFERENT PATTERNS OF THAT KIND IT CONTAINS ###
+
+
+TOC = "toc"
+INCOME_STATEMENT = "income_statement"
+BALANCE_SHEET = "balance_sheet"
+CASH_FLOW = "cash_flow"
+OTHER = "other"
+
+FINANCIAL_KINDS = (INCOME_STATEMENT, BALANCE_SHEET, CASH_FLOW)
+
+# The patterns of every kind, matched on the lower case labels of the tables
+KIND_PATTERNS = {
+    TOC: [
+        r"\bitem\s*1\b", r"\bitem\s*1a\b", r"risk factors", r"legal proceedings", r"unresolved staff comments",
+        r"mine safety", r"management.s discussion", r"\bitem\s*7a?\b",
+    ],
+    INCOME_STATEMENT: [
+        r"net sales|total revenues?|\brevenues?\b", r"cost of (?:sales|revenues?|goods sold)", r"gross (?:margin|profit)",
+        r"operating income|income from operations|operating (?:loss|expenses)", r"net (?:income|earnings|loss)",
+        r"per share", r"\bdiluted\b", r"provision for income taxes|income tax (?:expense|provision)",
+    ],
+    BALANCE_SHEET: [
+        r"total assets", r"total liabilities", r"total current assets", r"total current liabilities",
+        r"(?:shareholders|stockholders).? equity", r"accounts (?:receivable|payable)",
+        r"property,? plant and equipment", r"retained earnings|accumulated deficit",
+    ],
+    CASH_FLOW: [
+        r"operating activities", r"investing activities", r"financing activities", r"depreciation and amortization",
+        r"cash (?:used in|generated by|provided by)", r"beginning of (?:the )?(?:year|period)",
+        r"end of (?:the )?(?:year|period)", r"capital expenditures|payments for acquisition",
+    ],
+}
+
+
+
+
+# class TableClassifier
+
+# ATTRIBUTES:
+# 1. patterns: the compiled patterns of every kind
+# 2. min_matches: the minimum number of different patterns a table needs to match to be of a kind. Fewer, and it is OTHER
+# 3. min_numeric: the minimum share of amount (float) columns of a financial statement, which keeps text tables that mention
+#                 "net income" out of the statements
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. signatures: the string every table is reduced to (its column names and the cells of its text columns, in lower case)
+# - tables: a dictionary from the position of every table to its pd.DataFrame (see TableDownload.getTablesByPosition), or a list of pd.DataFrame
+# Returns a pd.Series indexed by the position of the tables
+
+
+# 2. classify: classifies all the tables of a filing at once
+# - tables: as in signatures
+# Returns a pd.DataFrame indexed by the position of the tables, with the kind of every table, its score for every kind and
+# its share of amount columns
+
+
+# 3. select: the positions of the tables of some kinds, in document order
+# - index: the output of classify
+# - kinds: the kinds to keep. By default the three financial statements
+
+
+class TableClassifier:
+
+    def __init__(self, patterns: dict = None, min_matches: dict = None, min_numeric: float = 0.3):
+        patterns = patterns or KIND_PATTERNS
+        self.patterns = {kind: [re.compile(pattern) for pattern in kind_patterns] for kind, kind_patterns in patterns.items()}
+        self.min_matches = {kind: 2 if kind == TOC else 3 for kind in self.patterns}
+        self.min_matches.update(min_matches or {})
+        self.min_numeric = min_numeric
+
+
+
+    @staticmethod
+    def _items(tables) -> list[tuple[int, pd.DataFrame]]:
+        return list(tables.items()) if isinstance(tables, dict) else list(enumerate(tables))
+
+
+
+    def signatures(self, tables) -> pd.Series:
+        items = self._items(tables)
+        signatures = []
+        for _, table in items:
+            labels = table.select_dtypes(exclude="number").stack().dropna().astype(str).tolist()
+            signatures.append(" | ".join([str(column) for column in table.columns] + labels))
+        return pd.Series(signatures, index=[position for position, _ in items], dtype=object).str.lower()
+
+
+
+    def classify(self, tables) -> pd.DataFrame:
+        items = self._items(tables)
+        signatures = self.signatures(tables)
+
+        # One vectorised pass over all the tables per pattern
+        scores = pd.DataFrame(
+            {kind: sum((signatures.str.contains(pattern).to_numpy(dtype=int) for pattern in kind_patterns), np.zeros(len(items), dtype=int))
+             for kind, kind_patterns in self.patterns.items()},
+            index=signatures.index,
+        )
+        numeric = pd.Series(
+            [float(np.mean([dtype.kind == "f" for dtype in table.dtypes])) if table.shape[1] else 0.0 for _, table in items],
+            index=signatures.index,
+        )
+
+        # A kind only counts when the table matches enough of its patterns (and, for the statements, has enough amount columns)
+        eligible = pd.DataFrame({kind: scores[kind] >= self.min_matches[kind] for kind in scores.columns})
+        for kind in FINANCIAL_KINDS:
+            if kind in eligible:
+                eligible[kind] &= numeric >= self.min_numeric
+
+        masked = scores.where(eligible, 0)
+        kinds = masked.idxmax(axis=1).where(masked.max(axis=1) > 0, OTHER) if len(masked) else pd.Series(dtype=object)
+
+        index = scores.add_prefix("score_")
+        index.insert(0, "kind", kinds)
+        index["numeric_share"] = numeric
+        index.index.name = "position"
+        return index
+
+
+
+    @staticmethod
+    def select(index: pd.DataFrame, kinds: tuple = FINANCIAL_KINDS) -> list[int]:
+        return index.index[index["kind"].isin(kinds)].tolist()
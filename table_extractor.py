@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+
+import bs4
+
+
+### TABLE EXTRACTION ###
+### THE FOLLOWING CLASS TURNS THE HTML TABLES OF AN EDGAR REPORT INTO TYPED pd.DataFrame. EVERY TABLE IS WALKED ONCE, ROW BY ROW, ###
+### LAYING THE CELLS OUT ON A GRID WHICH RESPECTS colspan AND rowspan. THE CLEANING AND THE NUMBER PARSING ARE THEN DONE ON THE ###
+### WHOLE GRID AT ONCE WITH pandas STRING OPERATIONS ###
+
+### FINANCIAL STATEMENTS IN EDGAR SPLIT EVERY AMOUNT OVER SEVERAL CELLS, E.G. | $ | (1,234 | ) |, AND ADD EMPTY CELLS FOR SPACING. ###
+### THOSE SPACER CELLS ARE DROPPED, AND AMOUNTS ARE PARSED INTO FLOATS: "$", "%" AND COMMAS ARE REMOVED, AMOUNTS IN PARENTHESES ###
+### BECOME NEGATIVE AND DASHES (USED FOR ZERO) BECOME 0 ###
+
+
+# Cells with nothing but these characters only exist to lay the amounts out
+SPACER_CELLS = {"", "$", ")", "%", ")%", "%)"}
+
+# Dashes used in the reports for a zero amount
+ZERO_DASHES = {"—", "–", "-", "—%"}
+
+
+
+
+# class TableExtractor
+
+# ATTRIBUTES:
+# 1. header_rows: the number of header rows of the tables. If None, the header is detected as the leading rows whose first cell is empty,
+#                 which is how the column headers (years, periods) of the financial statements are laid out
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. grid: walks the table once and lays its cells out on a grid, taking colspan and rowspan into account
+# - table: the html code of the table, a bs4.element.Tag
+# Returns two lists of rows: one with the text of every cell only in the first column it spans, and one with the text repeated
+# across all the columns it spans (used for the headers, so that a year spanning "$ | amount | )" names the amount column)
+
+
+# 2. extract: returns the table as a pd.DataFrame. Columns whose cells are all amounts are converted to float, the rest are left as text
+# - table: the html code of the table, a bs4.element.Tag
+
+
+# 3. parseAmounts: parses a pd.Series of strings into floats, giving NaN for the cells which are not amounts
+# - values: the pd.Series of strings
+
+
+class TableExtractor:
+
+    def __init__(self, header_rows: int = None):
+        self.header_rows = header_rows
+
+
+
+    @staticmethod
+    def _cellText(cell: bs4.element.Tag) -> str:
+        return " ".join(cell.get_text(" ").split())
+
+
+
+    @staticmethod
+    def _span(cell: bs4.element.Tag, attribute: str) -> int:
+        value = str(cell.get(attribute, "1")).strip()
+        return max(int(value), 1) if value.isdigit() else 1
+
+
+
+    def grid(self, table: bs4.element.Tag) -> tuple[list[list[str]], list[list[str]]]:
+        origin_rows = []
+        filled_rows = []
+        # Cells coming down from a rowspan above: column -> [rows left, text]
+        pending = {}
+
+        for tr in table.find_all("tr"):
+            # Rows of tables nested inside this one belong to those tables
+            if tr.find_parent("table") is not table:
+                continue
+
+            origin = []
+            filled = []
+            column = 0
+            for cell in tr.find_all(["td", "th"], recursive=False):
+                while column in pending:
+                    column = self._placeRowspan(pending, column, origin, filled)
+
+                text = self._cellText(cell)
+                colspan = self._span(cell, "colspan")
+                rowspan = self._span(cell, "rowspan")
+
+                for offset in range(colspan):
+                    origin.append(text if offset == 0 else "")
+                    filled.append(text)
+                    if rowspan > 1:
+                        pending[column + offset] = [rowspan - 1, text]
+                column += colspan
+
+            while pending and column <= max(pending):
+                if column in pending:
+                    column = self._placeRowspan(pending, column, origin, filled)
+                else:
+                    origin.append("")
+                    filled.append("")
+                    column += 1
+
+            origin_rows.append(origin)
+            filled_rows.append(filled)
+
+        return origin_rows, filled_rows
+
+
+
+    @staticmethod
+    def _placeRowspan(pending: dict, column: int, origin: list, filled: list) -> int:
+        rows_left, text = pending[column]
+        origin.append(text)
+        filled.append(text)
+        if rows_left == 1:
+            del pending[column]
+        else:
+            pending[column][0] = rows_left - 1
+        return column + 1
+
+
+
+    @staticmethod
+    def parseAmounts(values: pd.Series) -> pd.Series:
+        cleaned = values.str.replace(r"[\$,%\s]", "", regex=True)
+        negative = cleaned.str.startswith("(")
+        cleaned = cleaned.str.strip("()")
+        cleaned = cleaned.where(~values.str.strip().isin(ZERO_DASHES), "0")
+        amounts = pd.to_numeric(cleaned, errors="coerce")
+        return amounts.where(~negative, -amounts)
+
+
+
+    def extract(self, table: bs4.element.Tag) -> pd.DataFrame:
+        origin_rows, filled_rows = self.grid(table)
+        if not origin_rows:
+            return pd.DataFrame()
+
+        width = max(len(row) for row in origin_rows)
+        if width == 0:
+            return pd.DataFrame()
+        origin = pd.DataFrame([row + [""] * (width - len(row)) for row in origin_rows], dtype=object)
+        filled = pd.DataFrame([row + [""] * (width - len(row)) for row in filled_rows], dtype=object)
+
+        # Blank the spacer cells and drop the rows left empty
+        origin = origin.where(~origin.isin(SPACER_CELLS), "")
+        keep = origin.ne("").any(axis=1).to_numpy()
+        origin, filled = origin[keep].reset_index(drop=True), filled[keep].reset_index(drop=True)
+        if origin.empty:
+            return pd.DataFrame()
+
+        header_rows = self.header_rows
+        if header_rows is None:
+            first_column = origin.iloc[:, 0].to_numpy()
+            header_rows = int(np.argmax(first_column != "")) if (first_column != "").any() else 0
+        header, body = filled.iloc[:header_rows], origin.iloc[header_rows:]
+
+        # Drop the columns with nothing in the body (spacers, or the "$" and ")" columns around the amounts)
+        columns = body.ne("").any(axis=0).to_numpy()
+        header, body = header.loc[:, columns], body.loc[:, columns].reset_index(drop=True)
+
+        # Parse every cell of the body at once, flattened into one Series (rather than body.stack(), whose handling of the cells changes
+        # across pandas versions), and keep the amounts of the columns where every non-empty cell is an amount
+        flat = pd.Series(body.to_numpy().ravel(), dtype=object)
+        amounts = pd.DataFrame(self.parseAmounts(flat).to_numpy(dtype=float).reshape(body.shape), index=body.index, columns=body.columns)
+        non_empty = body.ne("")
+        numeric = (amounts.notna() | ~non_empty).all(axis=0) & non_empty.any(axis=0)
+        # The first column holds the row labels, which stay as text even when they look like numbers (e.g. years)
+        if body.shape[1] > 1:
+            numeric.iloc[0] = False
+
+        result = body.where(non_empty, None)
+        for column in numeric.index[numeric.to_numpy()]:
+            result[column] = amounts[column].astype(float)
+
+        if header_rows:
+            result.columns = self._columnNames(header)
+        else:
+            result.columns = range(result.shape[1])
+        return result
+
+
+
+    @staticmethod
+    def _columnNames(header: pd.DataFrame) -> list[str]:
+        names = []
+        seen = {}
+        for column in header.columns:
+            parts = []
+            for text in header[column]:
+                if text and text not in parts:
+                    parts.append(text)
+            name = " ".join(parts) or ("label" if not names else f"column_{len(names)}")
+            # The suffixed name can itself be a header of the table (e.g. A, A, A_1), so the suffix grows until the name is free
+            base = name
+            while name in seen:
+                seen[base] += 1
+                name = f"{base}_{seen[base]}"
+            seen[name] = 0
+            names.append(name)
+        return names
@@ -0,0 +1,278 @@
+import json
+import re
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+
+### STORE OF THE FINANCIAL TABLES ###
+### INSTEAD OF ONE EXCEL FILE PER TABLE, THE TABLES OF EVERY FILING ARE WRITTEN IN ONE TRANSACTION INTO A SINGLE SQLITE DATABASE, ###
+### SHARED BY ALL THE COMPANIES. THE DATABASE HAS THESE TABLES: ###
+### - filings: THE NAME AND URL OF EVERY FILING, AND WHEN ITS TABLES WERE STORED ###
+### - tables: ONE ROW PER TABLE, WITH ITS ID, ITS POSITION IN THE DOCUMENT, ITS TITLE, ITS SHAPE AND ITS COLUMN NAMES ###
+### - cells: ONE ROW PER NON-EMPTY CELL, WITH ITS TEXT, ITS AMOUNT (FOR THE NUMERIC COLUMNS) AND THE LABEL OF ITS ROW AND NAME OF ITS ###
+###   COLUMN, SO THE DATA OF ALL THE COMPANIES CAN BE QUERIED WITH SQL WITHOUT OPENING ANY FILE, E.G.: ###
+###   SELECT filing, column_name, value FROM cells WHERE label LIKE 'Total net sales%' ###
+### THE KIND OF EVERY TABLE (SEE table_classifier.py) IS STORED WITH IT WHEN KNOWN, TO QUERY ONLY e.g. THE BALANCE SHEETS ###
+### THE INLINE XBRL FACTS OF A FILING (SEE ixbrl.py) GO INTO A FOURTH TABLE, facts ###
+
+### EXCEL IS STILL AVAILABLE WITH write_excel, WHICH WRITES ALL THE TABLES OF A FILING AS THE SHEETS OF ONE WORKBOOK ###
+### (pandas NEEDS openpyxl OR xlsxwriter FOR IT) ###
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS filings (
+    filing TEXT PRIMARY KEY,
+    url TEXT,
+    stored REAL
+);
+CREATE TABLE IF NOT EXISTS tables (
+    filing TEXT,
+    table_id INTEGER,
+    position INTEGER,
+    title TEXT,
+    n_rows INTEGER,
+    n_columns INTEGER,
+    columns TEXT,
+    kind TEXT,
+    PRIMARY KEY (filing, table_id)
+);
+CREATE TABLE IF NOT EXISTS cells (
+    filing TEXT,
+    table_id INTEGER,
+    row INTEGER,
+    col INTEGER,
+    label TEXT,
+    column_name TEXT,
+    text TEXT,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS facts (
+    filing TEXT,
+    concept TEXT,
+    start TEXT,
+    end TEXT,
+    value REAL,
+    unit TEXT,
+    decimals TEXT,
+    dimensions TEXT,
+    context TEXT
+);
+CREATE INDEX IF NOT EXISTS facts_concept ON facts (concept, filing);
+CREATE INDEX IF NOT EXISTS cells_table ON cells (filing, table_id);
+CREATE INDEX IF NOT EXISTS cells_label ON cells (label);
+"""
+
+# Characters which excel does not allow in the name of a sheet
+SHEET_NAME_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+
+
+# The title of a table: the first non-empty text cell of its first row (the first column holds the row labels)
+def table_title(table: pd.DataFrame) -> str:
+    for value in table.iloc[0] if not table.empty else []:
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return ""
+
+
+
+# Writes the tables of a filing as the sheets of one excel workbook
+
+# Args:
+# 1. path: the path of the workbook
+# 2. tables: a dictionary from the position of every table to its pd.DataFrame, or a list of pd.DataFrame
+# 3. titles: optional titles of the tables, in the same order, used to name the sheets
+
+# Returns:
+# The names of the sheets. With no tables nothing is written (a workbook needs at least one sheet) and the list is empty
+@timed("tables.excel")
+def write_excel(path: str, tables, titles: list[str] = None) -> list[str]:
+    items = list(tables.items()) if isinstance(tables, dict) else list(enumerate(tables))
+    if not items:
+        return []
+    titles = titles or [table_title(table) for _, table in items]
+
+    names = []
+    with pd.ExcelWriter(path) as writer:
+        for (position, table), title in zip(items, titles):
+            # Sheet names are unique and at most 31 characters long
+            prefix = f"{position:03d} "
+            name = prefix + SHEET_NAME_CHARS.sub("_", title)[:31 - len(prefix)].strip()
+            table.to_excel(writer, sheet_name=name)
+            names.append(name)
+    return names
+
+
+
+
+# class TableStore
+
+# ATTRIBUTES:
+# 1. path: the path of the SQLite database. It is created if it does not exist
+# 2. timeout: the seconds a write waits for another process or thread writing to the same database
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. write: stores all the tables of a filing in one transaction, replacing the tables stored before for that filing
+# - filing: the name of the filing (e.g. the company)
+# - tables: a dictionary from the position of every table in the document to its pd.DataFrame (see TableDownload.getTablesByPosition),
+#           or a list of pd.DataFrame
+# - url: the url of the filing
+# - titles: optional titles of the tables, in the same order. By default table_title
+# - kinds: optional kinds of the tables, in the same order (e.g. from TableDownload.classifyTables)
+# Returns the number of tables stored
+
+
+# 2. writeFacts: stores the inline XBRL facts of a filing, replacing the facts stored before for that filing
+# - filing: the name of the filing
+# - facts: the facts output by IXBRLExtractor (or TableDownload.getFacts)
+# Returns the number of facts stored
+
+
+# 3. tables: the metadata of the tables stored, as a pd.DataFrame
+# - filing: if given, only the tables of this filing
+
+
+# 4. read: rebuilds a stored table as a pd.DataFrame, with its column names, and float columns for the amounts
+# - filing, table_id: the filing and the id of the table
+
+
+# 5. query: runs a SQL query on the database and returns the result as a pd.DataFrame
+# - sql: the query
+# - params: the parameters of the query
+
+
+class TableStore:
+
+    def __init__(self, path: str, timeout: float = 60):
+        self.path = path
+        self.timeout = timeout
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+            # Databases created before the kind of the tables was stored
+            if "kind" not in [row[1] for row in connection.execute("PRAGMA table_info(tables)")]:
+                connection.execute("ALTER TABLE tables ADD COLUMN kind TEXT")
+        finally:
+            connection.close()
+
+
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per call, so the store can be used from several threads and processes
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+
+
+    @staticmethod
+    def _columnNames(table: pd.DataFrame) -> str:
+        # Integer names (tables without a header) stay integers
+        return json.dumps([int(name) if isinstance(name, (int, np.integer)) else str(name) for name in table.columns])
+
+
+
+    @staticmethod
+    def _cells(filing: str, table_id: int, table: pd.DataFrame):
+        values = table.to_numpy(dtype=object)
+        labels = values[:, 0] if values.shape[1] else np.array([])
+        names = [str(name) for name in table.columns]
+        for row, col in zip(*np.nonzero(pd.notna(table).to_numpy())):
+            value = values[row, col]
+            label = labels[row] if isinstance(labels[row], str) else None
+            if isinstance(value, str):
+                yield filing, table_id, int(row), int(col), label, names[col], value, None
+            else:
+                yield filing, table_id, int(row), int(col), label, names[col], repr(float(value)), float(value)
+
+
+
+    @timed("tables.store")
+    def write(self, filing: str, tables, url: str = None, titles: list[str] = None, kinds: list[str] = None) -> int:
+        items = list(tables.items()) if isinstance(tables, dict) else list(enumerate(tables))
+        titles = titles or [table_title(table) for _, table in items]
+        kinds = kinds or [None] * len(items)
+
+        connection = self._connect()
+        try:
+            with connection:
+                for name in ("cells", "tables", "filings"):
+                    connection.execute(f"DELETE FROM {name} WHERE filing = ?", (filing,))
+                connection.execute("INSERT INTO filings VALUES (?, ?, ?)", (filing, url, time.time()))
+                connection.executemany(
+                    "INSERT INTO tables (filing, table_id, position, title, n_rows, n_columns, columns, kind) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+                        (filing, table_id, int(position), title, table.shape[0], table.shape[1], self._columnNames(table), kind)
+                        for table_id, ((position, table), title, kind) in enumerate(zip(items, titles, kinds))
+                    ))
+                for table_id, (_, table) in enumerate(items):
+                    connection.executemany("INSERT INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._cells(filing, table_id, table))
+        finally:
+            connection.close()
+        return len(items)
+
+
+
+    @timed("tables.store_facts")
+    def writeFacts(self, filing: str, facts: pd.DataFrame) -> int:
+        columns = ["concept", "start", "end", "value", "unit", "decimals", "dimensions", "context"]
+        rows = facts[columns].copy()
+        for column in ("start", "end"):
+            rows[column] = rows[column].dt.strftime("%Y-%m-%d")
+        rows = rows.astype(object).where(rows.notna(), None)
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM facts WHERE filing = ?", (filing,))
+                connection.executemany("INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                       ((filing, *row) for row in rows.itertuples(index=False, name=None)))
+        finally:
+            connection.close()
+        return len(rows)
+
+
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        connection = self._connect()
+        try:
+            return pd.read_sql_query(sql, connection, params=params)
+        finally:
+            connection.close()
+
+
+
+    def tables(self, filing: str = None) -> pd.DataFrame:
+        if filing is None:
+            return self.query("SELECT * FROM tables ORDER BY filing, table_id")
+        return self.query("SELECT * FROM tables WHERE filing = ? ORDER BY table_id", (filing,))
+
+
+
+    def read(self, filing: str, table_id: int) -> pd.DataFrame:
+        meta = self.query("SELECT n_rows, columns FROM tables WHERE filing = ? AND table_id = ?", (filing, table_id))
+        if meta.empty:
+            raise KeyError(f"No table {table_id} stored for {filing}")
+        n_rows, columns = int(meta.at[0, "n_rows"]), json.loads(meta.at[0, "columns"])
+        cells = self.query("SELECT row, col, text, value FROM cells WHERE filing = ? AND table_id = ?", (filing, table_id))
+
+        table = pd.DataFrame(None, index=range(n_rows), columns=range(len(columns)), dtype=object)
+        rows, cols = cells["row"].to_numpy(), cells["col"].to_numpy()
+        numeric = cells["value"].notna().to_numpy()
+        for col in range(len(columns)):
+            in_column = cols == col
+            if in_column.any() and numeric[in_column].all():
+                # A column stored with amounts only comes back as a float column
+                table[col] = np.nan
+                table.loc[rows[in_column], col] = cells["value"].to_numpy()[in_column]
+                table[col] = table[col].astype(float)
+            elif in_column.any():
+                table.loc[rows[in_column], col] = cells["text"].to_numpy()[in_column]
+        table.columns = columns
+        return table
@@ -0,0 +1,115 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from edgar_fetcher import EdgarFetcher
+
+
+### EdgarFetcher MUST RETRY THROTTLED REQUESTS AFTER THE DELAY THE SERVER ASKS FOR, GIVE UP AFTER max_retries, AND KEEP THE REQUESTS ###
+### TO A HOST WITHIN THE BUDGET OF ITS TOKEN BUCKET. A LOCAL HTTP SERVER STANDS IN FOR EDGAR ###
+
+
+# The server answers every path with the next status of its script (the last one once the script is used up), and records
+# when every request arrived and from which client port
+class ScriptedHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            script = server.scripts.get(self.path, [(200, {})])
+            requests_so_far = sum(1 for path, _, _ in server.requests if path == self.path)
+            status, headers = script[min(requests_so_far, len(script) - 1)]
+            server.requests.append((self.path, time.monotonic(), self.client_address[1]))
+
+        body = f"{self.path} {status}".encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+
+@contextmanager
+def scripted_server(scripts: dict):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+    server.scripts = scripts
+    server.requests = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+
+def test_retry_after_is_honoured():
+    with scripted_server({"/throttled": [(429, {"Retry-After": "1"}), (200, {})]}) as (server, base):
+        fetcher = EdgarFetcher("test@example.com", rate=100, backoff=0.01, timeout=5)
+        try:
+            page = fetcher.fetch(f"{base}/throttled")
+        finally:
+            fetcher.close()
+
+    assert page.status_code == 200
+    assert page.content == b"/throttled 200"
+    times = [arrived for _, arrived, _ in server.requests]
+    assert len(times) == 2
+    assert times[1] - times[0] >= 0.95
+
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_stop_at_the_limit_and_raise(status):
+    with scripted_server({"/failing": [(status, {})]}) as (server, base):
+        fetcher = EdgarFetcher("test@example.com", rate=100, max_retries=2, backoff=0.01, timeout=5)
+        try:
+            with pytest.raises(requests.HTTPError) as error:
+                fetcher.fetch(f"{base}/failing")
+        finally:
+            fetcher.close()
+
+    assert error.value.response.status_code == status
+    assert len(server.requests) == 3
+
+
+
+def test_requests_stay_within_the_bucket_budget():
+    rate, workers = 10, 4
+    urls = [f"/document_{i}" for i in range(25)]
+    with scripted_server({}) as (server, base):
+        fetcher = EdgarFetcher("test@example.com", rate=rate, max_workers=workers, timeout=5)
+        try:
+            pages = fetcher.fetchMany([base + url for url in urls])
+        finally:
+            fetcher.close()
+
+    assert all(page.status_code == 200 for page in pages.values())
+    times = sorted(arrived for _, arrived, _ in server.requests)
+    assert len(times) == len(urls)
+
+    # The bucket starts full (rate tokens) and refills at rate tokens per second, so no stretch of time holds more requests than that
+    for first in range(len(times)):
+        for last in range(first, len(times)):
+            assert last - first + 1 <= rate + rate * (times[last] - times[first]) + 1
+
+    # The connections are kept alive and reused, not opened once per request
+    assert len({port for _, _, port in server.requests}) <= workers
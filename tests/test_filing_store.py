@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from filing_store import FramedFile, FramedWriter, iter_chunks, read_range
+
+
+### THE COMPRESSED FILES MUST READ BACK AS THE TEXT WRITTEN, WITH CHUNKS OF WHOLE LINES, EVEN WHEN A LINE IS LONGER THAN SEVERAL FRAMES ###
+
+
+FRAME_SIZE = 64
+
+TEXTS = {
+    "short_lines": "".join(f"line {i}\n" for i in range(200)),
+    "long_line": "Item 1. Business\n" + "x" * 1000 + "\nItem 7. Management\nend\n",
+    # Three byte characters, so a cut at frame_size would fall inside one
+    "long_multibyte_line": "a\n" + "€" * 500 + "\nb\n",
+    "no_line_break": "é" * 700,
+}
+
+
+
+def write(path: str, text: str, pieces: int) -> str:
+    with FramedWriter(path, frame_size=FRAME_SIZE) as writer:
+        step = max(1, len(text) // pieces)
+        for start in range(0, len(text), step):
+            writer.write(text[start:start + step])
+    return path
+
+
+
+@pytest.mark.parametrize("name", TEXTS)
+@pytest.mark.parametrize("pieces", [1, 7, 1000])
+def test_frames_read_back(tmp_path, name, pieces):
+    text = TEXTS[name]
+    data = text.encode("utf-8")
+    path = write(str(tmp_path / "filing.txt.gz"), text, pieces)
+
+    assert read_range(path) == data
+    assert read_range(path, 10, 500) == data[10:500]
+
+    with FramedFile(path) as file:
+        for frame in file.iterFrames():
+            frame.decode("utf-8")
+        starts = [0] + [i + 1 for i, byte in enumerate(data) if byte == ord("\n") and i + 1 < len(data)]
+        assert [file.lineOffset(line) for line in range(len(starts))] == starts
+
+    offset = 0
+    for base, chunk in iter_chunks(path):
+        assert base == offset
+        offset += len(chunk)
+        assert chunk.endswith(b"\n") or offset == len(data)
+    assert offset == len(data)
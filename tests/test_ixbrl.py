@@ -0,0 +1,98 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ixbrl import IXBRLExtractor
+
+
+### keyFigures MUST RETURN THE FIGURE OF THE WHOLE FISCAL YEAR, NOT OF A SHORTER PERIOD ENDING ON THE SAME DAY ###
+
+
+def context(id: str, period: str) -> str:
+    return (f'<xbrli:context id="{id}"><xbrli:entity><xbrli:identifier scheme="http://www.sec.gov/CIK">0000320193</xbrli:identifier>'
+            f'</xbrli:entity><xbrli:period>{period}</xbrli:period></xbrli:context>')
+
+
+def fact(name: str, context_ref: str, value: str) -> str:
+    return (f'<ix:nonFraction name="{name}" contextRef="{context_ref}" unitRef="usd" decimals="-6" scale="6">{value}'
+            f'</ix:nonFraction>')
+
+
+def document(facts: list[str]) -> bytes:
+    return ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:ix="http://www.xbrl.org/2013/inlineXBRL" '
+            'xmlns:xbrli="http://www.xbrl.org/2003/instance"><body><ix:header><ix:resources>'
+            + context("FY2022", "<xbrli:startDate>2021-09-26</xbrli:startDate><xbrli:endDate>2022-09-24</xbrli:endDate>")
+            + context("Q4_2022", "<xbrli:startDate>2022-06-26</xbrli:startDate><xbrli:endDate>2022-09-24</xbrli:endDate>")
+            + context("FY2021", "<xbrli:startDate>2020-09-27</xbrli:startDate><xbrli:endDate>2021-09-25</xbrli:endDate>")
+            + context("I2022", "<xbrli:instant>2022-09-24</xbrli:instant>")
+            + context("I2021", "<xbrli:instant>2021-09-25</xbrli:instant>")
+            + '<xbrli:unit id="usd"><xbrli:measure>iso4217:USD</xbrli:measure></xbrli:unit>'
+            '</ix:resources></ix:header>'
+            + "".join(f"<p>{f}</p>" for f in facts)
+            + '</body></html>').encode("utf-8")
+
+
+
+def test_key_figures_prefer_the_year_to_the_quarter_ending_with_it():
+    # The quarter comes after the year in the document, and in the other order too
+    for order in (1, -1):
+        facts = [
+            fact("us-gaap:NetIncomeLoss", "FY2021", "94,680"),
+            fact("us-gaap:NetIncomeLoss", "FY2022", "99,803"),
+            fact("us-gaap:NetIncomeLoss", "Q4_2022", "20,721"),
+        ][::order]
+        figures = IXBRLExtractor.keyFigures(IXBRLExtractor.fromChunks([document(facts)])[0])
+        assert figures["us-gaap:NetIncomeLoss"] == 99803e6
+
+
+
+def test_key_figures_take_the_latest_instant():
+    facts = [fact("us-gaap:Assets", "I2022", "352,755"), fact("us-gaap:Assets", "I2021", "351,002")]
+    figures = IXBRLExtractor.keyFigures(IXBRLExtractor.fromChunks([document(facts)])[0])
+    assert figures["us-gaap:Assets"] == 352755e6
+
+
+
+### THE FACTS WRITTEN IN WORDS OR IN OTHER NUMBER FORMATS MUST BE READ, OR RECORDED AS NaN WITHOUT STOPPING THE DOCUMENT ###
+
+
+def formatted(name: str, fmt: str, text: str) -> str:
+    return (f'<ix:nonFraction name="{name}" contextRef="FY2022" unitRef="usd" decimals="INF" format="{fmt}">{text}'
+            f'</ix:nonFraction>')
+
+
+
+def test_word_formats_are_read_as_numbers():
+    facts = [
+        formatted("us-gaap:NumberOfOperatingSegments", "ixt-sec:numwordsen", "three"),
+        formatted("us-gaap:NumberOfReportableSegments", "ixt-sec:numwordsen", "twenty-five"),
+        formatted("us-gaap:NumberOfStores", "ixt-sec:numwordsen", "one hundred and five thousand"),
+        formatted("us-gaap:LossContingencyAccrualAtCarryingValue", "ixt-sec:numwordsen", "none"),
+        formatted("us-gaap:Goodwill", "ixt:fixed-zero", "—"),
+    ]
+    table = IXBRLExtractor.fromChunks([document(facts)])[0].set_index("concept")
+    assert table.loc["us-gaap:NumberOfOperatingSegments", "value"] == 3
+    assert table.loc["us-gaap:NumberOfReportableSegments", "value"] == 25
+    assert table.loc["us-gaap:NumberOfStores", "value"] == 105000
+    assert table.loc["us-gaap:LossContingencyAccrualAtCarryingValue", "value"] == 0
+    assert table.loc["us-gaap:Goodwill", "value"] == 0
+
+
+
+def test_unreadable_facts_are_nan_and_the_rest_are_kept():
+    facts = [
+        formatted("us-gaap:NumberOfOperatingSegments", "ixt-sec:numwordsen", "a few"),
+        formatted("us-gaap:Revenues", "ixt:numdotcomma", "1.234.567,89"),
+        formatted("us-gaap:CostOfRevenue", "ixt:num-dot-decimal", "1.2.3"),
+        formatted("us-gaap:GrossProfit", "ixt:num-dot-decimal", "1,000"),
+    ]
+    table = IXBRLExtractor.fromChunks([document(facts)])[0].set_index("concept")
+    assert table.loc["us-gaap:Revenues", "value"] == 1234567.89
+    assert table.loc["us-gaap:GrossProfit", "value"] == 1000
+
+    for concept, text in (("us-gaap:NumberOfOperatingSegments", "a few"), ("us-gaap:CostOfRevenue", "1.2.3")):
+        assert table.loc[concept, "value"] != table.loc[concept, "value"]
+        assert table.loc[concept, "text"] == text
+    assert table.loc["us-gaap:CostOfRevenue", "format"] == "ixt:num-dot-decimal"
@@ -0,0 +1,59 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from filing_document import FilingDocument
+from streaming_text import StreamingTextWriter
+
+
+### StreamingTextWriter MUST WRITE EXACTLY WHAT FilingDocument.text RETURNS, WHATEVER THE SIZE OF THE CHUNKS IT IS FED ###
+
+
+DOCUMENTS = {
+    # EDGAR inline XBRL filings start with an xml declaration and a doctype before the root element
+    "ixbrl": (b'<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n<html xmlns="http://www.w3.org/1999/xhtml">\n'
+              b'<head>\n<title>10-K</title>\n<style>p {margin: 0}</style>\n</head>\n<body>\n'
+              b'<div><p>Item 1. Business</p>\n<p>We make &amp; sell widgets.</p></div>\n'
+              b'<table><tr><td>Revenue</td><td>&#160;</td><td>1,000</td></tr></table>\n</body>\n</html>\n'),
+    "ixbrl_crlf": (b'<?xml version="1.0"?>\r\n<!DOCTYPE html>\r\n<html>\r\n<head><title>T</title></head>\r\n'
+                   b'<body>\r\n<p>a\r\nb</p>\r\n</body>\r\n</html>\r\n'),
+    "whitespace_prolog": b'\n\n  <!DOCTYPE html>\n  <html>\n <body>\n x \n</body>\n</html>\n\n',
+    "comment_before_root": b'<!-- c -->\n<html><body>y</body></html>',
+    "after_body": b'<html><body>z</body>\n<!-- end -->\n</html>\n  \n',
+    "whitespace_strings": (b'<html><body><p>a</p>   <p>b</p><span>c</span> \n <span>d</span><div>\t \t</div>'
+                           b'<pre>e\n\n\n</pre><textarea>  </textarea><p>\xc2\xa0 </p></body></html>'),
+    "skipped_tags": b'<html><head><script>var x = "<p>no</p>";</script></head><body>ok<template>no</template></body></html>',
+    "no_html": b'just some text & more',
+}
+
+
+
+def stream_text(html: bytes, sep, chunk_size: int) -> str:
+    out = io.StringIO()
+    writer = StreamingTextWriter(out, sep)
+    for start in range(0, len(html), chunk_size):
+        writer.feedBytes(html[start:start + chunk_size])
+    writer.close()
+    return out.getvalue()
+
+
+
+@pytest.mark.parametrize("name", sorted(DOCUMENTS))
+@pytest.mark.parametrize("sep", [None, "\n"])
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_matches_filing_document_text(name, sep, chunk_size):
+    html = DOCUMENTS[name]
+    assert stream_text(html, sep, chunk_size) == FilingDocument(html).text(sep)
+
+
+
+def test_chars_written():
+    out = io.StringIO()
+    writer = StreamingTextWriter(out, "\n")
+    writer.feedBytes(DOCUMENTS["ixbrl"])
+    writer.close()
+    assert writer.chars_written == len(out.getvalue())
@@ -1,15 +1,19 @@
 import pandas as pd
 import numpy as np 
-import re
-import requests
 
-from bs4 import BeautifulSoup
 import bs4
-from bs4 import BeautifulSoup, element, Tag
+from bs4 import element, Tag
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from browser_pool import BrowserPool, shared_browser_pool
+from edgar_fetcher import EdgarFetcher, shared_fetcher
+from filing_store import open_for_writing
+from filing_document import FilingDocument
+from instrumentation import count, timed
+from ixbrl import IXBRLExtractor
+from search_index import PositionalIndex
+from streaming_text import StreamingTextWriter
+from table_classifier import TableClassifier, TOC
+from table_extractor import TableExtractor
 
 
 ### WEBSCRAPING ###
@@ -23,18 +27,33 @@ from webdriver_manager.chrome import ChromeDriverManager
 # ATRIBUTTES:
 # 1. url: the URL for the specific document we want to scrape
 # 2. agent_email: the SEC website blocks bots which are not identified, so an agent name and email are required to scrape the document
+# 3. fetcher: the EdgarFetcher used to download the document. Defaults to the fetcher shared by every scraper with the same agent_email,
+#             which reuses its keep-alive connections and respects the SEC rate limit
 
 
 
 # METHODS AND THEIR ARGUMENTS:
+# 0. document: returns the parsed FilingDocument of the url. The filing is downloaded and parsed only once, and the same
+#              FilingDocument is shared with every other TextDownload or TableDownload of the same url
+# - only takes self
+
+
 # 1. extractText: scrapes the text in the file and saves it as a txt file. 
 # - text_file_name: the file name we want to give to the downloaded text
 # - sep: the in between lines separation used in the file, usually \n
+# - stream: if True, the document is parsed as it is downloaded and the text written to disk chunk by chunk, without building
+#           the whole tree or the whole text in memory. Meant for very large filings
+# - compress: if True, the text is saved compressed, in seekable frames (see filing_store.py). The .gz suffix is added to the file name
+#             if it does not have it, and a file name ending in .gz is always compressed
+# Returns the path of the saved file. Raises a RuntimeError, without writing anything, if the download does not return a 200
 # Note: in the main.py script we use extractText in a separate function where we specifcy a full folder path, not just file name
 
 
 # 2. extractHTML: downloads the html source of the page
 # - html_file_name: the file name we want to give to the downloaded html
+# - render: by default the raw source is saved over plain HTTP through the fetcher (and its cache). If True, the page is rendered
+#           in a browser instead, taken from a pool of reusable Chrome instances
+# - pool: the BrowserPool used when render is True. Defaults to the pool shared by every TextDownload
 # Note: in the main.py script we use extractText in a separate function where we specifcy a full folder path, not just file name
 
 
@@ -44,65 +63,95 @@ from webdriver_manager.chrome import ChromeDriverManager
 # Note: in the main.py script we use extractText in a separate function where we specifcy a full folder path, not just file name
 
 
+# 4. searchIndex: like find_word_in_website, but looks the word up in a PositionalIndex of the saved text files (see search_index.py)
+#                 instead of downloading and parsing the document again. Returns the snippets around the matches, with the match
+#                 between square brackets, rather than the whole strings of the html
+# - word: the word we are looking for. It can also be a phrase or a query, e.g. '"net sales" NEAR/10 iphone'
+# - index: the PositionalIndex
+# - filing: the name of the filing in the index (e.g. "apple")
+# - limit: the maximum number of snippets returned
+
+
 class TextDownload:
 
 
-    def __init__(self, url=None, agent_email=None):
+    def __init__(self, url=None, agent_email=None, fetcher: EdgarFetcher = None):
         self.url = url
         self.agent_email = agent_email
+        self.fetcher = fetcher or shared_fetcher(agent_email)
 
 
 
-    def extractText(self, text_file_name: str, sep = None) -> None:
+    def document(self) -> FilingDocument:
+        return FilingDocument.fromUrl(self.url, self.fetcher)
 
-        headers = {
-            "User-Agent": "My User Agent",
-            "From": f"{self.agent_email}" 
-        }
 
-        response = requests.get(self.url,  headers = headers)
-        html_content = response.content
 
-        soup = BeautifulSoup(html_content, "html.parser")
+    @timed("text.extract")
+    def extractText(self, text_file_name: str, sep = None, stream = False, compress = False) -> str:
 
-        if sep:
-            text = soup.get_text(separator = sep)
-        
-        else:
-            text = soup.get_text() 
+        if stream:
+            return self._streamText(text_file_name, sep, compress)
+
+        document = self.document()
+        if document.status_code != 200:
+            raise RuntimeError(f"Failed to fetch {self.url}: HTTP {document.status_code}")
+        text = document.text(sep)
 
-        with open(f"{text_file_name}", "w", encoding='utf-8') as file:
+        file, text_file_name = open_for_writing(f"{text_file_name}", compress)
+        with file:
             file.write(text)
-            print(f"txt content saved to {text_file_name}")
+        print(f"txt content saved to {text_file_name}")
+        return text_file_name
+
+
+
+    def _streamText(self, text_file_name: str, sep = None, compress = False) -> str:
+        page = self.fetcher.stream(self.url)
+        if page.status_code != 200:
+            raise RuntimeError(f"Failed to fetch {self.url}: HTTP {page.status_code}")
+
+        file, text_file_name = open_for_writing(f"{text_file_name}", compress)
+        with file:
+            writer = StreamingTextWriter(file, sep, encoding=page.charset() or "utf-8")
+            for chunk in page.iterContent():
+                writer.feedBytes(chunk)
+            writer.close()
+        print(f"txt content saved to {text_file_name}")
+        return text_file_name
     
 
 
-    def extractHTML(self, html_file_name: str) -> None:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service)
-        
-        driver.get(self.url)
-        html = driver.page_source
-        driver.quit()
+    @timed("text.html")
+    def extractHTML(self, html_file_name: str, render = False, pool: BrowserPool = None) -> None:
+        if render:
+            html = (pool or shared_browser_pool()).pageSource(self.url)
+            with open(f"{html_file_name}", "w", encoding="utf-8") as file:
+                file.write(html)
+                print(f"HTML content saved to {html_file_name}")
+            return None
 
-        with open(f"{html_file_name}", "w", encoding="utf-8") as file:
-            file.write(html)
+        page = self.fetcher.stream(self.url)
+        with open(f"{html_file_name}", "wb") as file:
+            for chunk in page.iterContent():
+                file.write(chunk)
             print(f"HTML content saved to {html_file_name}")
     
 
 
     def find_word_in_website(self, url: str, word:str) -> list[str]:
-        headers = {
-            "User-Agent": "My User Agent",
-            "From": f"{self.agent_email}"}
-        response = requests.get(url, headers = headers)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            occurrences = soup.body.find_all(string=lambda text: word.lower() in text.lower())
-            return occurrences
+        document = FilingDocument.fromUrl(url, self.fetcher)
+        if document.status_code == 200:
+            return document.findWord(word)
         else:
-            print("Failed to fetch the website:", response.status_code)
+            print("Failed to fetch the website:", document.status_code)
             return []
+
+
+
+    def searchIndex(self, word: str, index: PositionalIndex, filing: str, limit: int = 100) -> list[str]:
+        results = index.search(word, limit=1, snippets=limit, filings=[filing])
+        return results[0]["snippets"] if results else []
         
 
 
@@ -111,14 +160,21 @@ class TextDownload:
 # ATTRIBUTES:
 # 1. url: the URL for the specific document we want to scrape
 # 2. agent_email: the SEC website blocks bots which are not identified, so an agent name and email are required to scrape the document
+# 3. fetcher: the EdgarFetcher used to download the document (see TextDownload)
+# 4. extractor: the TableExtractor used to turn each html table into a pd.DataFrame
+# 5. classifier: the TableClassifier used to tell the financial statements and the table of contents from the rest (see table_classifier.py)
 
 
 # METHODS AND THEIR ARGUMENTS:
+# 0. document: returns the parsed FilingDocument of the url (see TextDownload.document)
+# - only takes self
+
+
 # 1. getTableSource: obtains the source html code for the tables found in the document
 # - only takes self
         
 
-# 2. tableCleaner: cleans the table from special characters 
+# 2. tableCleaner: cleans the table from special characters and spacer cells, and converts the amounts into float columns (see table_extractor.py)
 # - table_source: input must be the html code of the tables we want to clean
 # Note: use getTableSource to return the source code, which returns an iterable of tables, and use elements of that iterable as an input for tableCleaner
         
@@ -126,67 +182,96 @@ class TextDownload:
 # 3. getTables: uses the source html code for the tables and the helper function tableCleaner to return a list of clean pd.DataFrame with the content of the tables
 # - html_tables: the aforementioned source code for the html tables (the output of getTableSource)
 # Returns a list of pd.DataFrame
+
+
+# 4. getTablesByPosition: the same as getTables, keeping the position of every table in the document
+# - html_tables: as in getTables
+# Returns a dictionary from the position of every non-empty table to its pd.DataFrame, which can be given to a TableStore (see table_store.py)
        
         
-# 4. findTOC: searches through a list of dataframes and finds the one which is the Table of Contents
+# 5. classifyTables: classifies all the tables at once as table of contents, income statement, balance sheet, cash flow statement or other
+# - tables: the output of getTablesByPosition (or a list of pd.DataFrame, as returned by getTables)
+# Returns a pd.DataFrame indexed by the position of the tables, with their kind and their score for every kind
+
+
+# 6. findTOC: searches through a list of dataframes and finds the one which is the Table of Contents
 # - tables: a list of pd.DataFrame. Usually would be the output of getTables, which is a cleaned list of the tables in the document
 
 
+# 7. getFacts: the fast path for the financial data of inline XBRL reports: streams the document once and reads its tagged facts,
+#              without parsing the html or rebuilding any table (see ixbrl.py)
+# - only takes self
+# Returns (facts, contexts), two pd.DataFrame
+
+
 class TableDownload:
 
-    def __init__(self, url=None, agent_email=None):
+    def __init__(self, url=None, agent_email=None, fetcher: EdgarFetcher = None, extractor: TableExtractor = None,
+                 classifier: TableClassifier = None):
         self.url = url
         self.agent_email = agent_email
+        self.fetcher = fetcher or shared_fetcher(agent_email)
+        self.extractor = extractor or TableExtractor()
+        self.classifier = classifier or TableClassifier()
 
     
-    def getTableSource(self) -> bs4.element.ResultSet:
-        headers = {
-            "User-Agent": "My User Agent",
-            "From": f"{self.agent_email}" 
-        }
-
-        response = requests.get(self.url,  headers = headers)
-        soup = BeautifulSoup(response.text, "xml")
-        tables = soup.find_all("table")
+    def document(self) -> FilingDocument:
+        return FilingDocument.fromUrl(self.url, self.fetcher)
 
-        return tables
+    
+    def getTableSource(self) -> bs4.element.ResultSet:
+        return self.document().tables
 
 
 
+    @timed("tables.clean")
     def tableCleaner(self, table_source: bs4.element.Tag) -> pd.DataFrame:
-        
-        rows = []
-        for i in range(2, len(table_source.find_all("tr"))):
-
-            row = []
-            for j in range(0, len(table_source.find_all("tr")[i].find_all("td"))):
-
-                string = table_source.find_all("tr")[i].find_all("td")[j].text.strip()
-                cleaned_string = re.sub(r'[^a-zA-Z0-9]', '', string).lower()
-
-                if cleaned_string:
-                    row.append(table_source.find_all("tr")[i].find_all("td")[j].text.strip())
-                
-            rows.append(row)
-        
-        return pd.DataFrame(rows)
+        return self.extractor.extract(table_source)
     
 
+    @timed("tables.extract")
     def getTables(self, html_tables : bs4.element.ResultSet) -> list[pd.DataFrame]:
         dfs: list[pd.DataFrame] = []
         for df in html_tables:
             data: pd.DataFrame = self.tableCleaner(df)
             dfs.append(data)
         
+        count("tables.processed", len(dfs))
         return [df for df in dfs if not df.empty]
+
+
+
+    @timed("tables.extract")
+    def getTablesByPosition(self, html_tables: bs4.element.ResultSet) -> dict[int, pd.DataFrame]:
+        tables = {}
+        for position, table_source in enumerate(html_tables):
+            data = self.tableCleaner(table_source)
+            if not data.empty:
+                tables[position] = data
+        count("tables.processed", len(html_tables))
+        return tables
+    
+    
+    @timed("tables.classify")
+    def classifyTables(self, tables) -> pd.DataFrame:
+        return self.classifier.classify(tables)
     
     
     def findTOC(self, tables: list[pd.DataFrame]) -> pd.DataFrame:
-        for df in tables:
-            keywords = df.apply(lambda row: row.astype(str).str.contains("Item 1").any() and row.astype(str).str.contains("Risk Factors").any(), axis = 1)
-            if not df[keywords].empty:
-                df.columns = ["item", "section", "page"]
-                return df
-            else:
-                print("Table of Contents not found")
-                return pd.DataFrame()
\ No newline at end of file
+        index = self.classifyTables(tables)
+        positions = self.classifier.select(index, (TOC,))
+        if not positions:
+            print("Table of Contents not found")
+            return pd.DataFrame()
+
+        # The table of contents with the most entries, in case the report repeats it
+        best = int(index.loc[positions, "score_" + TOC].idxmax())
+        df = tables[best]
+        if df.shape[1] == 3:
+            df.columns = ["item", "section", "page"]
+        return df
+    
+    
+    @timed("tables.facts")
+    def getFacts(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        return IXBRLExtractor.fromChunks(self.fetcher.stream(self.url).iterContent())
@@ -0,0 +1,512 @@
+import argparse
+import difflib
+import hashlib
+import os
+import pickle
+import re
+import time
+import zlib
+
+import numpy as np
+from nltk.corpus import stopwords
+from nltk.stem import PorterStemmer
+from nltk.tokenize import sent_tokenize, word_tokenize
+
+from business_info import BusinessInfo
+from instrumentation import count, timed
+from nltk_resources import ensure_resource
+from search_index import filing_name
+from sentence_scoring import SentenceScorer
+
+
+### YEAR-OVER-YEAR INCREMENTAL SUMMARISATION ###
+### THE 10-K OF A COMPANY REPEATS MOST OF THE TEXT OF THE YEAR BEFORE, YET business_summary TOKENIZES AND SCORES EVERY FILING FROM ###
+### SCRATCH. THE FOLLOWING CODE KEEPS AN INDEX PER COMPANY WITH THE PARAGRAPHS, SENTENCES AND TOKENS OF ITS LAST FILINGS, SO THAT ###
+### SUMMARISING THE NEXT FILING ONLY SPLITS AND TOKENIZES THE PARAGRAPHS WHICH ARE NEW, AND SAYS WHICH SENTENCES CHANGED: ###
+### - A PARAGRAPH (A LINE OF THE BUSINESS SECTION) ALREADY SEEN, BYTE FOR BYTE, REUSES ITS SENTENCES AND THEIR TOKENS ###
+### - A SENTENCE IS UNCHANGED WHEN ITS NORMALISED TEXT (LOWER CASE, WORDS ONLY) IS IN THE PREVIOUS FILING ###
+### - OTHERWISE IT IS CHANGED WHEN IT IS A NEAR-DUPLICATE OF A SENTENCE OF THE PREVIOUS FILING WHICH IS GONE (E.G. ONLY ITS FIGURES ###
+###   CHANGED), AND NEW WHEN IT IS NOT. NEAR-DUPLICATES ARE FOUND WITH MINHASH SIGNATURES OF THE WORD PAIRS OF EVERY SENTENCE AND ###
+###   LOCALITY-SENSITIVE HASHING (LSH), SO EVERY NEW SENTENCE IS ONLY COMPARED WITH THE FEW OLD ONES SHARING A BAND OF ITS SIGNATURE ###
+
+### THE SCORE OF A SENTENCE IS THE AVERAGE FREQUENCY OF ITS WORDS IN THE WHOLE TEXT (SEE sentence_scoring.py), SO ANY CHANGE TO THE ###
+### TEXT CHANGES THE SCORES OF THE SENTENCES WHICH DID NOT CHANGE TOO. THE SCORES ARE THEREFORE RECOMPUTED, BUT FROM THE CACHED ###
+### TOKENS AND STEMS, WITH THE VECTORISED SentenceScorer: THE TOKENIZATION, WHICH IS MOST OF THE COST, IS ONLY PAID FOR THE NEW TEXT ###
+### (AND THE SUMMARY IS THE SAME AS IF EVERYTHING HAD BEEN RECOMPUTED). THE OUTPUT MARKS THE NEW SENTENCES OF THE SUMMARY, AND THE ###
+### WORDS WHICH CHANGED IN THE CHANGED ONES, AND LISTS THE NEW, CHANGED AND REMOVED SENTENCES ###
+
+### THE SENTENCES ARE SPLIT PARAGRAPH BY PARAGRAPH, SO A HEADING WITHOUT A FULL STOP IS NOT JOINED TO THE SENTENCE AFTER IT AS IN ###
+### business_summary: THE TWO SUMMARIES CAN DIFFER SLIGHTLY ###
+
+
+# Bump this whenever the contents of the index change, to rebuild every index
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".yoy.pkl.z"
+
+# MinHash of the word pairs of every sentence: NUM_PERM values, split into BANDS bands for the LSH. With 16 bands of 4 values, two
+# sentences whose word pairs have a Jaccard similarity above about 0.5 are likely to share a band
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_WORDS = 2
+# The lowest estimated similarity of a changed sentence to its previous version
+SIMILARITY = 0.5
+# A Mersenne prime: the permutations (a * x + b) % _PRIME of 31-bit shingle hashes never overflow 64 bits
+_PRIME = (1 << 31) - 1
+
+WORD = re.compile(r"\w+")
+
+
+
+
+def normalise(sentence: str) -> str:
+    # The words of a sentence in lower case: sentences differing only in case, spacing or punctuation are the same sentence
+    return " ".join(WORD.findall(sentence.lower()))
+
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+
+
+# class MinHasher
+
+# ATTRIBUTES:
+# 1. num_perm: the number of values of every signature
+# 2. shingle_words: the number of consecutive words of every shingle
+# 3. a and b: the coefficients of the num_perm hash permutations, fixed by the seed so the signatures saved in an index stay comparable
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. signatures: the MinHash signatures of many sentences
+# - sentences: a list of strings
+# Returns a np.ndarray of uint32 with one row per sentence. The fraction of equal values of two rows estimates the Jaccard similarity
+# of the word shingles of the two sentences. The sentences without any shingle all get the same empty signature (see empty)
+
+
+# 2. similarity: the estimated similarity of one signature to many
+# - signature: one row of signatures
+# - others: a np.ndarray of signatures
+# Returns a np.ndarray of floats between 0 and 1
+
+
+# 3. empty: which signatures are of sentences without any shingle. Those are all equal, so their similarity says nothing
+# - signatures: a np.ndarray of signatures
+# Returns a np.ndarray of booleans, one per signature
+
+
+class MinHasher:
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_words: int = SHINGLE_WORDS, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)[:, None]
+
+
+
+    def _shingles(self, sentence: str) -> np.ndarray:
+        words = normalise(sentence).split()
+        shingles = {" ".join(words[i:i + self.shingle_words]) for i in range(max(1, len(words) - self.shingle_words + 1))}
+        # crc32 rather than hash(), which changes between runs
+        return np.fromiter((zlib.crc32(shingle.encode("utf-8")) & _PRIME for shingle in shingles if shingle), dtype=np.uint64)
+
+
+
+    def signatures(self, sentences: list[str]) -> np.ndarray:
+        signatures = np.full((len(sentences), self.num_perm), _PRIME, dtype=np.uint32)
+        for row, sentence in enumerate(sentences):
+            shingles = self._shingles(sentence)
+            if shingles.size:
+                signatures[row] = ((self.a * shingles + self.b) % _PRIME).min(axis=1)
+        return signatures
+
+
+
+    @staticmethod
+    def similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+        return (others == signature).mean(axis=1)
+
+
+
+    @staticmethod
+    def empty(signatures: np.ndarray) -> np.ndarray:
+        # The permutations are taken modulo _PRIME, so only a sentence without shingles has _PRIME in its signature
+        return (signatures == _PRIME).all(axis=1)
+
+
+
+
+# class LSHIndex
+
+# ATTRIBUTES:
+# 1. bands: the number of bands every signature is split into
+# 2. buckets: for every band, a dictionary from the values of the band to the rows having them
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. candidates: the rows sharing at least one band with a signature, the only ones worth comparing with it
+# - signature: a MinHash signature
+# Returns a sorted list of rows
+
+
+class LSHIndex:
+
+    def __init__(self, signatures: np.ndarray, bands: int = BANDS):
+        self.bands = bands
+        self._rows = signatures.shape[1] // bands
+        self.buckets = [{} for _ in range(bands)]
+        for band, buckets in enumerate(self.buckets):
+            values = np.ascontiguousarray(signatures[:, band * self._rows:(band + 1) * self._rows])
+            for row, key in enumerate(map(bytes, values)):
+                buckets.setdefault(key, []).append(row)
+
+
+
+    def candidates(self, signature: np.ndarray) -> list[int]:
+        rows = set()
+        for band, buckets in enumerate(self.buckets):
+            rows.update(buckets.get(bytes(np.ascontiguousarray(signature[band * self._rows:(band + 1) * self._rows])), ()))
+        return sorted(rows)
+
+
+
+
+# class CompanyIndex
+
+# ATTRIBUTES:
+# 1. path: the file of the index, <folder>/<company>.yoy.pkl.z (pickled and zlib compressed, as the ArtifactCache)
+# 2. paragraphs: a dictionary from the hash of every paragraph to the hashes of its sentences
+# 3. sentences: a dictionary from the hash of every sentence to its text and tokens
+# 4. stem_cache: the stems of every word seen, shared with the SentenceScorer
+# 5. filings: the filings of the company, oldest first. For every filing, the hashes of its paragraphs and sentences, the normalised
+#             hashes of its sentences and their MinHash signatures
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. previous: the name of the latest filing before a filing, or None
+# - filing: the name of the filing
+
+
+# 2. record: stores a filing (in place of an earlier version with the same name), and forgets the oldest filings beyond keep
+# - filing: the name of the filing
+# - record: its paragraphs, sentences, normalised hashes and signatures
+# - keep: the number of filings kept
+
+
+# 3. save: writes the index, dropping the paragraphs and sentences no kept filing uses
+# - only takes self
+
+
+class CompanyIndex:
+
+    def __init__(self, folder: str, company: str):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, re.sub(r"[^\w.-]", "_", company) + INDEX_SUFFIX)
+        self.paragraphs, self.sentences, self.stem_cache, self.filings = {}, {}, {}, {}
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+
+        # A truncated index, or one pickled by other code (AttributeError, ModuleNotFoundError, ...), is stale: it is rebuilt from scratch
+        try:
+            saved = pickle.loads(zlib.decompress(data))
+            if saved["version"] == INDEX_VERSION:
+                paragraphs, sentences, stem_cache, filings = saved["paragraphs"], saved["sentences"], saved["stem_cache"], saved["filings"]
+            else:
+                return None
+        except Exception:
+            return None
+        self.paragraphs, self.sentences, self.stem_cache, self.filings = paragraphs, sentences, stem_cache, filings
+
+
+
+    def previous(self, filing: str) -> str:
+        names = [name for name in self.filings if name != filing]
+        if filing in self.filings:
+            # Re-running a filing compares it with the one recorded before it
+            names = list(self.filings)[:list(self.filings).index(filing)]
+        return names[-1] if names else None
+
+
+
+    def record(self, filing: str, record: dict, keep: int = 3) -> None:
+        # A filing recorded again keeps its place in the order of the filings
+        self.filings[filing] = record
+        while len(self.filings) > keep:
+            del self.filings[next(iter(self.filings))]
+
+
+
+    def save(self) -> None:
+        paragraphs = {paragraph for record in self.filings.values() for paragraph in record["paragraphs"]}
+        self.paragraphs = {key: value for key, value in self.paragraphs.items() if key in paragraphs}
+        sentences = {sentence for record in self.filings.values() for sentence in record["sentences"]}
+        self.sentences = {key: value for key, value in self.sentences.items() if key in sentences}
+
+        saved = {"version": INDEX_VERSION, "paragraphs": self.paragraphs, "sentences": self.sentences,
+                 "stem_cache": self.stem_cache, "filings": self.filings}
+        with open(self.path + ".tmp", "wb") as file:
+            file.write(zlib.compress(pickle.dumps(saved, protocol=pickle.HIGHEST_PROTOCOL), 6))
+        os.replace(self.path + ".tmp", self.path)
+
+
+
+
+# class YoYSummary
+
+# ATTRIBUTES:
+# 1. index_folder: the folder of the indexes of the companies
+# 2. threshold_prop: the proportion of the average score a sentence needs to be in the summary, as in business_summary
+# 3. similarity: the lowest estimated similarity of a changed sentence to its previous version
+# 4. keep_filings: the number of filings kept in the index of every company
+# 5. stemmer and stop_words: as in BusinessSummary. Loaded unless given (e.g. by a long-running process, see summary_service.py)
+# 6. hasher: the MinHasher of the signatures
+
+
+# METHODS AND THEIR ARGUMENTS:
+# 1. summarise: summarises the business section of a filing against the previous filing of the company in its index, and records it there
+# - edgar_file: the saved text file of the filing (plain or compressed)
+# - company: the name of the company, which names its index
+# - filing: the name of the filing in the index (by default, the name of the file). Filings must be summarised oldest first
+# - previous: the name of the filing to compare with (by default, the latest one recorded before this one)
+# Returns a dictionary with the summary, the summary with the changes highlighted, the new and changed sentences (with their previous
+# version and score), the removed sentences and the counts of the work done
+
+
+# 2. highlight: a changed sentence with the words removed from its previous version as [-words-] and the words added as {+words+}
+# - sentence: the new version
+# - previous: the previous version
+
+
+# 3. render: the text of a result, ready to be saved: the highlighted summary, what changed and what was removed
+# - result: the output of summarise
+
+
+class YoYSummary:
+
+    def __init__(self, index_folder: str, threshold_prop: float = 0.8, similarity: float = SIMILARITY, keep_filings: int = 3,
+                 stemmer: PorterStemmer = None, stop_words: set = None):
+        self.index_folder = index_folder
+        self.threshold_prop = threshold_prop
+        self.similarity = similarity
+        self.keep_filings = keep_filings
+        self.stemmer = stemmer or PorterStemmer()
+        if stop_words is None:
+            ensure_resource("stopwords")
+            stop_words = set(stopwords.words("english"))
+        self.stop_words = stop_words
+        self.hasher = MinHasher()
+
+
+
+    def _paragraphs(self, edgar_file: str) -> list[str]:
+        # The lines of the business section, as in BusinessSummary, keeping them apart
+        business = BusinessInfo(edgar_file)
+        indices = business.infoLines()
+        return [line for line in business.sectionLines(indices) if line]
+
+
+
+    def _split(self, index: CompanyIndex, paragraphs: list[str]) -> tuple[list[str], list[str], int]:
+        # The hashes of the paragraphs and of their sentences, tokenizing only the paragraphs and sentences not in the index
+        paragraph_hashes, sentence_hashes, tokenized = [], [], 0
+        for paragraph in paragraphs:
+            key = text_hash(paragraph)
+            paragraph_hashes.append(key)
+            if key not in index.paragraphs:
+                ensure_resource("punkt")
+                hashes = []
+                for sentence in sent_tokenize(paragraph):
+                    sentence_key = text_hash(sentence)
+                    if sentence_key not in index.sentences:
+                        index.sentences[sentence_key] = {"text": sentence, "tokens": word_tokenize(sentence, preserve_line=True)}
+                        tokenized += 1
+                    hashes.append(sentence_key)
+                index.paragraphs[key] = hashes
+            sentence_hashes.extend(index.paragraphs[key])
+        return paragraph_hashes, sentence_hashes, tokenized
+
+
+
+    def _scores(self, index: CompanyIndex, tokens: list[list[str]]) -> np.ndarray:
+        # The frequency table of BusinessSummary, from the cached tokens, stemming every distinct word once
+        stem_cache, frequency_table = index.stem_cache, {}
+        for sentence in tokens:
+            for word in sentence:
+                stem = stem_cache.get(word)
+                if stem is None:
+                    stem = stem_cache[word] = self.stemmer.stem(word)
+                if stem not in self.stop_words:
+                    frequency_table[stem] = frequency_table.get(stem, 0) + 1
+        return SentenceScorer(frequency_table, self.stemmer, index.stem_cache).scores(tokens)
+
+
+
+    @timed("yoy.summarise")
+    def summarise(self, edgar_file: str, company: str, filing: str = None, previous: str = None) -> dict:
+        start = time.perf_counter()
+        filing = filing or filing_name(edgar_file)
+        index = CompanyIndex(self.index_folder, company)
+        previous = previous or index.previous(filing)
+        before = index.filings.get(previous) if previous else None
+
+        paragraphs = self._paragraphs(edgar_file)
+        paragraph_hashes, sentence_hashes, tokenized = self._split(index, paragraphs)
+        texts = [index.sentences[key]["text"] for key in sentence_hashes]
+        normalised = [text_hash(normalise(text)) for text in texts]
+
+        # Unchanged sentences keep the signature they had last year: only the others are hashed
+        status = ["new"] * len(texts)
+        signatures = np.zeros((len(texts), self.hasher.num_perm), dtype=np.uint32)
+        changed_from, similarities = {}, {}
+        old_rows = {}
+        if before is not None:
+            old_rows = {key: row for row, key in enumerate(before["normalised"])}
+        fresh = []
+        for row, key in enumerate(normalised):
+            if key in old_rows:
+                status[row] = "unchanged"
+                signatures[row] = before["signatures"][old_rows[key]]
+            else:
+                fresh.append(row)
+        if fresh:
+            signatures[fresh] = self.hasher.signatures([texts[row] for row in fresh])
+
+        removed = []
+        if before is not None:
+            current = set(normalised)
+            gone = [row for row, key in enumerate(before["normalised"]) if key not in current]
+            matched = set()
+            # The sentences without shingles (very short, or only stop words) share one empty signature, so they are only
+            # compared by their exact hash above and never matched as changed versions of each other
+            empty_before, empty_now = MinHasher.empty(before["signatures"]), MinHasher.empty(signatures)
+            comparable = [row for row in gone if not empty_before[row]]
+            fresh_comparable = [row for row in fresh if not empty_now[row]]
+            if comparable and fresh_comparable:
+                lsh = LSHIndex(before["signatures"][comparable])
+                for row in fresh_comparable:
+                    candidates = lsh.candidates(signatures[row])
+                    if not candidates:
+                        continue
+                    estimates = MinHasher.similarity(signatures[row], before["signatures"][[comparable[c] for c in candidates]])
+                    best = int(np.argmax(estimates))
+                    if estimates[best] >= self.similarity:
+                        status[row] = "changed"
+                        changed_from[row] = comparable[candidates[best]]
+                        similarities[row] = float(estimates[best])
+                        matched.add(comparable[candidates[best]])
+            removed = [index.sentences[before["sentences"][row]]["text"] for row in gone if row not in matched]
+
+        tokens = [index.sentences[key]["tokens"] for key in sentence_hashes]
+        scores = self._scores(index, tokens)
+        scored = scores[scores > 0]
+        threshold = (float(scored.mean()) if scored.size else 0.0) * self.threshold_prop
+        selected = SentenceScorer.select(scores, threshold)
+
+        previous_text = lambda row: index.sentences[before["sentences"][changed_from[row]]]["text"]
+        summary, highlighted = [], []
+        for row in np.flatnonzero(selected):
+            summary.append(texts[row])
+            if status[row] == "new" and before is not None:
+                highlighted.append("{+" + texts[row] + "+}")
+            elif status[row] == "changed":
+                highlighted.append(self.highlight(texts[row], previous_text(row)))
+            else:
+                highlighted.append(texts[row])
+
+        changes = [
+            {"status": status[row], "sentence": texts[row], "score": float(scores[row]), "in_summary": bool(selected[row]),
+             "previous": previous_text(row) if status[row] == "changed" else None, "similarity": similarities.get(row)}
+            for row in range(len(texts)) if status[row] != "unchanged"
+        ] if before is not None else []
+        changes.sort(key=lambda change: -change["score"])
+
+        index.record(filing, {"paragraphs": paragraph_hashes, "sentences": sentence_hashes, "normalised": normalised,
+                              "signatures": signatures}, self.keep_filings)
+        index.save()
+
+        stats = {
+            "paragraphs": len(paragraphs), "sentences": len(texts), "sentences_tokenized": tokenized,
+            "unchanged": status.count("unchanged"), "changed": status.count("changed"), "new": status.count("new"),
+            "removed": len(removed), "seconds": time.perf_counter() - start,
+        }
+        count("yoy.sentences", len(texts))
+        count("yoy.sentences_tokenized", tokenized)
+        return {
+            "company": company, "filing": filing, "previous": previous if before is not None else None,
+            "summary": "".join(" " + sentence for sentence in summary), "highlighted": " ".join(highlighted),
+            "changes": changes, "removed": removed, "stats": stats,
+        }
+
+
+
+    @staticmethod
+    def highlight(sentence: str, previous: str) -> str:
+        new_words, old_words = sentence.split(), previous.split()
+        output = []
+        for operation, old_start, old_end, new_start, new_end in difflib.SequenceMatcher(None, old_words, new_words).get_opcodes():
+            if operation == "equal":
+                output.extend(new_words[new_start:new_end])
+                continue
+            if old_end > old_start:
+                output.append("[-" + " ".join(old_words[old_start:old_end]) + "-]")
+            if new_end > new_start:
+                output.append("{+" + " ".join(new_words[new_start:new_end]) + "+}")
+        return " ".join(output)
+
+
+
+    @staticmethod
+    def render(result: dict) -> str:
+        stats = result["stats"]
+        if result["previous"] is None:
+            return f"Summary of {result['filing']} (no previous filing of {result['company']} to compare with)\n\n{result['summary'].strip()}\n"
+
+        lines = [
+            f"Summary of {result['filing']} against {result['previous']}: {stats['unchanged']} sentences unchanged, "
+            f"{stats['changed']} changed, {stats['new']} new and {stats['removed']} removed",
+            "New text is marked {+like this+} and removed text [-like this-]", "",
+            result["highlighted"], "", "What changed:",
+        ]
+        for change in result["changes"]:
+            if change["in_summary"] or change["status"] == "new":
+                sentence = change["sentence"]
+                if change["status"] == "changed":
+                    sentence = YoYSummary.highlight(change["sentence"], change["previous"])
+                lines.append(f"- {change['status']}: {sentence}")
+        if result["removed"]:
+            lines += ["", "Removed:"] + [f"- {sentence}" for sentence in result["removed"]]
+        return "\n".join(lines) + "\n"
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the filings of a company, each against the one before, highlighting what changed")
+    parser.add_argument("company")
+    parser.add_argument("filings", nargs="+", help="the saved text files of the filings, oldest first")
+    parser.add_argument("--index", default="yoy_index", help="the folder of the indexes of the companies")
+    parser.add_argument("--output", default=None, help="a folder to save the highlighted summaries in")
+    parser.add_argument("--threshold-prop", type=float, default=0.8)
+    args = parser.parse_args()
+
+    summariser = YoYSummary(args.index, args.threshold_prop)
+    for path in args.filings:
+        result = summariser.summarise(path, args.company)
+        stats = result["stats"]
+        print(f"{result['filing']}: {stats['sentences']} sentences, {stats['sentences_tokenized']} tokenized, {stats['unchanged']} unchanged, "
+              f"{stats['changed']} changed, {stats['new']} new, {stats['removed']} removed in {stats['seconds']:.2f} s")
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            with open(os.path.join(args.output, f"{result['filing']}_yoy_summary.txt"), "w") as file:
+                file.write(YoYSummary.render(result))
+
+
+
+if __name__ == "__main__":
+    main()